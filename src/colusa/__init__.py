@@ -36,6 +36,7 @@ __all__ = [
     'logs',
     'Crawler',
     'BookConfig',
+    'CacheConfig',
     'MakeConfig',
     'PartConfig',
     'PostProcessingConfig',
@@ -50,6 +51,7 @@ from colusa import utils as utils
 from colusa.colusa import Colusa as Colusa
 from colusa.config import (
     BookConfig as BookConfig,
+    CacheConfig as CacheConfig,
     MakeConfig as MakeConfig,
     PartConfig as PartConfig,
     PostProcessingConfig as PostProcessingConfig,
@@ -2,14 +2,72 @@ import re
 from typing import Any, Callable, Optional
 
 import requests
-from bs4 import Tag
+from bs4 import PageElement, Tag
 
 import colusa
 import colusa.fetch
-from .visitor import NodeVisitor
+from .fetch import ImageDownloader
+from .visitor import NodeVisitor, Steps
+
+
+class VisitContext:
+    """State of the visit of a node, shared with its descendants.
+
+    A context is immutable: a visitor function entering a scope, such as a list or a
+    ``pre`` block, passes `replace(...)` to the children and its own context is left as
+    it was for the siblings. Contexts are only created when a scope starts, not for
+    every node, and can be used by several visits at the same time.
+    """
+    __slots__ = ('src_url', 'output_dir', 'image_downloader', 'pre', 'caption', 'href', 'lists',
+                 'figure', 'blockquote')
+
+    def __init__(self, src_url: str = '', output_dir: str = '', image_downloader: Optional[ImageDownloader] = None,
+                 pre: bool = False, caption: Optional[str] = None, href: Optional[str] = None,
+                 lists: tuple[str, ...] = (), figure: bool = False, blockquote: bool = False) -> None:
+        setattr_ = object.__setattr__
+        setattr_(self, 'src_url', src_url)
+        setattr_(self, 'output_dir', output_dir)
+        setattr_(self, 'image_downloader', image_downloader)
+        setattr_(self, 'pre', pre)
+        setattr_(self, 'caption', caption)
+        setattr_(self, 'href', href)
+        # types of the enclosing lists, 'ul' or 'ol', innermost last
+        setattr_(self, 'lists', lists)
+        setattr_(self, 'figure', figure)
+        setattr_(self, 'blockquote', blockquote)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'VisitContext is immutable, cannot set {name}')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'VisitContext is immutable, cannot delete {name}')
+
+    def __repr__(self) -> str:
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'VisitContext({values})'
+
+    def replace(self, **changes: Any) -> 'VisitContext':
+        """
+        New context for a nested scope, with `changes` applied to the values of this one
+        """
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return VisitContext(**values)
+
+    @property
+    def indent(self) -> int:
+        return len(self.lists)
 
 
 class AsciidocVisitor(NodeVisitor):
+    def visit(self, node: PageElement, ctx: Optional[VisitContext] = None, **kwargs: Any) -> str:
+        """Visit `node` with context `ctx`, or a context created from keyword arguments
+        such as `src_url` and `output_dir`
+        """
+        if ctx is None:
+            ctx = VisitContext(**kwargs)
+        return super().visit(node, ctx)
+
     def text_cleanup(self, text: str) -> str:
         text = text.strip()
         rex = re.compile(r'\n\s*')
@@ -24,10 +82,10 @@ class AsciidocVisitor(NodeVisitor):
 
         return f'{"="*(level+1)} {text}\n\n'
 
-    def visit_tag_fall_through(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        return self.generic_visit(node, *args, **kwargs)
+    def visit_tag_fall_through(self, node: Tag, ctx: VisitContext) -> Steps:
+        return (yield self.write_children(node, ctx))
 
-    def visit_tag_ignore_content(self, node: Tag, *args: Any, **kwargs: Any) -> str:
+    def visit_tag_ignore_content(self, node: Tag, ctx: VisitContext) -> str:
         return ''
 
     visit_tag_span = visit_tag_fall_through
@@ -47,35 +105,37 @@ class AsciidocVisitor(NodeVisitor):
     visit_tag_form = visit_tag_ignore_content
     visit_tag_script = visit_tag_ignore_content
 
-    def visit_tag_a(self, node: Tag, *args: Any, **kwargs: Any) -> str:
+    def visit_tag_a(self, node: Tag, ctx: VisitContext) -> Steps:
         href = node.get('href', '')
-        # kwargs['href'] = href
-        text = self.generic_visit(node, *args, **kwargs)
-        # del kwargs['href']
-        if not text:
-            return ''
+        start = self.output.mark()
+        yield self.write_children(node, ctx)
+        if self.output.is_empty(start):
+            return None
         m = re.match(r'https?://', href)
         if m is None:
-            return text
+            return None
 
         if len(node.contents) == 1:
             child = node.contents[0]
             if type(child) is Tag and child.name == 'img':
                 # anchor around image, should ignore the anchor
-                return text
+                return None
 
-        return f'link:{href}[{text}]'
+        self.output.wrap(start, f'link:{href}[', ']')
+        return None
 
-    def visit_tag_p(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        text = self.generic_visit(node, *args, **kwargs)
-        return f'{text.strip()}\n\n'
+    def visit_tag_p(self, node: Tag, ctx: VisitContext) -> Steps:
+        start = self.output.mark()
+        yield self.write_children(node, ctx)
+        self.output.strip(start)
+        return '\n\n'
 
     visit_tag_article = visit_tag_p
     visit_tag_div = visit_tag_p
 
-    def visit_heading_node(level: int) -> Callable[['AsciidocVisitor', Tag, Any, Any], str]:
-        def visitor(self: 'AsciidocVisitor', node: Tag, *args: Any, **kwargs: Any) -> str:
-            text = self.generic_visit(node, *args, **kwargs)
+    def visit_heading_node(level: int) -> Callable[['AsciidocVisitor', Tag, VisitContext], Steps]:
+        def visitor(self: 'AsciidocVisitor', node: Tag, ctx: VisitContext) -> Steps:
+            text = yield self.children(node, ctx)
             text = self.text_cleanup(text)
             if not text:
                 # empty heading
@@ -90,8 +150,8 @@ class AsciidocVisitor(NodeVisitor):
     visit_tag_h3 = visit_heading_node(3)
     visit_tag_h4 = visit_heading_node(4)
 
-    def visit_tag_h5(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        text = self.generic_visit(node, *args, **kwargs)
+    def visit_tag_h5(self, node: Tag, ctx: VisitContext) -> Steps:
+        text = yield self.children(node, ctx)
         text = self.text_cleanup(text)
         if not text:
             # empty heading
@@ -100,15 +160,19 @@ class AsciidocVisitor(NodeVisitor):
         return f'\n\n**{text}**\n\n'
     visit_tag_h6 = visit_tag_h5
 
-    def visit_tag_strong(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        text = self.generic_visit(node, *args, **kwargs)
-        return self.tag_wrap_around(text, '**')
+    def visit_tag_strong(self, node: Tag, ctx: VisitContext) -> Steps:
+        start = self.output.mark()
+        yield self.write_children(node, ctx)
+        self.output.wrap_stripped(start, '**')
+        return None
 
     visit_tag_b = visit_tag_strong
 
-    def visit_tag_em(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        text = self.generic_visit(node, *args, **kwargs)
-        return self.tag_wrap_around(text, '__')
+    def visit_tag_em(self, node: Tag, ctx: VisitContext) -> Steps:
+        start = self.output.mark()
+        yield self.write_children(node, ctx)
+        self.output.wrap_stripped(start, '__')
+        return None
 
     visit_tag_i = visit_tag_em
     visit_tag_u = visit_tag_em
@@ -122,87 +186,76 @@ class AsciidocVisitor(NodeVisitor):
         begin, t, end = text.partition(new_text)
         return f'{begin}{w}{t}{w}{end}'
 
-    def visit_tag_blockquote(self, node: Tag, *args: Any, **kwargs: Any) -> str:
+    def visit_tag_blockquote(self, node: Tag, ctx: VisitContext) -> Steps:
         cite_node = node.find('cite')
         cite: Optional[str] = None
         if cite_node is not None:
             cite_node.extract()
             cite = cite_node.text
-        text = self.generic_visit(node, *args, **kwargs)
         if cite is None:
-            return f'[quote]\n____\n{text}\n____\n\n'
+            self.output.write('[quote]\n____\n')
         else:
-            return f'[quote, {cite}]\n____\n{text}\n____\n\n'
+            self.output.write(f'[quote, {cite}]\n____\n')
+        yield self.write_children(node, ctx.replace(blockquote=True))
+        return '\n____\n\n'
 
-    def visit_tag_hr(self, node: Tag, *args: Any, **kwargs: Any) -> str:
+    def visit_tag_hr(self, node: Tag, ctx: VisitContext) -> str:
         return "\n'''\n\n"
 
-    def visit_tag_br(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        pre = kwargs.get('pre')
-        if len(node.contents) > 0:
-            text = self.generic_visit(node, *args, **kwargs)
+    def visit_tag_br(self, node: Tag, ctx: VisitContext) -> Steps:
+        if not ctx.pre:
+            self.output.write("\n\n")
         else:
-            text = ''
+            self.output.write("\n")
 
-        if not pre:
-            return f"\n\n{text}"
-        else:
-            return f"\n{text}"
-
-    def visit_tag_ol(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        return self.wrapper_list(node, 'ol', *args, **kwargs)
-
-    def visit_tag_ul(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        return self.wrapper_list(node, 'ul', *args, **kwargs)
-
-    def wrapper_list(self, node: Tag, list_type: str, *args: Any, **kwargs: Any) -> str:
-        indent: int = kwargs.get('indent', 0)
-        indent = indent + 1
-        indent_stack: list[str] = kwargs.get('indent_stack', [])
-        indent_stack.append(list_type)
-        kwargs['indent'] = indent
-        kwargs['indent_stack'] = indent_stack
-        text = self.generic_visit(node, *args, **kwargs)
-        indent = indent - 1
-        indent_stack.pop()
-        kwargs['indent'] = indent
-        kwargs['indent_stack'] = indent_stack
-        return f'{text}\n\n'
-
-    def visit_tag_li(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        text = self.generic_visit(node, *args, **kwargs)
-        if not text:
-            return ''
+        if len(node.contents) > 0:
+            yield self.write_children(node, ctx)
+        return None
 
-        indent: int = kwargs.get('indent', 1)
-        indent_stack: list[str] = kwargs.get('indent_stack', [])
-        if len(indent_stack) == 0:
+    def visit_tag_ol(self, node: Tag, ctx: VisitContext) -> Steps:
+        return self.wrapper_list(node, 'ol', ctx)
+
+    def visit_tag_ul(self, node: Tag, ctx: VisitContext) -> Steps:
+        return self.wrapper_list(node, 'ul', ctx)
+
+    def wrapper_list(self, node: Tag, list_type: str, ctx: VisitContext) -> Steps:
+        yield self.write_children(node, ctx.replace(lists=ctx.lists + (list_type,)))
+        return '\n\n'
+
+    def visit_tag_li(self, node: Tag, ctx: VisitContext) -> Steps:
+        start = self.output.mark()
+        yield self.write_children(node, ctx)
+        if self.output.is_empty(start):
+            return None
+
+        if not ctx.lists:
             # something wrong, ignore data
-            return ''
-        last = indent_stack[-1]
-        if last == 'ul':
+            self.output.truncate(start)
+            return None
+        if ctx.lists[-1] == 'ul':
             sep = '*'
         else:
             sep = '.'
-        return f'{sep*indent} {text}\n'
+        self.output.wrap(start, f'{sep*ctx.indent} ', '\n')
+        return None
 
-    def visit_tag_figure(self, node: Tag, *args: Any, **kwargs: Any) -> str:
+    def visit_tag_figure(self, node: Tag, ctx: VisitContext) -> Steps:
         caption_node = node.find('figcaption')
         if caption_node is not None:
-            kwargs['caption'] = caption_node.text.strip()
+            figure_ctx = ctx.replace(figure=True, caption=caption_node.text.strip())
             caption_node.extract()
+        else:
+            figure_ctx = ctx.replace(figure=True)
         # specialized for medium
         node_to_visit = node
         if 'paragraph-image' in node.get('class', []):
             noscript = node.find('noscript')
             if noscript is not None:
                 node_to_visit = noscript
-        text = self.generic_visit(node_to_visit, *args, **kwargs)
-        if caption_node is not None:
-            del kwargs['caption']
-        return f'{text}\n\n'
+        yield self.write_children(node_to_visit, figure_ctx)
+        return '\n\n'
 
-    def visit_tag_img(self, node: Tag, *args: Any, **kwargs: Any) -> str:
+    def visit_tag_img(self, node: Tag, ctx: VisitContext) -> str:
         alt = node.get('alt', '')
         height = node.get('height', '')
         width = node.get('width', '')
@@ -212,21 +265,19 @@ class AsciidocVisitor(NodeVisitor):
         srcset = node.get('srcset', node.get('data-srcset'))
         dim = f'{width}, {height}'
         dim, src = self.get_image_from_srcset(srcset, src, dim)
-        url_path = requests.compat.urljoin(kwargs['src_url'], src)
+        url_path = requests.compat.urljoin(ctx.src_url, src)
         if not (url_path.startswith('http://') or url_path.startswith('https://')):
             return ''
-        image_name = colusa.fetch.download_image(url_path, kwargs['output_dir'])
+        image_name = colusa.fetch.download_image(url_path, ctx.output_dir, ctx.image_downloader)
 
-        caption: Optional[str] = kwargs.get('caption')
-        href: Optional[str] = kwargs.get('href')
-        if not href:
+        if not ctx.href:
             href_str = ''
         else:
-            href_str = f'[link={href}]\n'
-        if not caption:
+            href_str = f'[link={ctx.href}]\n'
+        if not ctx.caption:
             return f'{href_str}image:{image_name}[{alt},{dim}]'
         else:
-            return f'.{caption}\n{href_str}image:{image_name}[{alt},{dim}]\n'
+            return f'.{ctx.caption}\n{href_str}image:{image_name}[{alt},{dim}]\n'
 
     def get_image_from_srcset(self, srcset: Optional[str], default_src: str, default_dim: str) -> tuple[str, str]:
         import re
@@ -255,35 +306,26 @@ class AsciidocVisitor(NodeVisitor):
 
         return dim, src
 
-    def visit_tag_pre(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        kwargs['pre'] = True
-        text = self.generic_visit(node, *args, **kwargs)
-        del kwargs['pre']
-        return f'''[listing]
-....
-{text}
-....
-
-'''
+    def visit_tag_pre(self, node: Tag, ctx: VisitContext) -> Steps:
+        self.output.write('[listing]\n....\n')
+        yield self.write_children(node, ctx.replace(pre=True))
+        return '\n....\n\n'
 
-    def visit_tag_code(self, node: Tag, *args: Any, **kwargs: Any) -> str:
-        text = self.generic_visit(node, *args, **kwargs)
-        if '\n' in text:
+    def visit_tag_code(self, node: Tag, ctx: VisitContext) -> Steps:
+        start = self.output.mark()
+        yield self.write_children(node, ctx)
+        if self.output.contains(start, '\n'):
             # multiline code
             lang_list = node.get('class', ['text'])
             lang = lang_list[0] if lang_list else 'text'
             lang = lang.replace('language-', '')
-            ascii_content = f'''[source, {lang}]
-----
-{text}
-----
-'''
-            return ascii_content
+            self.output.wrap(start, f'[source, {lang}]\n----\n', '\n----\n')
         else:
             # inline
-            return f'`{text}`'
+            self.output.wrap(start, '`', '`')
+        return None
 
-    def visit_tag_table(self, node: Tag, *args: Any, **kwargs: Any) -> str:
+    def visit_tag_table(self, node: Tag, ctx: VisitContext) -> Steps:
         all_tr = node.find_all('tr')
         table: list[list[str]] = []
         headers: list[str] = []
@@ -292,10 +334,10 @@ class AsciidocVisitor(NodeVisitor):
             all_td: list[str] = []
             for td in tr.contents:
                 if td.name == 'td':
-                    text = self.generic_visit(td, *args, **kwargs)
+                    text = yield self.children(td, ctx)
                     all_td.append(text)
                 if td.name == 'th':
-                    text = self.generic_visit(td, *args, **kwargs)
+                    text = yield self.children(td, ctx)
                     headers.append(text)
             if num_cols == 0:
                 num_cols = len(all_td)
@@ -0,0 +1,765 @@
+# -*- coding: utf-8 -*-
+"""Cache of downloaded content.
+
+Pages and images are kept in a `CacheStore`. Stores are pluggable, registered with
+`register_cache_store` and selected by the `cache.store` key of book configuration:
+
+- ``file`` (default): one uncompressed file per URL in ``.cached`` folder, validators
+  in a json sidecar, images in ``images`` folder
+- ``compressed``: pages compressed (gzip or zstd) in content-addressed blobs, with a
+  SQLite index of URL -> digest, size, last access and validators
+
+The store lives in the output folder of the book, unless a shared folder is set by
+`cache.shared_dir` or `COLUSA_CACHE_DIR` environment variable. Books then share cached
+content and images are linked into `images` folder of each book. Several colusa processes
+may use the same shared folder, downloads and evictions are guarded by file locks.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterator, Mapping, Optional, Type
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, locks are then no-op
+    fcntl = None  # type: ignore[assignment]
+
+from colusa import utils
+from colusa.config import CacheConfig
+from colusa.exceptions import ConfigurationError
+
+"""
+Dictionary of cache stores
+"""
+__CACHE_STORES: dict[str, Type['CacheStore']] = {}
+
+
+def register_cache_store(name: str) -> Callable[[Type['CacheStore']], Type['CacheStore']]:
+    """Register cache store class"""
+    def decorator(cls: Type['CacheStore']) -> Type['CacheStore']:
+        __CACHE_STORES[name] = cls
+        return cls
+
+    return decorator
+
+
+CACHE_DIR_ENV = 'COLUSA_CACHE_DIR'
+
+
+def get_cache_root(output_dir: str, config: CacheConfig) -> str:
+    """Folder of the cache store of book generated into `output_dir`.
+
+    Returns:
+        `config.shared_dir` if set, otherwise `COLUSA_CACHE_DIR` environment variable if set,
+        otherwise `output_dir`
+    """
+    shared_dir = config.shared_dir or os.environ.get(CACHE_DIR_ENV, '')
+    if shared_dir:
+        return os.path.expanduser(shared_dir)
+    return output_dir
+
+
+def create_cache_store(output_dir: str, config: CacheConfig) -> 'CacheStore':
+    """Create cache store selected by `config.store` for book generated into `output_dir`.
+
+    Raises:
+        ConfigurationError: if the store is not registered
+    """
+    cls = __CACHE_STORES.get(config.store)
+    if cls is None:
+        raise ConfigurationError(f'unknown cache store: {config.store}. '
+                                 f'Cache store should be one of: {", ".join(__CACHE_STORES)}')
+    return cls(get_cache_root(output_dir, config), config, output_dir)
+
+
+@contextmanager
+def _file_lock(path: str, exclusive: bool = True, blocking: bool = True) -> Iterator[bool]:
+    """
+    Hold advisory lock on `path`, created if missing
+    :return: False when lock is not acquired because `blocking` is False and lock is held elsewhere
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path, 'ab') as lock_file:
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(lock_file, operation if blocking else operation | fcntl.LOCK_NB)
+        except BlockingIOError:
+            acquired = False
+        else:
+            acquired = True
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@dataclass
+class CacheMetadata:
+    """Validators of a cached entry, stored as json sidecar next to the cached file.
+
+    Attributes:
+        url: URL of the cached content
+        etag: value of `ETag` response header
+        last_modified: value of `Last-Modified` response header
+        content_type: value of `Content-Type` response header
+        fetched_at: timestamp of the last time the entry was downloaded or revalidated
+    """
+    url: str = ''
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_type: Optional[str] = None
+    fetched_at: float = 0.0
+
+    @staticmethod
+    def sidecar_path(file_path: str) -> str:
+        return f'{file_path}.json'
+
+    @classmethod
+    def load(cls, file_path: str) -> 'CacheMetadata':
+        """Load metadata of cached file `file_path`, empty metadata when there is none.
+
+        Args:
+            file_path: path of the cached file (not the sidecar)
+        """
+        try:
+            with open(cls.sidecar_path(file_path), 'rt', encoding='utf-8') as file_in:
+                data: dict[str, Any] = json.load(file_in)
+        except (OSError, ValueError):
+            return cls()
+        known = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+    def save(self, file_path: str) -> None:
+        utils.write_file_atomic(self.sidecar_path(file_path), json.dumps(asdict(self)).encode('utf-8'))
+
+    def update(self, url: str, headers: Mapping[str, str]) -> None:
+        """Refresh metadata after a successful (200 or 304) response.
+
+        A 304 response may omit validators, previous values are kept in that case.
+        """
+        self.url = url
+        self.etag = headers.get('ETag', self.etag)
+        self.last_modified = headers.get('Last-Modified', self.last_modified)
+        self.content_type = headers.get('Content-Type', self.content_type)
+        self.fetched_at = time.time()
+
+    def is_fresh(self, ttl: float) -> bool:
+        """
+        Entry was downloaded or revalidated less than `ttl` seconds ago
+        """
+        return self.fetched_at + ttl > time.time()
+
+    def conditional_headers(self) -> dict[str, str]:
+        """
+        Request headers to revalidate the entry, empty when there is no validator
+        """
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+@dataclass
+class CacheEntry:
+    """One entry of a cache store, as listed by `CacheStore.entries`.
+
+    Attributes:
+        url: URL of the content, empty if unknown
+        kind: either `page` or `image`
+        path: file holding the content, may be shared by several entries
+        size: size of `path` in bytes
+        last_access: timestamp of the last time the entry was stored or read
+    """
+    url: str
+    kind: str
+    path: str
+    size: int
+    last_access: float
+
+
+class _Manifest:
+    """Append-only index of the entries of a sharded store, one line per change.
+
+    Each line is ``<kind>\t<path relative to root>\t<url>``, kind ``-`` removes the entry.
+    Lines are appended by every process using the store, the file is rewritten without
+    the stale lines by `compact`, which must only run under the exclusive lock of the store.
+    """
+    def __init__(self, file_path: str) -> None:
+        self.file_path: str = file_path
+        self._lock = threading.Lock()
+
+    def append(self, kind: str, path: str, url: str) -> None:
+        with self._lock, open(self.file_path, 'at', encoding='utf-8') as file_out:
+            file_out.write(f'{kind}\t{path}\t{url}\n')
+
+    def load(self) -> dict[str, tuple[str, str]]:
+        """
+        :return: kind and url of each entry, by path of the entry
+        """
+        result: dict[str, tuple[str, str]] = {}
+        try:
+            with open(self.file_path, 'rt', encoding='utf-8') as file_in:
+                for line in file_in:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) != 3:
+                        # line partially written by an interrupted process
+                        continue
+                    kind, path, url = fields
+                    if kind == '-':
+                        result.pop(path, None)
+                    else:
+                        result[path] = (kind, url)
+        except FileNotFoundError:
+            pass
+        return result
+
+    def compact(self) -> None:
+        lines = [f'{kind}\t{path}\t{url}\n' for path, (kind, url) in self.load().items()]
+        with self._lock:
+            utils.write_file_atomic(self.file_path, ''.join(lines).encode('utf-8'))
+
+
+LAYOUTS = ('flat', 'sharded')
+
+
+@register_cache_store('file')
+class CacheStore:
+    """Store of downloaded content, one file per URL.
+
+    With `flat` layout, pages are saved to ``<root>/.cached/<sha256 of url>.html``, images to
+    ``<root>/images/<image name>``. With `sharded` layout, entries are spread over two levels
+    of folders named after the first characters of their name, e.g. ``.cached/ab/cd/abcd...html``
+    and ``.cached/images/ab/cd/abcd...png``, and are listed in ``.cached/manifest``. Images are
+    then linked into the flat ``images`` folder of the book referenced by the asciidoc files.
+
+    Last access of an entry is the modification time of its file, which is refreshed on each read.
+
+    Pages are downloaded to a staging file private to the process then moved in place,
+    so processes sharing the store never see each other's partial downloads.
+    """
+    def __init__(self, root: str, config: CacheConfig, output_dir: Optional[str] = None) -> None:
+        if config.layout not in LAYOUTS:
+            raise ConfigurationError(f'unknown cache layout: {config.layout}. '
+                                     f'Cache layout should be either flat or sharded')
+        self.root: str = root
+        self.config: CacheConfig = config
+        self.output_dir: str = root if output_dir is None else output_dir
+        self.shared: bool = os.path.realpath(self.root) != os.path.realpath(self.output_dir)
+        self.sharded: bool = config.layout == 'sharded'
+        self.pages_dir: str = os.path.join(root, '.cached')
+        self.images_dir: str = os.path.join(self.pages_dir if self.sharded else root, 'images')
+        self.staging_dir: str = os.path.join(self.pages_dir, 'staging')
+        self.locks_dir: str = os.path.join(self.pages_dir, 'locks')
+        self.manifest: Optional[_Manifest] = None
+        if self.sharded:
+            self.manifest = _Manifest(os.path.join(self.pages_dir, 'manifest'))
+        for folder in [self.images_dir, self.staging_dir, self.locks_dir,
+                       os.path.join(self.output_dir, 'images')]:
+            os.makedirs(folder, exist_ok=True)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'CacheStore':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _entry_path(self, folder: str, name: str) -> str:
+        if self.sharded:
+            return os.path.join(folder, name[:2], name[2:4], name)
+        return os.path.join(folder, name)
+
+    def _relpath(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _full_path(self, path: str) -> str:
+        return os.path.join(self.root, path)
+
+    # locks
+
+    def lock(self, url_path: str) -> Any:
+        """
+        Exclusive lock of the entry of `url_path`, held while it is downloaded.
+        Only a shared store is locked, a store in the output folder is used by a single build.
+        Entries are spread over 256 lock files by the first characters of their digest,
+        so the number of lock files does not grow with the store.
+        """
+        if not self.shared:
+            return nullcontext()
+        return _file_lock(os.path.join(self.locks_dir, f'{utils.get_hexdigest(url_path)[:2]}.lock'))
+
+    def in_use(self) -> Any:
+        """
+        Shared lock of the whole store, held by a build to prevent eviction by other processes
+        """
+        return _file_lock(os.path.join(self.locks_dir, 'store.lock'), exclusive=False)
+
+    def try_exclusive(self) -> Any:
+        """
+        Exclusive lock of the whole store, not acquired when the store is in use by any build
+        :return: context manager yielding whether the lock is acquired
+        """
+        return _file_lock(os.path.join(self.locks_dir, 'store.lock'), blocking=False)
+
+    # pages
+
+    def page_path(self, url_path: str) -> str:
+        return self._entry_path(self.pages_dir, f'{utils.get_hexdigest(url_path)}.html')
+
+    def page_download_path(self, url_path: str) -> str:
+        """
+        Path to download content of `url_path` to, before calling `commit_page`
+        """
+        return os.path.join(self.staging_dir, f'{utils.get_hexdigest(url_path)}.{os.getpid()}.html')
+
+    def has_page(self, url_path: str) -> bool:
+        return os.path.exists(self.page_path(url_path))
+
+    def read_page(self, url_path: str) -> bytes:
+        file_path = self.page_path(url_path)
+        with open(file_path, 'rb') as file_in:
+            data = file_in.read()
+        os.utime(file_path)
+        return data
+
+    def page_metadata(self, url_path: str) -> CacheMetadata:
+        return CacheMetadata.load(self.page_path(url_path))
+
+    def commit_page(self, url_path: str, metadata: CacheMetadata) -> None:
+        """
+        Store the content downloaded to `page_download_path` with its metadata
+        """
+        file_path = self.page_path(url_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        os.replace(self.page_download_path(url_path), file_path)
+        metadata.save(file_path)
+        if self.manifest is not None:
+            self.manifest.append('page', self._relpath(file_path), url_path)
+
+    def touch_page(self, url_path: str, metadata: CacheMetadata) -> None:
+        """
+        Cached page is revalidated, store its refreshed metadata
+        """
+        file_path = self.page_path(url_path)
+        metadata.save(file_path)
+        os.utime(file_path)
+
+    # images
+
+    def image_path(self, url_path: str) -> str:
+        return self._entry_path(self.images_dir, utils.get_image_name(url_path))
+
+    def image_download_path(self, url_path: str) -> str:
+        """
+        Path to download image of `url_path` to, before calling `commit_image`
+        """
+        image_path = self.image_path(url_path)
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        return image_path
+
+    def has_image(self, url_path: str) -> bool:
+        return os.path.exists(self.image_path(url_path))
+
+    def commit_image(self, url_path: str) -> None:
+        if self.manifest is not None:
+            self.manifest.append('image', self._relpath(self.image_path(url_path)), url_path)
+
+    def touch_image(self, url_path: str) -> None:
+        os.utime(self.image_path(url_path))
+
+    def link_image(self, url_path: str, file_path: str) -> None:
+        """
+        Make cached image of `url_path` available at `file_path` in the output folder of the book
+        """
+        image_path = self.image_path(url_path)
+        if os.path.realpath(image_path) != os.path.realpath(file_path):
+            utils.link_file(image_path, file_path)
+
+    # maintenance
+
+    @staticmethod
+    def _is_content_file(kind: str, name: str) -> bool:
+        if kind == 'page':
+            return name.endswith('.html')
+        return not name.endswith(('.json', '.part', '.temp'))
+
+    def _flat_files(self, kind: str, folder: str) -> Iterator[os.DirEntry[str]]:
+        with os.scandir(folder) as it:
+            for item in it:
+                if item.is_file() and self._is_content_file(kind, item.name):
+                    yield item
+
+    def entries(self) -> Iterator[CacheEntry]:
+        if self.manifest is not None:
+            for path, (kind, url) in self.manifest.load().items():
+                try:
+                    stat = os.stat(self._full_path(path))
+                except FileNotFoundError:
+                    continue
+                yield CacheEntry(url, kind, self._full_path(path), stat.st_size, stat.st_mtime)
+            return
+        for kind, folder in [('page', self.pages_dir), ('image', self.images_dir)]:
+            for item in self._flat_files(kind, folder):
+                url = CacheMetadata.load(item.path).url if kind == 'page' else ''
+                stat = item.stat()
+                yield CacheEntry(url, kind, item.path, stat.st_size, stat.st_mtime)
+
+    def remove(self, entry: CacheEntry) -> int:
+        """
+        Remove `entry` from the store
+        :return: number of bytes freed
+        """
+        os.remove(entry.path)
+        if os.path.exists(CacheMetadata.sidecar_path(entry.path)):
+            os.remove(CacheMetadata.sidecar_path(entry.path))
+        if self.manifest is not None:
+            self.manifest.append('-', self._relpath(entry.path), '')
+        return entry.size
+
+    def stats(self) -> dict[str, tuple[int, int]]:
+        """
+        :return: number of entries and total size in bytes, by kind of entry
+        """
+        result: dict[str, tuple[int, int]] = {}
+        seen: set[str] = set()
+        for entry in self.entries():
+            count, size = result.get(entry.kind, (0, 0))
+            if entry.path not in seen:
+                seen.add(entry.path)
+                size += entry.size
+            result[entry.kind] = (count + 1, size)
+        return result
+
+    def gc(self, max_size: int, keep_since: float = float('inf')) -> list[CacheEntry]:
+        """
+        Evict least recently used entries until store is not larger than `max_size` bytes.
+        Entries accessed at or after `keep_since` are never evicted. Images are only evicted
+        from a shared store, images of a store in the output folder are referenced by the
+        generated asciidoc files and are not counted.
+        :return: evicted entries
+        """
+        entries = sorted((e for e in self.entries() if self.shared or e.kind != 'image'),
+                         key=lambda e: e.last_access)
+        sizes = {e.path: e.size for e in entries}
+        total = sum(sizes.values())
+        removed: list[CacheEntry] = []
+        for entry in entries:
+            if total <= max_size or entry.last_access >= keep_since:
+                break
+            total -= self.remove(entry)
+            removed.append(entry)
+        if self.manifest is not None:
+            self.manifest.compact()
+        return removed
+
+    def migrate(self) -> int:
+        """
+        Move entries saved with `flat` layout to `sharded` layout of the store.
+        Images of flat layout are kept when the store is in the output folder of the book,
+        they are referenced by the generated asciidoc files.
+        :return: number of migrated entries
+        """
+        if self.manifest is None:
+            raise ConfigurationError('cache.layout must be sharded to migrate the cache')
+        count = 0
+        for item in list(self._flat_files('page', self.pages_dir)):
+            file_path = self._entry_path(self.pages_dir, item.name)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            sidecar = CacheMetadata.sidecar_path(item.path)
+            url = CacheMetadata.load(item.path).url
+            if os.path.exists(sidecar):
+                os.replace(sidecar, CacheMetadata.sidecar_path(file_path))
+            os.replace(item.path, file_path)
+            self.manifest.append('page', self._relpath(file_path), url)
+            count += 1
+        for image_path in self._migrate_flat_images():
+            self.manifest.append('image', self._relpath(image_path), '')
+            count += 1
+        self.manifest.compact()
+        return count
+
+    def _migrate_flat_images(self) -> Iterator[str]:
+        """
+        Link images of flat layout into sharded layout
+        :return: new path of each image
+        """
+        flat_dir = os.path.join(self.root, 'images')
+        if not os.path.isdir(flat_dir):
+            return
+        for item in list(self._flat_files('image', flat_dir)):
+            image_path = self._entry_path(self.images_dir, item.name)
+            migrated = os.path.exists(image_path) and os.path.samefile(item.path, image_path)
+            if not migrated:
+                os.makedirs(os.path.dirname(image_path), exist_ok=True)
+                utils.link_file(item.path, image_path)
+            if self.shared:
+                os.remove(item.path)
+            if not migrated:
+                yield image_path
+
+    def verify(self) -> list[str]:
+        """
+        Check integrity of the store
+        :return: description of every problem found
+        """
+        problems: list[str] = []
+        # images of sharded layout are inside the pages folder
+        folders = [self.pages_dir] if self.sharded else [self.pages_dir, self.images_dir]
+        for folder in folders:
+            for dir_path, _, names in os.walk(folder):
+                for name in names:
+                    if name.endswith('.part'):
+                        problems.append(f'incomplete download: {os.path.join(dir_path, name)}')
+        for entry in self.entries():
+            if entry.size == 0:
+                problems.append(f'empty {entry.kind}: {entry.path}')
+            problems.extend(self._verify_entry(entry))
+        return problems
+
+    def _verify_entry(self, entry: CacheEntry) -> list[str]:
+        sidecar = CacheMetadata.sidecar_path(entry.path)
+        if entry.kind == 'page' and os.path.exists(sidecar):
+            try:
+                with open(sidecar, 'rt', encoding='utf-8') as file_in:
+                    json.load(file_in)
+            except ValueError:
+                return [f'corrupted metadata: {sidecar}']
+        return []
+
+
+# compression of page blobs by suffix of their file name
+_CODEC_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+class _Codec:
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        if name == 'gzip':
+            self.suffix = '.gz'
+            self.compress: Callable[[bytes], bytes] = gzip.compress
+            self.decompress: Callable[[bytes], bytes] = gzip.decompress
+        elif name == 'zstd':
+            try:
+                import zstandard
+            except ImportError as ex:
+                raise ConfigurationError('zstd compression requires zstandard package. '
+                                         'Install it with: pip install colusa[zstd]') from ex
+            self.suffix = '.zst'
+            self.compress = zstandard.ZstdCompressor().compress
+            self.decompress = zstandard.ZstdDecompressor().decompress
+        else:
+            raise ConfigurationError(f'unknown cache compression: {name}. '
+                                     f'Cache compression should be either gzip or zstd')
+
+
+@register_cache_store('compressed')
+class CompressedCacheStore(CacheStore):
+    """Store of downloaded content with compressed, content-addressed pages.
+
+    Pages are saved to ``<root>/.cached/blobs/<sha256 of content>.html.gz`` (or ``.zst``),
+    so identical pages are stored once. Blobs are decompressed by the codec of their suffix,
+    so changing `cache.compression` keeps existing pages readable. ``<root>/.cached/index.sqlite`` maps URL of every
+    page and image to its file, size, last access and validators, it is the manifest of
+    the `sharded` layout.
+    """
+    def __init__(self, root: str, config: CacheConfig, output_dir: Optional[str] = None) -> None:
+        super().__init__(root, config, output_dir)
+        self.manifest = None
+        self.codec = _Codec(config.compression)
+        self._codecs: dict[str, Optional[_Codec]] = {self.codec.suffix: self.codec}
+        self.blobs_dir: str = os.path.join(self.pages_dir, 'blobs')
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.pages_dir, 'index.sqlite'),
+                                   timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                fetched_at REAL NOT NULL DEFAULT 0
+            )''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _row(self, url_path: str) -> Optional[tuple[Any, ...]]:
+        with self._lock:
+            return self._db.execute('SELECT path, etag, last_modified, content_type, fetched_at '
+                                    'FROM entries WHERE url = ?', (url_path,)).fetchone()
+
+    def _touch(self, url_path: str) -> None:
+        with self._lock, self._db:
+            self._db.execute('UPDATE entries SET last_access = ? WHERE url = ?', (time.time(), url_path))
+
+    def _put(self, url_path: str, kind: str, path: str, digest: str, size: int,
+             metadata: Optional[CacheMetadata] = None) -> None:
+        metadata = metadata or CacheMetadata(url_path)
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (url_path, kind, path, digest, size, time.time(), metadata.etag,
+                              metadata.last_modified, metadata.content_type, metadata.fetched_at))
+
+    def _blob_codec(self, path: str) -> Optional[_Codec]:
+        """
+        Codec of page blob `path`, None when it cannot be decompressed here
+        """
+        suffix = os.path.splitext(path)[1]
+        if suffix not in self._codecs:
+            try:
+                self._codecs[suffix] = _Codec(_CODEC_SUFFIXES[suffix]) if suffix in _CODEC_SUFFIXES else None
+            except ConfigurationError:
+                self._codecs[suffix] = None
+        return self._codecs[suffix]
+
+    # pages
+
+    def has_page(self, url_path: str) -> bool:
+        row = self._row(url_path)
+        return row is not None and os.path.exists(self._full_path(row[0])) and self._blob_codec(row[0]) is not None
+
+    def read_page(self, url_path: str) -> bytes:
+        row = self._row(url_path)
+        codec = self._blob_codec(row[0]) if row is not None else None
+        if row is None or codec is None:
+            raise FileNotFoundError(f'{url_path} is not in cache')
+        with open(self._full_path(row[0]), 'rb') as file_in:
+            data = codec.decompress(file_in.read())
+        self._touch(url_path)
+        return data
+
+    def page_metadata(self, url_path: str) -> CacheMetadata:
+        row = self._row(url_path)
+        if row is None:
+            return CacheMetadata()
+        _, etag, last_modified, content_type, fetched_at = row
+        return CacheMetadata(url_path, etag, last_modified, content_type, fetched_at)
+
+    def commit_page(self, url_path: str, metadata: CacheMetadata) -> None:
+        staging_path = self.page_download_path(url_path)
+        with open(staging_path, 'rb') as file_in:
+            data = file_in.read()
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._entry_path(self.blobs_dir, f'{digest}.html{self.codec.suffix}')
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            utils.write_file_atomic(blob_path, self.codec.compress(data))
+        os.remove(staging_path)
+        self._put(url_path, 'page', self._relpath(blob_path), digest, os.path.getsize(blob_path), metadata)
+
+    def touch_page(self, url_path: str, metadata: CacheMetadata) -> None:
+        with self._lock, self._db:
+            self._db.execute('UPDATE entries SET last_access = ?, etag = ?, last_modified = ?, '
+                             'content_type = ?, fetched_at = ? WHERE url = ?',
+                             (time.time(), metadata.etag, metadata.last_modified, metadata.content_type,
+                              metadata.fetched_at, url_path))
+
+    # images, already compressed formats, stored as is
+
+    def commit_image(self, url_path: str) -> None:
+        image_path = self.image_path(url_path)
+        with open(image_path, 'rb') as file_in:
+            digest = hashlib.sha256(file_in.read()).hexdigest()
+        self._put(url_path, 'image', self._relpath(image_path), digest, os.path.getsize(image_path))
+
+    def touch_image(self, url_path: str) -> None:
+        if self._row(url_path) is None:
+            # image downloaded before the store was used
+            self.commit_image(url_path)
+        else:
+            self._touch(url_path)
+
+    # maintenance
+
+    def entries(self) -> Iterator[CacheEntry]:
+        with self._lock:
+            rows = self._db.execute('SELECT url, kind, path, size, last_access FROM entries').fetchall()
+        for url, kind, path, size, last_access in rows:
+            yield CacheEntry(url, kind, self._full_path(path), size, last_access)
+
+    def remove(self, entry: CacheEntry) -> int:
+        path = self._relpath(entry.path)
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM entries WHERE url = ?', (entry.url,))
+            shared = self._db.execute('SELECT COUNT(*) FROM entries WHERE path = ?', (path,)).fetchone()[0]
+        if shared > 0 or not os.path.exists(entry.path):
+            return 0
+        os.remove(entry.path)
+        return entry.size
+
+    def verify(self) -> list[str]:
+        problems = super().verify()
+        with self._lock:
+            known = {row[0] for row in self._db.execute('SELECT path FROM entries')}
+        for dir_path, _, names in os.walk(self.blobs_dir):
+            for name in names:
+                blob_path = os.path.join(dir_path, name)
+                if self._relpath(blob_path) not in known:
+                    problems.append(f'orphan blob: {blob_path}')
+        return problems
+
+    def migrate(self) -> int:
+        if not self.sharded:
+            raise ConfigurationError('cache.layout must be sharded to migrate the cache')
+        with self._lock:
+            rows = self._db.execute('SELECT url, kind, path FROM entries').fetchall()
+        count = 0
+        for url, kind, path in rows:
+            folder = self.blobs_dir if kind == 'page' else self.images_dir
+            new_path = self._entry_path(folder, os.path.basename(path))
+            if self._relpath(new_path) == path:
+                continue
+            if not os.path.exists(new_path):
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                if kind == 'page':
+                    os.replace(self._full_path(path), new_path)
+                else:
+                    utils.link_file(self._full_path(path), new_path)
+            if kind == 'image' and self.shared and os.path.exists(self._full_path(path)):
+                os.remove(self._full_path(path))
+            with self._lock, self._db:
+                self._db.execute('UPDATE entries SET path = ? WHERE url = ?', (self._relpath(new_path), url))
+            count += 1
+        return count
+
+    def _verify_entry(self, entry: CacheEntry) -> list[str]:
+        if not os.path.exists(entry.path):
+            return [f'missing {entry.kind} of {entry.url}: {entry.path}']
+        with self._lock:
+            digest = self._db.execute('SELECT digest FROM entries WHERE url = ?', (entry.url,)).fetchone()[0]
+        with open(entry.path, 'rb') as file_in:
+            data = file_in.read()
+        try:
+            if entry.kind == 'page':
+                codec = self._blob_codec(entry.path)
+                if codec is None:
+                    return [f'unreadable {entry.kind} of {entry.url}: {entry.path}']
+                data = codec.decompress(data)
+        except Exception as ex:
+            return [f'corrupted {entry.kind} of {entry.url}: {ex}']
+        if hashlib.sha256(data).hexdigest() != digest:
+            return [f'digest mismatch of {entry.kind} of {entry.url}: {entry.path}']
+        return []
@@ -3,6 +3,7 @@ import sys
 from typing import Any
 
 from colusa import Colusa, ConfigurationError, logs
+from colusa.exceptions import DeadlineExceededError
 
 
 def main() -> None:
@@ -29,6 +30,17 @@ def parse_args() -> argparse.Namespace:
     generate_parser.add_argument('input', type=str, help='Configuration file. '
                                                          'File extension should be either json or yml')
 
+    cache_parser = commands.add_parser('cache', help='Inspect and maintain the cache of downloaded content')
+    cache_parser.set_defaults(func=maintain_cache)
+    cache_parser.add_argument('action', choices=['stats', 'gc', 'verify', 'migrate'],
+                              help='stats: show cache size, gc: evict least recently used entries, '
+                                   'verify: check integrity of cached entries, '
+                                   'migrate: move flat cache into the sharded layout of configuration')
+    cache_parser.add_argument('input', type=str, help='Configuration file. '
+                                                      'File extension should be either json or yml')
+    cache_parser.add_argument('--max-size-mb', type=int, default=None,
+                              help='Size limit of the cache for gc (default: cache.max_size_mb of configuration)')
+
     crawler_parse = commands.add_parser('crawl',
                         help='Crawl an URL to generate list of URLs')
     crawler_parse.set_defaults(func=crawl_url)
@@ -49,6 +61,14 @@ def init(args: argparse.Namespace) -> None:
 def generate(args: argparse.Namespace) -> None:
     try:
         Colusa.generate_book(args.input)
+    except (ConfigurationError, DeadlineExceededError) as e:
+        logs.error(e)
+
+
+def maintain_cache(args: argparse.Namespace) -> None:
+    try:
+        if not Colusa.maintain_cache(args.input, args.action, args.max_size_mb):
+            sys.exit(1)
     except ConfigurationError as e:
         logs.error(e)
 
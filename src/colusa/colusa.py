@@ -1,12 +1,15 @@
-from typing import Any, Optional, Union
-from bs4 import BeautifulSoup
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Union
 import pathlib
 import json
+import time
 import yaml
-import os
 
-from colusa import logs, etr, utils, fetch, ConfigurationError
-from colusa.config import BookConfig, MakeConfig
+from colusa import logs, cache, etr, utils, fetch, ConfigurationError
+from colusa.config import BookConfig, MakeConfig, PartConfig
+from colusa.manifest import BuildManifest
+from colusa.pipeline import ChapterPipeline, RenderedChapter, chapter_basename, transform_content, write_chapter
 
 
 class Colusa:
@@ -25,8 +28,17 @@ class Colusa:
             self.config = BookConfig.from_dict(configuration)
         
         self.output_dir = self.config.output_dir
+        self.parser = etr.resolve_parser(self.config.parser)
         self.book_maker = etr.Render(self.config)
-        self.downloader = fetch.Downloader(self.config.downloader)
+        # keep enough pooled connections for every prefetch and image worker
+        downloader_config = {'pool_maxsize': max(10, self.config.concurrency + self.config.image_concurrency)}
+        downloader_config.update(self.config.downloader)
+        self.downloader = fetch.Downloader(downloader_config)
+        self.cache_store = cache.create_cache_store(self.output_dir, self.config.cache)
+        self.image_downloader = fetch.ImageDownloader(self.downloader, self.config.image_concurrency,
+                                                      self.cache_store)
+        self._prefetched: dict[str, Future[Optional[fetch.DownloadResult]]] = {}
+        self._revalidated: set[str] = set()
         populate_extractor_config(self.config.extractors)
         populate_transformer_config(self.config.transformers)
 
@@ -47,6 +59,7 @@ class Colusa:
             "book_file_name": "index.asciidoc",
             "multi_part": False,
             "metadata": True,
+            "incremental": True,
             "make": {
                 'html': '',
                 'epub': '',
@@ -81,6 +94,52 @@ class Colusa:
         with Colusa(configs) as s:
             s.generate()
 
+    @classmethod
+    def maintain_cache(cls, config_file_path: str, command: str, max_size_mb: Optional[int] = None) -> bool:
+        """
+        Run maintenance `command` on the cache store of book configured by `config_file_path`
+
+        - ``stats``: print number of entries and size of the cache
+        - ``gc``: evict least recently used entries until the cache fits `max_size_mb`
+          (default: `cache.max_size_mb` of the configuration), unless a build is using the cache
+        - ``verify``: check that every cached entry is readable and not corrupted
+        - ``migrate``: move entries of `flat` layout into `sharded` layout, set by `cache.layout`
+
+        :return: False if the command failed, True otherwise
+        """
+        configs = cls._read_configuration_file(config_file_path)
+        with cache.create_cache_store(configs.output_dir, configs.cache) as store:
+            if command == 'stats':
+                for kind, (count, size) in sorted(store.stats().items()):
+                    logs.info(f'{kind}: {count} entries, {size / (1024 * 1024):.2f} MB')
+            elif command == 'gc':
+                limit = configs.cache.max_size_mb if max_size_mb is None else max_size_mb
+                if limit <= 0:
+                    raise ConfigurationError('cache size limit is not set, use --max-size-mb '
+                                             'or cache.max_size_mb of configuration')
+                with store.try_exclusive() as acquired:
+                    if not acquired:
+                        logs.error('cache is in use by another build')
+                        return False
+                    evicted = store.gc(limit * 1024 * 1024)
+                logs.info(f'evicted {len(evicted)} entries, {sum(e.size for e in evicted)} bytes')
+            elif command == 'migrate':
+                with store.try_exclusive() as acquired:
+                    if not acquired:
+                        logs.error('cache is in use by another build')
+                        return False
+                    logs.info(f'migrated {store.migrate()} entries')
+            elif command == 'verify':
+                problems = store.verify()
+                for problem in problems:
+                    logs.error(problem)
+                if len(problems) > 0:
+                    return False
+                logs.info('cache is valid')
+            else:
+                raise ConfigurationError(f'unknown cache command: {command}')
+        return True
+
     @classmethod
     def _read_configuration_file(cls, file_path: str) -> BookConfig:
         """
@@ -103,27 +162,103 @@ class Colusa:
 
     def download_content(self, url_path: str) -> str:
         """
-        Download html content of given `url_path` then cached in `.cached` folder of local file system
+        Download html content of given `url_path` then cached in the cache store of local file system
         :param url_path: url of html article
         :return: content of downloaded file
         """
+        self.fetch_content(url_path)
+        logs.info(url_path)
 
-        import chardet
+        data = self.cache_store.read_page(url_path)
+        return utils.decode_document(data, self.cache_store.page_metadata(url_path).content_type)
 
-        output_path = pathlib.Path(self.output_dir)
-        cached_file_path = output_path.joinpath('.cached', f'{utils.get_hexdigest(url_path)}.html')
-        logs.info(url_path, cached_file_path)
+    def _request_headers_for(self, url_path: str) -> Optional[tuple[bool, dict[str, str]]]:
+        """
+        Decide if `url_path` has to be (re)downloaded into the cache
+        :return: None when cached copy can be used as is, otherwise a tuple of `refetch`, true when
+            a stale cached copy has to be downloaded again, and the extra request headers, which
+            carry the validators of cached copy when it is revalidated
+        """
+        if not self.cache_store.has_page(url_path):
+            return False, {}
+        if not self.config.cache.revalidate or url_path in self._revalidated:
+            return None
+        metadata = self.cache_store.page_metadata(url_path)
+        if metadata.is_fresh(self.config.cache.ttl):
+            return None
+        return True, metadata.conditional_headers()
+
+    def _commit_download(self, url_path: str, result: Optional[fetch.DownloadResult]) -> None:
+        if result is None or result.status_code not in (200, 304):
+            return
+        metadata = self.cache_store.page_metadata(url_path)
+        metadata.update(url_path, result.headers)
+        if result.not_modified:
+            logs.info('not modified:', url_path)
+            self.cache_store.touch_page(url_path, metadata)
+        else:
+            self.cache_store.commit_page(url_path, metadata)
+        self._revalidated.add(url_path)
 
-        if not cached_file_path.exists():
+    def _download_to_cache(self, url_path: str, refetch: bool, headers: dict[str, str]) -> None:
+        # other processes sharing the cache store may download the same page
+        with self.cache_store.lock(url_path):
+            if not refetch and self.cache_store.has_page(url_path):
+                return
             # download file from url_path
-            self.downloader.download_url(url_path, str(cached_file_path))
+            download_path = self.cache_store.page_download_path(url_path)
+            result = self.downloader.download_url(url_path, download_path, headers)
+            self._commit_download(url_path, result)
 
-        with open(cached_file_path, 'rb') as f:
-            result = chardet.detect(f.read())
-            encoding = result['encoding']
-        with open(cached_file_path, 'rt', encoding=encoding) as file_in:
-            content = file_in.read()
-        return content
+    def fetch_content(self, url_path: str) -> None:
+        """
+        Make sure html content of `url_path` is in the cache store, waiting for
+        the prefetch of `url_path` if it is still in flight
+        :param url_path: url of html article
+        """
+        pending = self._prefetched.pop(url_path, None)
+        if pending is not None:
+            result = pending.result()
+            if self.downloader.is_async(url_path):
+                # asyncio downloads are committed here, worker threads commit their own downloads
+                self._commit_download(url_path, result)
+            return
+        request = self._request_headers_for(url_path)
+        if request is not None:
+            self._download_to_cache(url_path, *request)
+
+    @contextmanager
+    def prefetch(self, urls: list[str]) -> Iterator[None]:
+        """
+        Download `urls` into the cache store in background using `config.concurrency` workers
+        while the body of the `with` statement renders chapters. Nothing is prefetched when
+        concurrency is not greater than 1, content is then downloaded on demand.
+        URLs handled by an asyncio fetcher are queued to the event loop of the downloader
+        instead of the worker threads.
+        """
+        if self.config.concurrency <= 1:
+            yield
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.config.concurrency,
+                                      thread_name_prefix='colusa-prefetch')
+        try:
+            for url_path in dict.fromkeys(urls):
+                request = self._request_headers_for(url_path)
+                if request is None:
+                    continue
+                if self.downloader.is_async(url_path):
+                    download_path = self.cache_store.page_download_path(url_path)
+                    future = self.downloader.submit(url_path, download_path, request[1])
+                else:
+                    future = executor.submit(self._download_to_cache, url_path, *request)
+                self._prefetched[url_path] = future
+            yield
+        finally:
+            for future in self._prefetched.values():
+                future.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._prefetched.clear()
 
     @staticmethod
     def _get_saved_file_name(url_path: str) -> str:
@@ -139,8 +274,7 @@ class Colusa:
         Returns:
             str: calculated file name
         """
-        p = pathlib.PurePath(url_path)
-        return f'{p.name}_{utils.get_short_hexdigest(url_path)}'
+        return chapter_basename(url_path)
 
     def __enter__(self) -> 'Colusa':
         return self
@@ -149,56 +283,61 @@ class Colusa:
         self.close()
     
     def close(self) -> None:
+        self.image_downloader.close()
         self.downloader.close()
+        self.cache_store.close()
 
-    def ebook_generate_content(self, url_path: str) -> None:
+    def ebook_generate_content(self, url_path: str) -> Optional[RenderedChapter]:
         content = self.download_content(url_path)
-        bs = BeautifulSoup(content, 'html.parser')
-
-        chapter_metadata = self.config.metadata
-        title_strip = self.config.title_prefix_trim
-        try:
-            extractor = etr.create_extractor(url_path, bs)
-            extractor.cleanup()
-            transformer = etr.create_transformer(url_path, extractor.get_content(), self.output_dir)
-            transformer.transform()
-            file_path = self.book_maker.render_chapter(extractor, transformer, url_path,
-                                           self._get_saved_file_name(url_path),
-                                           metadata=chapter_metadata,
-                                           title_strip=title_strip)
-            for pp in self.config.postprocessing:
-                pp_name = pp.processor
-                pp_params = pp.params
-                pcls = etr.create_postprocessor(pp_name, file_path, pp_params)
-                pcls.run()
-        except etr.ContentNotFoundError as e:
-            logs.error(e, url_path)
-            # raise e
+        chapter = transform_content(url_path, content, self.config, self.parser, self.book_maker,
+                                    self.image_downloader)
+        if chapter is not None:
+            write_chapter(chapter, self.config, self.book_maker, self.image_downloader)
+        return chapter
 
     def generate(self) -> None:
-        os.makedirs(os.path.join(self.output_dir, ".cached"), exist_ok=True)
-        os.makedirs(os.path.join(self.output_dir, "images"), exist_ok=True)
+        build_started = time.time()
         self.book_maker.generate_makefile(self.config.make)
 
         if self.config.multi_part:
-            self._generate_book_multi_part()
+            urls = [url_path for part in self.config.parts for url_path in part.urls]
         else:
-            self._generate_book_single_part()
+            urls = self.config.urls
+        # a shared cache store is not evicted by other processes while this book is built
+        with self.cache_store.in_use(), self.prefetch(urls):
+            manifest = BuildManifest(self.output_dir) if self.config.incremental else None
+            pipeline = ChapterPipeline(self.config, self.parser, self.book_maker, self.image_downloader,
+                                       self.download_content, manifest)
+            pipeline.run(self._book_sections())
 
+            # every image referenced by the chapters must be on disk before the book is usable
+            self.image_downloader.drain()
         self.book_maker.ebook_generate_master_file()
 
-    def _generate_book_single_part(self) -> None:
+        if self.config.cache.max_size_mb > 0:
+            self._evict_cache(build_started)
+
+    def _evict_cache(self, build_started: float) -> None:
+        with self.cache_store.try_exclusive() as acquired:
+            if not acquired:
+                logs.info('cache is in use by another build, eviction is skipped')
+                return
+            # entries used by this build are kept even when they alone exceed the limit
+            evicted = self.cache_store.gc(self.config.cache.max_size_mb * 1024 * 1024, keep_since=build_started)
+            if len(evicted) > 0:
+                logs.info(f'evicted {len(evicted)} entries from cache')
+
+    def _book_sections(self) -> list[tuple[Optional[PartConfig], list[str]]]:
+        """
+        Parts of the book with their urls, in book order. Single part book is one section without part
+        """
+        if self.config.multi_part:
+            parts = self.config.parts
+            if len(parts) == 0:
+                raise ConfigurationError('parts field must contain at least one part object')
+            return [(part, part.urls) for part in parts]
+
         paths = self.config.urls
         if len(paths) == 0:
             raise ConfigurationError('urls field must contain at least one url')
-        for url_path in paths:
-            self.ebook_generate_content(url_path)
-
-    def _generate_book_multi_part(self) -> None:
-        parts = self.config.parts
-        if len(parts) == 0:
-            raise ConfigurationError('parts field must contain at least one part object')
-        for part in parts:
-            self.book_maker.render_book_part(part.title, part.description)
-            for url_path in part.urls:
-                self.ebook_generate_content(url_path)
+        return [(None, paths)]
@@ -28,6 +28,31 @@ class PartConfig:
     urls: list[str] = field(default_factory=list)
 
 
+@dataclass
+class CacheConfig:
+    """Configuration for the cache of downloaded content.
+
+    Attributes:
+        revalidate: Revalidate cached pages with conditional requests (ETag / Last-Modified)
+        ttl: Number of seconds a cached page is considered fresh without revalidation
+        store: Name of the cache store, either `file` or `compressed`
+        compression: Compression of pages in `compressed` store, either `gzip` or `zstd`
+        max_size_mb: Size limit of the cache in MB, least recently used entries are evicted
+            after each build (0 means unlimited)
+        shared_dir: Folder of the cache shared by every book, overrides `COLUSA_CACHE_DIR`
+            environment variable (default: cache is kept in output folder of the book)
+        layout: Layout of cached files, either `flat` or `sharded` into two levels of
+            folders for large caches
+    """
+    revalidate: bool = False
+    ttl: int = 0
+    store: str = 'file'
+    compression: str = 'gzip'
+    max_size_mb: int = 0
+    shared_dir: str = ''
+    layout: str = 'flat'
+
+
 @dataclass
 class DownloaderConfig:
     """Configuration for the content downloader."""
@@ -54,6 +79,18 @@ class BookConfig:
         urls: List of URLs to process (for single-part books)
         book_properties: Additional asciidoc book properties
         title_prefix_trim: Prefix to strip from article titles
+        cache: Cache settings of downloaded content
+        concurrency: Number of workers used to prefetch articles into the cache
+        image_concurrency: Number of workers used to download images in background
+        processes: Number of processes transforming articles in parallel, articles are
+            transformed in the build process when it is not greater than 1
+        max_in_flight: Maximum number of articles being fetched, transformed or written at
+            the same time (default: twice the number of workers)
+        incremental: Skip articles whose content, plugin code and configuration did not change
+            since the previous build, as recorded in the build manifest of `output_dir`
+            (default: false, every article is rebuilt)
+        parser: BeautifulSoup parser of articles, one of `lxml`, `html5lib`, `html.parser`
+            (default: lxml when installed, html.parser otherwise)
         downloader: Downloader configuration
         extractors: Extractor-specific configurations
         transformers: Transformer-specific configurations
@@ -72,6 +109,13 @@ class BookConfig:
     urls: list[str] = field(default_factory=list)
     book_properties: list[str] = field(default_factory=list)
     title_prefix_trim: str = ''
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    concurrency: int = 1
+    image_concurrency: int = 4
+    processes: int = 1
+    max_in_flight: int = 0
+    incremental: bool = False
+    parser: str = ''
     downloader: dict[str, Any] = field(default_factory=dict)
     extractors: dict[str, Any] = field(default_factory=dict)
     transformers: dict[str, Any] = field(default_factory=dict)
@@ -93,6 +137,17 @@ class BookConfig:
             pdf=make_data.get('pdf', ''),
         )
         
+        cache_data = data.get('cache', {})
+        cache_config = CacheConfig(
+            revalidate=cache_data.get('revalidate', False),
+            ttl=cache_data.get('ttl', 0),
+            store=cache_data.get('store', 'file'),
+            compression=cache_data.get('compression', 'gzip'),
+            max_size_mb=cache_data.get('max_size_mb', 0),
+            shared_dir=cache_data.get('shared_dir', ''),
+            layout=cache_data.get('layout', 'flat'),
+        )
+
         postprocessing = [
             PostProcessingConfig(
                 processor=pp.get('processor', ''),
@@ -125,6 +180,13 @@ class BookConfig:
             urls=data.get('urls', []),
             book_properties=data.get('book_properties', []),
             title_prefix_trim=data.get('title_prefix_trim', ''),
+            cache=cache_config,
+            concurrency=data.get('concurrency', 1),
+            image_concurrency=data.get('image_concurrency', 4),
+            processes=data.get('processes', 1),
+            max_in_flight=data.get('max_in_flight', 0),
+            incremental=data.get('incremental', False),
+            parser=data.get('parser', ''),
             downloader=data.get('downloader', {}),
             extractors=data.get('extractors', {}),
             transformers=data.get('transformers', {}),
@@ -161,6 +223,21 @@ class BookConfig:
             'urls': self.urls,
             'book_properties': self.book_properties,
             'title_prefix_trim': self.title_prefix_trim,
+            'cache': {
+                'revalidate': self.cache.revalidate,
+                'ttl': self.cache.ttl,
+                'store': self.cache.store,
+                'compression': self.cache.compression,
+                'max_size_mb': self.cache.max_size_mb,
+                'shared_dir': self.cache.shared_dir,
+                'layout': self.cache.layout,
+            },
+            'concurrency': self.concurrency,
+            'image_concurrency': self.image_concurrency,
+            'processes': self.processes,
+            'max_in_flight': self.max_in_flight,
+            'incremental': self.incremental,
+            'parser': self.parser,
             'downloader': self.downloader,
             'extractors': self.extractors,
             'transformers': self.transformers,
@@ -1,11 +1,12 @@
 from typing import Any, TextIO
-from colusa import logs
+from colusa import logs, utils
+from colusa.cache import CacheMetadata, create_cache_store
+from colusa.config import CacheConfig
+from colusa.etr import resolve_parser
 from colusa.fetch import Downloader
 from bs4 import BeautifulSoup
-import pathlib
 from collections import OrderedDict
 from urllib.parse import urljoin
-from colusa import utils
 
 
 class Crawler:
@@ -20,7 +21,7 @@ class Crawler:
     def run(self) -> None:
         logs.info(f"hello: {self.url}")
         self.content = self.download_content()
-        self.dom = BeautifulSoup(self.content, 'html.parser')
+        self.dom = BeautifulSoup(self.content, resolve_parser())
 
         table_chapter = self.dom.find('table', id='chapters')
         anchors = table_chapter.find_all('a')
@@ -36,18 +37,22 @@ class Crawler:
 
     def download_content(self) -> str:
         """
-        Download html content of given `url_path` then cached in `.cached` folder of local file system
+        Download html content of given `url_path` then cached in the cache store of `output_dir`,
+        or the shared cache when `COLUSA_CACHE_DIR` is set
         :param url_path: url of html article
         :return: content of downloaded file
         """
-        output_path = pathlib.Path(self.output_dir)
-        cached_file_path = output_path.joinpath('.cached', f'{utils.get_hexdigest(self.url)}.html')
-        logs.info(self.url, cached_file_path)
+        logs.info(self.url)
 
-        if not cached_file_path.exists():
-            # download file from url_path
-            self.downloader.download_url(self.url, str(cached_file_path))
+        with create_cache_store(self.output_dir, CacheConfig()) as store:
+            with store.lock(self.url):
+                if not store.has_page(self.url):
+                    # download file from url_path
+                    result = self.downloader.download_url(self.url, store.page_download_path(self.url))
+                    if result is not None and result.status_code == 200:
+                        metadata = CacheMetadata()
+                        metadata.update(self.url, result.headers)
+                        store.commit_page(self.url, metadata)
 
-        with open(cached_file_path, 'rt', encoding='utf-8') as file_in:
-            content = file_in.read()
-        return content
+            data = store.read_page(self.url)
+            return utils.decode_document(data, store.page_metadata(self.url).content_type)
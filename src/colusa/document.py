@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Index of the elements of a parsed page.
+
+`DocumentIndex` walks the document once and records every element by tag name, class and
+id, in document order. Queries then only look at the elements carrying the requested
+name, class or id instead of traversing the whole document, and `within` restricts them to
+the descendants of an element using the span of positions it covers.
+
+The index reflects the document as parsed: elements removed later, for instance during
+cleanup, are still returned.
+"""
+
+from typing import Any, Iterator, Optional
+
+from bs4 import BeautifulSoup, Tag
+
+
+def _classes(tag: Tag) -> list[str]:
+    value = tag.get('class')
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+class DocumentIndex:
+    def __init__(self, bs: BeautifulSoup) -> None:
+        self.by_name: dict[str, list[Tag]] = {}
+        self.by_class: dict[str, list[Tag]] = {}
+        self.by_id: dict[str, list[Tag]] = {}
+        self.elements: list[Tag] = []
+        # position in `elements` and position of the last descendant, by id() of element
+        self._span: dict[int, tuple[int, int]] = {}
+        self._build(bs)
+
+    def _add(self, tag: Tag) -> int:
+        position = len(self.elements)
+        self.elements.append(tag)
+        self.by_name.setdefault(tag.name, []).append(tag)
+        for css_class in _classes(tag):
+            self.by_class.setdefault(css_class, []).append(tag)
+        element_id = tag.get('id')
+        if isinstance(element_id, str):
+            self.by_id.setdefault(element_id, []).append(tag)
+        return position
+
+    def _build(self, bs: BeautifulSoup) -> None:
+        # pre-order walk with an explicit stack, deep documents do not hit recursion limit
+        stack: list[tuple[Tag, int, Iterator[Any]]] = [(bs, -1, iter(bs.contents))]
+        while stack:
+            parent, position, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                if position >= 0:
+                    self._span[id(parent)] = (position, len(self.elements) - 1)
+            elif isinstance(child, Tag):
+                stack.append((child, self._add(child), iter(child.contents)))
+
+    def span(self, tag: Tag) -> Optional[tuple[int, int]]:
+        """
+        Positions of `tag` and of its last descendant in document order, None if `tag` is
+        not part of the index
+        """
+        return self._span.get(id(tag))
+
+    def position(self, tag: Tag) -> int:
+        """
+        Position of `tag` in document order, -1 if it is not part of the index
+        """
+        span = self.span(tag)
+        return span[0] if span is not None else -1
+
+    def find_all(self, name: Optional[str] = None, class_: Optional[str] = None, id: Optional[str] = None,
+                 attrs: Optional[dict[str, str]] = None, within: Optional[Tag] = None) -> list[Tag]:
+        """
+        Elements matching all given criteria, in document order
+
+        :param name: tag name
+        :param class_: one class of the element, or its whole class attribute
+        :param id: id of the element
+        :param attrs: other attributes, compared to their exact value
+        :param within: only return descendants of this element
+        """
+        candidates = self.elements
+        if id is not None:
+            candidates = self.by_id.get(id, [])
+        elif class_ is not None:
+            candidates = self.by_class.get(class_.split(' ')[0], [])
+        elif name is not None:
+            candidates = self.by_name.get(name, [])
+
+        first, last = 0, len(self.elements) - 1
+        if within is not None:
+            span = self.span(within)
+            if span is None:
+                return []
+            first, last = span[0] + 1, span[1]
+
+        result = []
+        for tag in candidates:
+            if within is not None and not first <= self.position(tag) <= last:
+                continue
+            if name is not None and tag.name != name:
+                continue
+            if class_ is not None and class_ not in _classes(tag) and ' '.join(_classes(tag)) != class_:
+                continue
+            if id is not None and tag.get('id') != id:
+                continue
+            if attrs and any(tag.get(k) != v for k, v in attrs.items()):
+                continue
+            result.append(tag)
+        return result
+
+    def find(self, name: Optional[str] = None, class_: Optional[str] = None, id: Optional[str] = None,
+             attrs: Optional[dict[str, str]] = None, within: Optional[Tag] = None) -> Optional[Tag]:
+        """
+        First element matching all given criteria, see `find_all`
+        """
+        result = self.find_all(name, class_, id, attrs, within)
+        return result[0] if result else None
+
+    def find_any_class(self, classes: list[str], name: Optional[str] = None) -> Optional[Tag]:
+        """
+        First element, in document order, that has one of `classes`
+        """
+        found = [tag for css_class in classes for tag in self.find_all(name, class_=css_class)[:1]]
+        return min(found, key=self.position, default=None)
@@ -1,14 +1,22 @@
 import os
 import re
+import threading
+import soupsieve
+from dataclasses import dataclass, field
 from typing import Any, Callable, Optional, Type, Union
 
-from bs4 import Tag, BeautifulSoup
+from bs4 import Tag, BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
 from dateutil.parser import parse
 
-from .asciidoc_visitor import AsciidocVisitor
+from .asciidoc_visitor import AsciidocVisitor, VisitContext
 from .visitor import NodeVisitor
-from .utils import slugify
-from .config import BookConfig, MakeConfig
+from .utils import slugify, write_file_if_changed
+from .config import BookConfig, MakeConfig, PostProcessingConfig
+from .fetch import ImageDownloader
+from .document import DocumentIndex
+from .metadata import DocumentMetadata, harvest_metadata
+from .exceptions import ConfigurationError
 
 """
 Dictionary of extractor
@@ -25,6 +33,11 @@ Dictionary of postprocessing
 """
 __POSTPROCESSORS: dict[str, Type['PostProcessor']] = {}
 
+"""
+Dictionary of compiled cleanup rules, by extractor class
+"""
+__CLEANUP_MATCHERS: dict[Type['Extractor'], 'CleanupMatcher'] = {}
+
 
 def register_extractor(pattern: str) -> Callable[[Type['Extractor']], Type['Extractor']]:
     def decorator(cls: Type['Extractor']) -> Type['Extractor']:
@@ -79,13 +92,100 @@ def register_postprocessor(name: str) -> Callable[[Type['PostProcessor']], Type[
     return decorator
 
 
-def create_extractor(url_path: str, bs: BeautifulSoup) -> 'Extractor':
+def _find_extractor(url_path: str) -> Optional[dict[str, Any]]:
     for _, ext in __EXTRACTORS.items():
         p: str = ext['pattern']
-        cls: Type['Extractor'] = ext['cls']
         if re.search(p, url_path):
-            return cls(bs)
-    return Extractor(bs)
+            return ext
+    return None
+
+
+def get_extractor_class(url_path: str) -> Type['Extractor']:
+    """
+    Extractor class of `url_path`, `Extractor` when no plugin handles `url_path`
+    """
+    ext = _find_extractor(url_path)
+    if ext is not None:
+        cls: Type['Extractor'] = ext['cls']
+        return cls
+    return Extractor
+
+
+def create_extractor(url_path: str, bs: BeautifulSoup) -> 'Extractor':
+    return get_extractor_class(url_path)(bs)
+
+
+def resolve_parser(name: str = '') -> str:
+    """
+    Check that BeautifulSoup tree builder `name` is installed, raise ConfigurationError if not.
+    Empty `name` selects lxml when it is installed, html.parser of standard library otherwise.
+    """
+    if not name:
+        return 'lxml' if builder_registry.lookup('lxml') is not None else 'html.parser'
+    if builder_registry.lookup(name) is None:
+        raise ConfigurationError(f'parser {name} is not available. '
+                                 f'Parser should be one of lxml, html5lib, html.parser, '
+                                 f'lxml and html5lib require their package to be installed')
+    return name
+
+
+def get_parser(url_path: str, default: str) -> str:
+    """
+    Parser of `url_path`: `parser` of the extractor handling `url_path`, set either by
+    extractor configuration or by `parser` attribute of extractor class, otherwise `default`
+    """
+    ext = _find_extractor(url_path)
+    if ext is None:
+        return default
+    return resolve_parser(ext.get('parser') or ext['cls'].parser or default)
+
+
+class RegionStrainer(SoupStrainer):
+    """Keep elements matching any of `regions` with their descendants, plus `<title>` and `<meta>`
+    elements used to parse metadata, everything else is skipped while parsing.
+
+    Each region is a pair of tag name and attributes, as accepted by `SoupStrainer`.
+    """
+    def __init__(self, regions: list[tuple[str, dict[str, Any]]]) -> None:
+        super().__init__()
+        self.strainers: list[SoupStrainer] = [SoupStrainer(name, attrs) for name, attrs in regions]
+        self.strainers.append(SoupStrainer(['title', 'meta']))
+
+    def allow_tag_creation(self, nsprefix: Optional[str], name: str, attrs: Any) -> bool:
+        return any(s.allow_tag_creation(nsprefix, name, attrs) for s in self.strainers)
+
+    def allow_string_creation(self, string: str) -> bool:
+        return False
+
+    # API of beautifulsoup4 before 4.13
+
+    def search_tag(self, markup_name: Any = None, markup_attrs: Any = {}) -> Any:
+        for s in self.strainers:
+            found = s.search_tag(markup_name, markup_attrs)
+            if found:
+                return found
+        return None
+
+    def search(self, markup: Any) -> Any:
+        if isinstance(markup, str):
+            return None
+        return super().search(markup)
+
+
+def parse_document(url_path: str, content: str, default_parser: str) -> BeautifulSoup:
+    """
+    Parse html `content` of `url_path` with the parser of its extractor (see `get_parser`).
+    When the extractor declares its `content_regions`, only those regions are parsed.
+    """
+    parser = get_parser(url_path, default_parser)
+    ext = _find_extractor(url_path)
+    regions = None
+    if ext is not None:
+        regions = ext.get('content_regions') or ext['cls'].content_regions
+    if not regions or parser == 'html5lib':
+        # html5lib always builds the whole tree
+        return BeautifulSoup(content, parser)
+    return BeautifulSoup(content, parser, parse_only=RegionStrainer(regions))
 
 
 def populate_extractor_config(config: dict[str, Any]) -> None:
@@ -110,18 +210,104 @@ def populate_transformer_config(config: dict[str, Any]) -> None:
             trf.update(v)
 
 
-def create_transformer(url_path: str, content: Tag, root: str) -> 'Transformer':
-    config: dict[str, str] = {
+def create_transformer(url_path: str, content: Tag, root: str,
+                       image_downloader: Optional[ImageDownloader] = None) -> 'Transformer':
+    config: dict[str, Any] = {
         "src_url": url_path,
-        "output_dir": root
+        "output_dir": root,
+        "image_downloader": image_downloader,
     }
+    return get_transformer_class(url_path)(config, content)
+
+
+def get_transformer_class(url_path: str) -> Type['Transformer']:
+    """
+    Transformer class of `url_path`, `Transformer` when no plugin handles `url_path`
+    """
     for _, trf in __TRANSFORMERS.items():
         p: str = trf['pattern']
         cls: Type['Transformer'] = trf['cls']
         if re.search(p, url_path):
-            return cls(config, content)
+            return cls
+    return Transformer
+
+
+@dataclass
+class CleanupRule:
+    """Elements removed from main content by `Extractor.cleanup`.
+
+    Attributes:
+        tag: name of removed elements, empty to match elements of any name
+        attrs: attributes of removed elements, as accepted by `find_all`: a string matches
+            the whole value or one of the values of multi-valued attributes such as class,
+            True requires the attribute, a compiled regular expression is searched in the value
+        selector: CSS selector of removed elements, used instead of `tag` and `attrs` when set
+    """
+    tag: str = ''
+    attrs: dict[str, Any] = field(default_factory=dict)
+    selector: str = ''
+
+
+def _attribute_matches(value: Any, expected: Any) -> bool:
+    if expected is True:
+        return value is not None
+    if expected is None:
+        return value is None
+    if value is None:
+        return False
+    candidates = [value] if isinstance(value, str) else [*value, ' '.join(value)]
+    if isinstance(expected, re.Pattern):
+        return any(expected.search(c) is not None for c in candidates)
+    if isinstance(expected, (list, tuple, set)):
+        return any(c in expected for c in candidates)
+    return any(c == expected for c in candidates)
+
+
+class CleanupMatcher:
+    """Cleanup rules of an extractor class, compiled to be tested on each element of
+    main content during a single traversal.
+    """
+    def __init__(self, rules: list[CleanupRule]) -> None:
+        self.attrs_by_tag: dict[str, list[dict[str, Any]]] = {}
+        self.attrs_of_any_tag: list[dict[str, Any]] = []
+        self.selector: Any = None
+        selectors = []
+        for rule in rules:
+            if rule.selector:
+                selectors.append(rule.selector)
+            elif rule.tag:
+                self.attrs_by_tag.setdefault(rule.tag, []).append(rule.attrs)
+            else:
+                self.attrs_of_any_tag.append(rule.attrs)
+        if selectors:
+            self.selector = soupsieve.compile(', '.join(selectors))
+
+    def __bool__(self) -> bool:
+        return bool(self.attrs_by_tag or self.attrs_of_any_tag or self.selector)
+
+    def matches(self, tag: Tag) -> bool:
+        for rules in (self.attrs_by_tag.get(tag.name, ()), self.attrs_of_any_tag):
+            for attrs in rules:
+                if all(_attribute_matches(tag.get(k), v) for k, v in attrs.items()):
+                    return True
+        return self.selector is not None and self.selector.match(tag)
+
+
+def get_cleanup_matcher(cls: Type['Extractor']) -> CleanupMatcher:
+    """
+    Compiled `cleanup_rules` of extractor class `cls`, compiled on first use
+    """
+    matcher = __CLEANUP_MATCHERS.get(cls)
+    if matcher is None:
+        matcher = CleanupMatcher(cls.cleanup_rules)
+        __CLEANUP_MATCHERS[cls] = matcher
+    return matcher
 
-    return Transformer(config, content)
+
+"""
+Classes of the element holding the article in common blog themes
+"""
+CONTENT_CLASSES = ['postcontent', 'entry-content', 'article-content', 'blog-content']
 
 
 class ContentNotFoundError(Exception):
@@ -134,8 +320,28 @@ class ContentNotFoundError(Exception):
 
 class Extractor:
     """Extractor extract real article content from sea of other contents"""
+    # BeautifulSoup parser required by the site, None to use the parser of book configuration
+    parser: Optional[str] = None
+    # elements holding the article as (tag name, attributes) pairs, when set other elements
+    # of the page, except <title> and <meta>, are not parsed at all
+    content_regions: Optional[list[tuple[str, dict[str, Any]]]] = None
+    # elements removed from main content by `cleanup`. Rules are not inherited, extractors
+    # keeping the default cleanup add `Extractor.cleanup_rules` to their own rules
+    cleanup_rules: list[CleanupRule] = [
+        CleanupRule('div', {'class': 'site-branding'}),
+        CleanupRule('div', {'class': 'navigation-top'}),
+        CleanupRule('footer'),
+        CleanupRule('div', {'class': 'searchsettings'}),
+        CleanupRule('section', {'id': 'ajaxsearchlitewidget-2'}),
+        CleanupRule('aside', {'id': 'secondary'}),
+        CleanupRule('nav', {'class': 'post-navigation'}),
+        CleanupRule('header', {'id': 'masthead'}),
+    ]
+
     def __init__(self, bs: BeautifulSoup) -> None:
         self.bs: BeautifulSoup = bs
+        self.index: DocumentIndex = DocumentIndex(bs)
+        self.metadata: DocumentMetadata = harvest_metadata(self.index)
         self.content: Optional[Tag] = None
         self.author: Optional[str] = None
         self.published: Optional[str] = None
@@ -153,26 +359,23 @@ class Extractor:
         Parse known tags in html for article's title
         :return: title if found
         """
-        meta = self.bs.find('meta', attrs={'property': 'og:title'})
-        if meta is not None:
-            return meta.get('content')
-        else:
-            return self.bs.title.text
+        value = self.metadata.meta_content('property', 'og:title')
+        if value is not None:
+            return value
+        return self.metadata.title
 
     def _parse_published(self) -> str:
         """
         Parse known tags in html for article's published date
         :return: str value for date in format `%Y-%m-%d`
         """
-        meta = self.bs.find('meta', attrs={'property': 'article:published_time'})
-        value = meta.get('content') if meta else None
+        value = self.metadata.meta_content('property', 'article:published_time')
         if value is not None:
             published = parse(value)
             return str(published.date())
 
-        time_published = self.bs.find('time', attrs={'class': 'entry-date published'})
-        if time_published is not None:
-            return time_published.text
+        if self.metadata.time_published is not None:
+            return self.metadata.time_published
 
         return ''
 
@@ -181,11 +384,9 @@ class Extractor:
         Parse known tags in html for article's author
         :return: author name if found
         """
-        meta = self.bs.find('meta', attrs={'name': 'author'})
-        if meta is not None:
-            value = meta.get('content')
-            if value is not None:
-                return value
+        value = self.metadata.meta_content('name', 'author')
+        if value is not None:
+            return value
         return ''
 
     def _parse_extra_metadata(self) -> str:
@@ -200,19 +401,22 @@ class Extractor:
             for e in elements:
                 e.extract()
 
+    def apply_cleanup_rules(self) -> None:
+        """
+        Remove elements matching `cleanup_rules` from main content, in one traversal
+        """
+        matcher = get_cleanup_matcher(type(self))
+        if self.main_content is None or not matcher:
+            return
+        removed = [e for e in self.main_content.descendants if isinstance(e, Tag) and matcher.matches(e)]
+        for e in removed:
+            e.extract()
+
     def cleanup(self) -> None:
         """
         Cleanup extra content (mostly ads) within main content
         """
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'site-branding'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'navigation-top'})
-        self.remove_tag(self.main_content, 'footer', attrs={})
-        # self.remove_tag(self.site, 'footer', attrs={'class': 'site-footer'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'searchsettings'})
-        self.remove_tag(self.main_content, 'section', attrs={'id': 'ajaxsearchlitewidget-2'})
-        self.remove_tag(self.main_content, 'aside', attrs={'id': 'secondary'})
-        self.remove_tag(self.main_content, 'nav', attrs={'class': 'post-navigation'})
-        self.remove_tag(self.main_content, 'header', attrs={'id': 'masthead'})
+        self.apply_cleanup_rules()
 
     def get_content(self) -> Optional[Tag]:
         """
@@ -226,40 +430,34 @@ class Extractor:
         and set the member self.site to handle of that content
 
         Default implementation tries to cover as much as possible the commonly
-        known web structure such as blog, hentry, article
+        known web structure such as blog, hentry, article. Candidates are looked up
+        in `self.index`, built once for the whole document
 
         :return: Tag of main content
         """
-        def is_content_class(css_class: Optional[str]) -> bool:
-            return css_class is not None and css_class in [
-                'postcontent',
-                'entry-content',
-                'article-content',
-                'blog-content',
-            ]
         # h-entry from microformat
-        site = self.bs.find(class_='hentry')
+        site = self.index.find(class_='hentry')
         if site is not None:
-            role_main = site.find('div', attrs={'role': 'main'})
+            role_main = self.index.find('div', attrs={'role': 'main'}, within=site)
             if role_main is not None:
                 site = role_main
-            role_main = site.find('div', attrs={'class': 'td-post-content'})
+            role_main = self.index.find('div', class_='td-post-content', within=site)
             if role_main is not None:
                 site = role_main
 
             return site
 
-        tag = self.bs.find('div', class_=is_content_class)
+        tag = self.index.find_any_class(CONTENT_CLASSES, name='div')
         if tag is not None:
             return tag
-        hs_blog_post = self.bs.find(attrs={'class': 'hs-blog-post'})
+        hs_blog_post = self.index.find(class_='hs-blog-post')
         if hs_blog_post is not None:
-            blog_content = hs_blog_post.find(attrs={'class': 'post-body'})
+            blog_content = self.index.find(class_='post-body', within=hs_blog_post)
             return blog_content
-        tag = self.bs.find('article')
+        tag = self.index.find('article')
         if tag is not None:
             return tag
-        tag = self.bs.find('main')
+        tag = self.index.find('main')
         if tag is not None:
             return tag
         return None
@@ -269,43 +467,7 @@ class Extractor:
         Parse yoast json data to get some metadata such as author, published date
         :return: dict of metadata found in yoast data
         """
-        yoast_data = self.bs.find('script', attrs={
-            'type': "application/ld+json",
-            'class': "yoast-schema-graph",
-        })
-
-        return_data: dict[str, str] = {}
-        if yoast_data is None:
-            return return_data
-
-        import json
-        from dateutil import parser
-        data = json.loads(yoast_data.string)
-        graph = data.get('@graph', [])
-        persons: dict[str, str] = {}
-        author: Optional[str] = None
-        for g in graph:
-            if type(g) is not dict:
-                continue
-            g_type = g.get('@type', '')
-            if g_type == 'Article':
-                author = g.get('author', {}).get('@id')
-                published_value = g.get('datePublished')
-                if published_value:
-                    published = parser.parse(published_value)
-                    return_data['published'] = str(published.date())
-                headline = g.get('headline')
-                if headline:
-                    return_data['title'] = headline
-
-            if (type(g_type) is list and 'Person' in g_type) or (type(g_type) is str and g_type == 'Person'):
-                person_id = g.get('@id', '')
-                person_name = g.get('name', '')
-                persons[person_id] = person_name
-        if author in persons:
-            return_data['author'] = persons[author]
-
-        return return_data
+        return self.metadata.yoast_data()
 
     def _parse_metadata(self) -> None:
         """
@@ -323,9 +485,9 @@ class Extractor:
 
 class Transformer:
     """Transformer transform some html tags into asciidoc syntax"""
-    def __init__(self, config: dict[str, str], site: Tag) -> None:
+    def __init__(self, config: dict[str, Any], site: Tag) -> None:
         self.value: str = ''
-        self.config: dict[str, str] = config
+        self.config: dict[str, Any] = config
         self.site: Tag = site
 
     @classmethod
@@ -360,7 +522,9 @@ class Transformer:
     def transform(self) -> str:
         visitor = self.create_visitor()
         # print(self.site)
-        self.value = visitor.visit(self.site, src_url=self.config['src_url'], output_dir=self.config['output_dir'])
+        ctx = VisitContext(src_url=self.config['src_url'], output_dir=self.config['output_dir'],
+                           image_downloader=self.config.get('image_downloader'))
+        self.value = visitor.visit(self.site, ctx)
         # print(value)
         # cleanup large whitespace
         self.cleanup_after_visit()
@@ -386,33 +550,57 @@ class Render:
         self.output_dir: str = self._config.output_dir
         self.file_list: list[tuple[str, int]] = []
 
+    def _write(self, file_name: str, text: str) -> str:
+        """
+        Write `text` into `file_name` of output folder. The file is replaced atomically and
+        only when its content changes, so that unchanged files keep their modification time
+        and downstream builds (asciidoctor, make) can be incremental.
+        :return: path of the file
+        """
+        file_path = os.path.join(self.output_dir, file_name)
+        write_file_if_changed(file_path, text.encode('utf-8'))
+        return file_path
+
     def render_book_part(self, title: str, description: str) -> None:
         file_name = f'part_{slugify(title)}.asciidoc'
         self.file_list.append((file_name, 0))
-        file_path = os.path.join(self.output_dir, file_name)
-        with open(file_path, 'w', encoding='utf-8') as file_out:
-            file_out.write(f'= {title}\n\n')
-            if len(description) > 0:
-                file_out.write(description)
-                file_out.write('\n\n')
+        text = f'= {title}\n\n'
+        if len(description) > 0:
+            text += f'{description}\n\n'
+        self._write(file_name, text)
 
     def render_chapter(self, extractor: Extractor, content: Transformer, src_url: str, basename: str,
                        metadata: bool = True, title_strip: str = '') -> str:
-        file_name = f'{basename}.asciidoc'
-        self.file_list.append((file_name, 1))
-        file_path = os.path.join(self.output_dir, file_name)
-        with open(file_path, 'w', encoding='utf-8') as file_out:
-            title = extractor.title or ''
-            title = title.replace(title_strip, '')
-            file_out.write(f'= {title}\n\n')
-
-            if metadata:
-                article_metadata = self.render_metadata(extractor, content, src_url)
-                file_out.write(article_metadata)
+        text = self.chapter_text(extractor, content, src_url, metadata, title_strip)
+        return self.write_chapter(basename, text)
 
-            file_out.write(content.value)
+    def chapter_text(self, extractor: Extractor, content: Transformer, src_url: str,
+                     metadata: bool = True, title_strip: str = '') -> str:
+        """
+        Text of the chapter of an article, as written by `write_chapter`
+        """
+        title = extractor.title or ''
+        title = title.replace(title_strip, '')
+        parts = [f'= {title}\n\n']
+        if metadata:
+            parts.append(self.render_metadata(extractor, content, src_url))
+        parts.append(content.value)
+        return ''.join(parts)
+
+    def write_chapter(self, basename: str, text: str) -> str:
+        """
+        Write chapter `text` into `basename`.asciidoc and include it in the master file
+        :return: path of the chapter file
+        """
+        file_name = f'{basename}.asciidoc'
+        self.include_chapter(file_name)
+        return self._write(file_name, text)
 
-        return file_path
+    def include_chapter(self, file_name: str) -> None:
+        """
+        Include chapter `file_name`, rendered before, in the master file
+        """
+        self.file_list.append((file_name, 1))
 
     def render_metadata(self, extractor: Extractor, content: Transformer, src_url: str) -> str:
         from urllib.parse import urlparse
@@ -463,9 +651,7 @@ epub:
 pdf:
 \tasciidoctor-pdf {book_file_name} -d book -D output {pdf_params}
 '''
-        file_path = os.path.join(self.output_dir, f'{target_prefix}Makefile')
-        with open(file_path, 'w') as out_file:
-            out_file.write(template)
+        self._write(f'{target_prefix}Makefile', template)
 
     def ebook_generate_master_file(self) -> None:
         """ Generate master index.asciidoc to include all book related information such as
@@ -489,12 +675,19 @@ pdf:
 
 {included_files}
 '''
-        book_file_name = self._config.book_file_name
-        with open(os.path.join(self.output_dir, book_file_name), 'w') as index_file:
-            index_file.write(content)
+        self._write(self._config.book_file_name, content)
 
 
 class PostProcessor:
+    """Change a chapter after it is rendered.
+
+    Processors defining `process(text)`, which returns the changed text, change chapters
+    before they are written. They are created once per book, with an empty `file_path`, so
+    expensive setup such as compiling patterns belongs in `__init__`. Other processors
+    override `run`, which changes the chapter file `file_path`.
+    """
+    process: Optional[Callable[[str], str]] = None
+
     def __init__(self, file_path: str, params: list[Any]) -> None:
         self.file_path: str = file_path
         self.params: list[Any] = params
@@ -511,9 +704,61 @@ class PostProcessorNotFoundError(Exception):
         return f'Post Processor {self.name} is not registered'
 
 
-def create_postprocessor(name: str, file_path: str, params: list[Any]) -> PostProcessor:
+def get_postprocessor_class(name: str) -> Type[PostProcessor]:
     cls = __POSTPROCESSORS.get(name)
     if not cls:
         raise PostProcessorNotFoundError(name)
+    return cls
+
 
-    return cls(file_path, params)
+def create_postprocessor(name: str, file_path: str, params: list[Any]) -> PostProcessor:
+    return get_postprocessor_class(name)(file_path, params)
+
+
+class PostProcessing:
+    """Postprocessors of a book, applied to the text of every chapter.
+
+    Text postprocessors are created once, when the book starts. Consecutive file
+    postprocessors run together on one temporary file, see `postprocess_text`.
+    """
+    def __init__(self, postprocessing: list[PostProcessingConfig]) -> None:
+        # `process` of text postprocessors, and groups of configurations of file postprocessors, in book order
+        self.steps: list[Union[Callable[[str], str], list[PostProcessingConfig]]] = []
+        for pp in postprocessing:
+            cls = get_postprocessor_class(pp.processor)
+            process = cls('', pp.params).process if cls.process is not None else None
+            if process is not None:
+                self.steps.append(process)
+            elif self.steps and isinstance(self.steps[-1], list):
+                self.steps[-1].append(pp)
+            else:
+                self.steps.append([pp])
+
+    def apply(self, text: str, file_path: str) -> str:
+        """
+        Run postprocessors on chapter `text`, to be written into `file_path`
+        """
+        for step in self.steps:
+            if isinstance(step, list):
+                text = postprocess_text(text, step, file_path)
+            else:
+                text = step(text)
+        return text
+
+
+def postprocess_text(text: str, postprocessing: list[PostProcessingConfig], file_path: str) -> str:
+    """
+    Run `postprocessing` on chapter `text`, to be written into `file_path`. Postprocessors work
+    on a temporary file next to `file_path`, which is then only written once with the final text.
+    """
+    work_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.part'
+    try:
+        with open(work_path, 'w', encoding='utf-8') as file_out:
+            file_out.write(text)
+        for pp in postprocessing:
+            create_postprocessor(pp.processor, work_path, pp.params).run()
+        with open(work_path, 'r', encoding='utf-8', newline='') as file_in:
+            return file_in.read()
+    finally:
+        if os.path.exists(work_path):
+            os.remove(work_path)
@@ -5,3 +5,11 @@ class ConfigurationError(Exception):
     def __str__(self):
         return f'ConfigurationError: {self.reason}'
 
+
+
+class DeadlineExceededError(Exception):
+    def __init__(self, url: str):
+        self.url = url
+
+    def __str__(self):
+        return f'DeadlineExceededError: download budget is spent before downloading {self.url}'
@@ -1,24 +1,108 @@
-import hashlib
+import asyncio
+import contextlib
+import functools
 import os
-import pathlib
+import random
 import shutil
-from typing import Any, Optional
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, Mapping, Optional
+from urllib.parse import urlsplit
 
 import requests
-import requests.sessions
+import requests.adapters
+import urllib3.exceptions
 import re
 
 from colusa import logs, utils
+from colusa.utils import get_image_name
+from colusa.cache import CacheMetadata, CacheStore, create_cache_store
+from colusa.config import CacheConfig
+from colusa.exceptions import ConfigurationError, DeadlineExceededError
 
 _FETCH_MAP: dict[str, tuple[str, type]] = {}
 
 
+@dataclass
+class DownloadResult:
+    """Outcome of a download made by `Downloader`"""
+    status_code: int
+    headers: Mapping[str, str] = field(default_factory=dict)
+
+    @property
+    def not_modified(self) -> bool:
+        """
+        Server answered a conditional request with 304, local copy is still valid
+        """
+        return self.status_code == 304
+
+
 class Fetch:
+    """Fetch content of URL over HTTP(S).
+
+    A fetcher keeps one long-lived :class:`requests.Session` for its whole life time,
+    the session holds a connection pool per host, so consecutive requests to the same
+    host reuse the already opened TCP/TLS connection instead of doing a new handshake.
+
+    Supported configuration keys:
+
+    - ``pool_connections``: number of per-host pools to keep (default: 10)
+    - ``pool_maxsize``: maximum number of connections kept in each per-host pool (default: 10)
+    - ``pool_block``: block when there is no free connection in the pool instead of
+      opening a throwaway one (default: False)
+    - ``keep_alive``: reuse connections between requests (default: True)
+    """
+    #: fetcher implements `get_async` natively on asyncio
+    is_async: bool = False
+    #: errors of a request which are worth retrying
+    retryable_errors: tuple[type[BaseException], ...] = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        urllib3.exceptions.HTTPError,
+    )
+    #: errors of a request sent by `get_async` which are worth retrying
+    async_retryable_errors: tuple[type[BaseException], ...] = retryable_errors
+
     def __init__(self, config: dict[str, Any] = {}) -> None:
         self.config: dict[str, Any] = config
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+
+    def create_session(self) -> requests.Session:
+        """
+        Create new session with connection pool configured from `self.config`
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.config.get('pool_connections', requests.adapters.DEFAULT_POOLSIZE),
+            pool_maxsize=self.config.get('pool_maxsize', requests.adapters.DEFAULT_POOLSIZE),
+            pool_block=self.config.get('pool_block', requests.adapters.DEFAULT_POOLBLOCK),
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.config.get('keep_alive', True):
+            session.headers['Connection'] = 'close'
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Session shared by every request of this fetcher, created on first use
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self.create_session()
+        return self._session
 
     def close(self) -> None:
-        pass
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
     def __enter__(self) -> 'Fetch':
         return self
@@ -73,11 +157,8 @@ class Fetch:
         <Response [200]>
         """
 
-        # By using the 'with' statement we are sure the session is closed, thus we
-        # avoid leaving sockets open which can trigger a ResourceWarning in some
-        # cases, and look like a memory leak in others.
-        with requests.sessions.Session() as session:
-            return session.request(method=method, url=url, **kwargs)
+        # The session is kept open to reuse pooled connections, it is closed in `close`
+        return self.session.request(method=method, url=url, **kwargs)
 
     def get(self, url: str, params: Optional[dict[str, Any]] = None, **kwargs: Any) -> requests.Response:
         r"""Sends a GET request.
@@ -170,25 +251,291 @@ class Fetch:
 
         return self.request("delete", url, **kwargs)
 
+    async def get_async(self, url: str, **kwargs: Any) -> Any:
+        """Sends a GET request without blocking the running event loop. The blocking request
+        runs in a worker thread, fetchers with `is_async` send it on the event loop instead.
+
+        :return: response object, to be used as asynchronous context manager
+        """
+        kwargs['stream'] = True
+        return _ThreadedResponse(await asyncio.to_thread(self.get, url, **kwargs))
+
+    async def aclose(self) -> None:
+        """
+        Release resources bound to the event loop
+        """
+        pass
+
+
+class _ThreadedResponse:
+    """Response of `Fetch.get_async`, with the interface of the aiohttp response used by `Downloader`"""
+    def __init__(self, response: requests.Response) -> None:
+        self.response: requests.Response = response
+        self.status: int = response.status_code
+        self.headers: Mapping[str, str] = response.headers
+        self.content: '_ThreadedResponse' = self
+
+    async def __aenter__(self) -> '_ThreadedResponse':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.response.close()
+
+    async def read(self) -> bytes:
+        return await asyncio.to_thread(lambda: self.response.content)
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await asyncio.to_thread(self.response.raw.read1, size, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse value of `Retry-After` header, either a number of seconds or a HTTP date
+    :return: number of seconds to wait, None if value is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from email.utils import parsedate_to_datetime
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HostThrottle:
+    """Politeness policy for requests to one host.
+
+    Requests rate is limited by a token bucket, concurrent requests by a limit which is
+    halved every time the host pushes back (429, 503) and grows again by one after as many
+    successful requests as the current limit, up to the configured maximum.
+    """
+    def __init__(self, requests_per_second: float = 0, max_connections: int = 0, burst: int = 1) -> None:
+        self.rate: float = requests_per_second
+        self.burst: float = max(1, burst)
+        self.max_connections: float = max_connections if max_connections > 0 else float('inf')
+        self.limit: float = self.max_connections
+        self.active: int = 0
+        self.blocked_until: float = 0.0
+        self._tokens: float = self.burst
+        self._updated: float = time.monotonic()
+        self._successes: int = 0
+        self._cond = threading.Condition()
+
+    def _try_acquire(self) -> Optional[float]:
+        """
+        Take a slot when possible, must be called with the lock held
+        :return: 0 when the slot is taken, otherwise number of seconds to wait
+            or None to wait until another request is done
+        """
+        if self.active >= self.limit:
+            return None
+        now = time.monotonic()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        self.active += 1
+        return 0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Block until a request to the host is allowed, for the duration of the `with` statement
+        """
+        with self._cond:
+            while True:
+                delay = self._try_acquire()
+                if delay == 0:
+                    break
+                self._cond.wait(timeout=delay)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def slot_async(self) -> AsyncIterator[None]:
+        """
+        Asynchronous variant of `slot`, waits without blocking the event loop
+        """
+        while True:
+            with self._cond:
+                delay = self._try_acquire()
+            if delay == 0:
+                break
+            await asyncio.sleep(delay if delay is not None else 0.05)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def success(self) -> None:
+        with self._cond:
+            if self.limit >= self.max_connections:
+                return
+            self._successes += 1
+            if self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def backoff(self, delay: float) -> None:
+        """
+        Host pushed back: reduce concurrency and hold every request for `delay` seconds
+        """
+        with self._cond:
+            self.limit = max(1, min(self.limit, self.active) // 2)
+            self._successes = 0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+
+class HostScheduler:
+    """Per-host politeness scheduler of `Downloader`.
+
+    Supported keys of downloader configuration:
+
+    - ``requests_per_second``: rate of requests to one host, 0 for no limit (default: 0)
+    - ``burst``: number of requests which can be sent at once within the rate (default: 1)
+    - ``max_connections_per_host``: concurrent requests to one host, 0 for no limit (default: 0)
+    - ``hosts``: overrides of the keys above by host name, e.g. ``{'truyenfull.vn': {'requests_per_second': 1}}``
+    - ``max_retries``: number of retries when host answers 429 or 503, or when connection
+      fails or times out (default: 3)
+    - ``backoff_factor``: first backoff delay in seconds, doubled on each retry,
+      used when host does not send `Retry-After`, with random jitter (default: 1)
+    - ``max_backoff``: upper bound of backoff delay in seconds (default: 60)
+    """
+    RetryStatuses: frozenset[int] = frozenset({429, 503})
+
+    def __init__(self, options: dict[str, Any]) -> None:
+        self.options: dict[str, Any] = options
+        self.hosts: dict[str, dict[str, Any]] = options.get('hosts', {})
+        self.max_retries: int = options.get('max_retries', 3)
+        self.backoff_factor: float = options.get('backoff_factor', 1.0)
+        self.max_backoff: float = options.get('max_backoff', 60.0)
+        self._throttles: dict[str, HostThrottle] = {}
+        self._lock = threading.Lock()
+
+    def throttle(self, url_path: str) -> HostThrottle:
+        host = urlsplit(url_path).hostname or ''
+        with self._lock:
+            throttle = self._throttles.get(host)
+            if throttle is None:
+                config = dict(self.options)
+                config.update(self.hosts.get(host, {}))
+                throttle = HostThrottle(config.get('requests_per_second', 0),
+                                        config.get('max_connections_per_host', 0),
+                                        config.get('burst', 1))
+                self._throttles[host] = throttle
+            return throttle
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Exponential backoff delay of the `attempt`-th retry, with random jitter so that
+        concurrent downloads do not retry at the same time
+        """
+        delay = min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def should_retry(self, throttle: HostThrottle, url_path: str, result: DownloadResult, attempt: int) -> bool:
+        """
+        Record outcome of a request, back off when the host pushes back
+        :return: True if the request should be sent again
+        """
+        if result.status_code not in self.RetryStatuses:
+            throttle.success()
+            return False
+        retry_after = parse_retry_after(result.headers.get('Retry-After'))
+        delay = min(retry_after, self.max_backoff) if retry_after is not None else self.backoff_delay(attempt)
+        throttle.backoff(delay)
+        if attempt >= self.max_retries:
+            return False
+        logs.warn(f'Server pushed back with {result.status_code:d}, retry in {delay:.1f}s. URL: {url_path}')
+        return True
+
 
 class Downloader:
+    """Download content of URLs to local file system.
+
+    `downloader_config` maps name of registered fetcher (see `register_fetch`) to its
+    configuration, other keys are options of the default HTTP fetcher, e.g.::
+
+        downloader:
+          pool_maxsize: 20
+          keep_alive: true
+          requests_per_second: 2
+          read_timeout: 60
+          deadline: 3600
+          pragmaticengineer:
+            cookies_path: cookies.json
+
+    The downloader is meant to live as long as the book build so that connections
+    are reused end-to-end, `close` releases all pooled connections. Requests are
+    throttled per host by `HostScheduler`.
+
+    Timeouts of every request are ``connect_timeout`` (default: 10) and ``read_timeout``
+    (default: 30) seconds. ``deadline`` is the budget in seconds for all downloads
+    of the downloader, 0 for no budget (default: 0).
+    """
     UserAgent: str = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.1 Safari/605.1.15'
     
     def __init__(self, downloader_config: dict[str, Any] = {}) -> None:
         self.clients: list[tuple[str, Fetch]] = []
+        options: dict[str, Any] = {}
         for key, config in downloader_config.items():
             result = _FETCH_MAP.get(key)
             if result is None:
+                options[key] = config
                 continue
             pattern, fetcher_cls = result
             self.clients.append((pattern, fetcher_cls(config)))
 
-        self.clients.append((r'.*', Fetch({})))
+        self.options: dict[str, Any] = options
+        self.clients.append((r'.*', Fetch(options)))
+        self.scheduler: HostScheduler = HostScheduler(options)
+        self.connect_timeout: float = options.get('connect_timeout', 10.0)
+        self.read_timeout: float = options.get('read_timeout', 30.0)
+        deadline: float = options.get('deadline', 0)
+        self.deadline_at: Optional[float] = time.monotonic() + deadline if deadline > 0 else None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+        self._in_flight: Optional[asyncio.Semaphore] = None
 
     def close(self) -> None:
+        if self._loop is not None and self._loop_thread is not None:
+            asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+            self._loop = None
+            self._loop_thread = None
         for _, ins in self.clients:
             ins.close()
 
+    async def aclose(self) -> None:
+        """
+        Release resources of asyncio fetchers, must be awaited on the loop which used them
+        """
+        for _, ins in self.clients:
+            await ins.aclose()
+
     def __enter__(self) -> 'Downloader':
         return self
 
@@ -203,51 +550,406 @@ class Downloader:
             #     return fetch_obj
         return None
 
-    def download_url(self, url_path: str, file_path: str) -> None:
+    def is_async(self, url_path: str) -> bool:
+        """
+        Determine if `url_path` is downloaded by an asyncio fetcher
+        """
         if url_path.startswith('file://'):
-            # handle support for local file
-            url_path = url_path.removeprefix('file://')
-            shutil.copyfile(url_path, file_path)
-            return
+            return False
+        fetch = self.get_fetch_instance(url_path)
+        return fetch is not None and fetch.is_async
 
-        # handle download from internet
-        headers: dict[str, str] = {
+    def _request_headers(self, extra_headers: Optional[dict[str, str]] = None) -> dict[str, str]:
+        headers = {
             'Accept': '*/*',
             'User-Agent': self.UserAgent,
         }
+        if extra_headers:
+            headers.update(extra_headers)
+        return headers
+
+    def _check_deadline(self, url_path: str) -> float:
+        """
+        :return: number of seconds left in the deadline budget (infinite without deadline)
+        :raise DeadlineExceededError: when the budget is spent
+        """
+        if self.deadline_at is None:
+            return float('inf')
+        remaining = self.deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(url_path)
+        return remaining
+
+    def _timeouts(self, url_path: str) -> tuple[float, float]:
+        remaining = self._check_deadline(url_path)
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+    def _wait_before_retry(self, url_path: str, attempt: int, ex: BaseException) -> None:
+        delay = self.scheduler.backoff_delay(attempt)
+        if delay >= self._check_deadline(url_path):
+            raise DeadlineExceededError(url_path) from ex
+        logs.warn(f'Download failed: {ex}, retry in {delay:.1f}s. URL: {url_path}')
+        time.sleep(delay)
+
+    @staticmethod
+    def _resume_offset(part_path: str, resume: bool, headers: dict[str, str]) -> int:
+        """
+        Add range headers to resume the partially downloaded `part_path`
+        :return: number of bytes already downloaded, 0 when download starts from scratch
+        """
+        if not resume or not os.path.exists(part_path):
+            return 0
+        validator = CacheMetadata.load(part_path)
+        offset = os.path.getsize(part_path)
+        if offset == 0 or not (validator.etag or validator.last_modified):
+            return 0
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = validator.etag or validator.last_modified or ''
+        return offset
+
+    @staticmethod
+    def _start_part(part_path: str, result: DownloadResult, offset: int, url_path: str) -> str:
+        """
+        Prepare `part_path` to receive the body of the response
+        :return: mode to open `part_path` with
+        """
+        if result.status_code == 206 and offset > 0:
+            return 'ab'
+        metadata = CacheMetadata()
+        metadata.update(url_path, result.headers)
+        if metadata.etag or metadata.last_modified:
+            metadata.save(part_path)
+        return 'wb'
+
+    @staticmethod
+    def _commit_part(part_path: str, file_path: str) -> None:
+        """
+        Atomically move completely downloaded `part_path` to `file_path`
+        """
+        os.replace(part_path, file_path)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(CacheMetadata.sidecar_path(part_path))
+
+    def download_url(self, url_path: str, file_path: str,
+                     headers: Optional[dict[str, str]] = None, resume: bool = False) -> Optional[DownloadResult]:
+        """
+        Download content of `url_path` to `file_path`.
+
+        Content is written to `file_path.part` then renamed to `file_path`, so `file_path`
+        only exists when download is complete. Connection errors and timeouts are retried
+        up to `max_retries` times with jittered exponential backoff, within the deadline budget.
+
+        :param headers: extra request headers, e.g. validators for a conditional request.
+            `file_path` is left untouched when server answers 304 Not Modified
+        :param resume: continue partially downloaded content with range requests,
+            content is then requested without content encoding
+        :return: status and headers of the response, None when there is no fetcher for the URL
+        :raise DeadlineExceededError: when the deadline budget of the downloader is spent
+        """
+        part_path = f'{file_path}.part'
+        if url_path.startswith('file://'):
+            # handle support for local file
+            shutil.copyfile(url_path.removeprefix('file://'), part_path)
+            self._commit_part(part_path, file_path)
+            return DownloadResult(200)
+
+        # handle download from internet
         fetch = self.get_fetch_instance(url_path)
         if fetch is None:
             logs.error(f'Cannot find fetch instance for URL: {url_path}')
-            return
-        req = fetch.get(url_path, headers=headers, stream=True)
-        if req.status_code != 200:
-            logs.error(f'Cannot make request. Result: {req.status_code:d}. URL: {url_path}')
-            with open(f'{file_path}.temp', 'wb') as file_out:
-                file_out.write(req.content)
-            return
-
-        with open(file_path, 'wb') as file_out:
-            req.raw.decode_content = True
-            shutil.copyfileobj(req.raw, file_out)
-
-
-def download_image(url_path: str, output_dir: str) -> str:
-    import urllib
-
-    # logs.info(f'call download_image with url_path is {url_path}')
-    result = urllib.parse.urlsplit(url_path)
-    p = pathlib.PurePath(result.path)
-    image_name = f'{utils.get_hexdigest(url_path)}{p.suffix}'
-    image_path = os.path.join(output_dir, "images", image_name)
-    if not os.path.exists(image_path):
-        try:
-            with Downloader() as fetch:
-                fetch.download_url(url_path, image_path)
-        except requests.exceptions.ConnectionError as ex:
-            logs.warn(f'error while downloading image. Exception: {ex}')
-        except Exception as ex:
-            logs.error(f'error with URL: {url_path}. Exception: {ex}')
+            return None
+        throttle = self.scheduler.throttle(url_path)
+        attempt = 0
+        while True:
+            request_headers = self._request_headers(headers)
+            if resume:
+                request_headers['Accept-Encoding'] = 'identity'
+            offset = self._resume_offset(part_path, resume, request_headers)
+            try:
+                timeout = self._timeouts(url_path)
+                # closing the response releases its connection back to the pool
+                with throttle.slot(), fetch.get(url_path, headers=request_headers,
+                                                stream=True, timeout=timeout) as req:
+                    result = DownloadResult(req.status_code, req.headers)
+                    if self.scheduler.should_retry(throttle, url_path, result, attempt):
+                        attempt += 1
+                        continue
+                    if result.not_modified:
+                        return result
+                    if req.status_code == 416 and offset > 0:
+                        # partial content is stale, start from scratch
+                        os.remove(part_path)
+                        continue
+                    if req.status_code not in (200, 206):
+                        logs.error(f'Cannot make request. Result: {req.status_code:d}. URL: {url_path}')
+                        with open(f'{file_path}.temp', 'wb') as file_out:
+                            file_out.write(req.content)
+                        return result
+
+                    mode = self._start_part(part_path, result, offset, url_path)
+                    with open(part_path, mode) as file_out:
+                        # read1 hands over whatever is received, so data before a broken
+                        # connection reaches the part file and can be resumed
+                        while True:
+                            chunk = req.raw.read1(64 * 1024, decode_content=True)
+                            if not chunk:
+                                break
+                            file_out.write(chunk)
+                self._commit_part(part_path, file_path)
+                return DownloadResult(200, result.headers)
+            except fetch.retryable_errors as ex:
+                if attempt >= self.scheduler.max_retries:
+                    raise
+                self._wait_before_retry(url_path, attempt, ex)
+                attempt += 1
+
+    async def download_url_async(self, url_path: str, file_path: str,
+                                 headers: Optional[dict[str, str]] = None,
+                                 resume: bool = False) -> Optional[DownloadResult]:
+        """
+        Asynchronous variant of `download_url`. URL handled by an asyncio fetcher is
+        downloaded on the running event loop, any other URL in a worker thread.
+        """
+        if not self.is_async(url_path):
+            return await asyncio.to_thread(self.download_url, url_path, file_path, headers, resume)
+
+        fetch = self.get_fetch_instance(url_path)
+        assert fetch is not None
+        part_path = f'{file_path}.part'
+        throttle = self.scheduler.throttle(url_path)
+        attempt = 0
+        while True:
+            request_headers = self._request_headers(headers)
+            if resume:
+                request_headers['Accept-Encoding'] = 'identity'
+            offset = self._resume_offset(part_path, resume, request_headers)
+            try:
+                timeout = self._timeouts(url_path)
+                async with throttle.slot_async(), \
+                        await fetch.get_async(url_path, headers=request_headers, timeout=timeout) as resp:
+                    result = DownloadResult(resp.status, resp.headers)
+                    if self.scheduler.should_retry(throttle, url_path, result, attempt):
+                        attempt += 1
+                        continue
+                    if result.not_modified:
+                        return result
+                    if resp.status == 416 and offset > 0:
+                        # partial content is stale, start from scratch
+                        os.remove(part_path)
+                        continue
+                    if resp.status not in (200, 206):
+                        logs.error(f'Cannot make request. Result: {resp.status:d}. URL: {url_path}')
+                        with open(f'{file_path}.temp', 'wb') as file_out:
+                            file_out.write(await resp.read())
+                        return result
+
+                    mode = self._start_part(part_path, result, offset, url_path)
+                    with open(part_path, mode) as file_out:
+                        async for chunk in resp.content.iter_chunked(64 * 1024):
+                            file_out.write(chunk)
+                self._commit_part(part_path, file_path)
+                return DownloadResult(200, result.headers)
+            except fetch.async_retryable_errors as ex:
+                if attempt >= self.scheduler.max_retries:
+                    raise
+                delay = self.scheduler.backoff_delay(attempt)
+                if delay >= self._check_deadline(url_path):
+                    raise DeadlineExceededError(url_path) from ex
+                logs.warn(f'Download failed: {ex}, retry in {delay:.1f}s. URL: {url_path}')
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever,
+                                                     name='colusa-async', daemon=True)
+                self._loop_thread.start()
+            return self._loop
+
+    async def _download_bounded(self, url_path: str, file_path: str, headers: Optional[dict[str, str]] = None,
+                                resume: bool = False) -> Optional[DownloadResult]:
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.options.get('max_in_flight', 100))
+        async with self._in_flight:
+            return await self.download_url_async(url_path, file_path, headers, resume)
+
+    def submit(self, url_path: str, file_path: str, headers: Optional[dict[str, str]] = None,
+               resume: bool = False) -> Future[Optional[DownloadResult]]:
+        """
+        Queue download of `url_path` on the background event loop of the downloader.
+        At most `max_in_flight` (default: 100) downloads run at the same time.
+        :return: future which is done when `file_path` is downloaded
+        """
+        return asyncio.run_coroutine_threadsafe(self._download_bounded(url_path, file_path, headers, resume),
+                                                self._get_loop())
+
+
+def _report_image_error(url_path: str, ex: BaseException) -> None:
+    if isinstance(ex, (requests.exceptions.ConnectionError, OSError)):
+        logs.warn(f'error while downloading image. Exception: {ex}')
+    else:
+        logs.error(f'error with URL: {url_path}. Exception: {ex}')
+
+
+def _commit_image(store: Optional[CacheStore], url_path: str, image_path: str) -> None:
+    if store is not None and store.has_image(url_path):
+        store.commit_image(url_path)
+        store.link_image(url_path, image_path)
+
+
+def _fetch_image(downloader: Downloader, url_path: str, image_path: str,
+                 store: Optional[CacheStore] = None) -> None:
+    try:
+        if store is None:
+            downloader.download_url(url_path, image_path, resume=True)
+        else:
+            # other processes sharing the store may download the same image
+            with store.lock(url_path):
+                if not store.has_image(url_path):
+                    downloader.download_url(url_path, store.image_download_path(url_path), resume=True)
+    except Exception as ex:
+        _report_image_error(url_path, ex)
+        return
+    _commit_image(store, url_path, image_path)
+
+
+def _check_image_future(url_path: str, image_path: str, store: Optional[CacheStore],
+                        future: Future[Optional[DownloadResult]]) -> None:
+    if future.cancelled():
+        return
+    ex = future.exception()
+    if ex is not None:
+        _report_image_error(url_path, ex)
+    else:
+        _commit_image(store, url_path, image_path)
+
+
+class ImageDownloader:
+    """Download images in background threads.
+
+    `submit` only enqueues the download and returns the image name right away,
+    so that transforming the article is not blocked by network I/O. Downloads of
+    the same image which are still in flight are coalesced into one.
+    `drain` must be called before the downloaded images are needed.
+    When `store` is given, images are downloaded into it and linked into the output
+    folder of the book, reused images are marked as accessed.
+    """
+    def __init__(self, downloader: Downloader, max_workers: int = 4,
+                 store: Optional[CacheStore] = None) -> None:
+        self.downloader: Downloader = downloader
+        self.store: Optional[CacheStore] = store
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix='colusa-image')
+        self._in_flight: dict[str, Future[Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url_path: str, output_dir: str) -> str:
+        image_name = get_image_name(url_path)
+        image_path = os.path.join(output_dir, "images", image_name)
+        with self._lock:
+            if image_path in self._in_flight:
+                return image_name
+            if self.store is not None and self.store.has_image(url_path):
+                self.store.touch_image(url_path)
+                if not os.path.exists(image_path):
+                    self.store.link_image(url_path, image_path)
+                return image_name
+            if os.path.exists(image_path):
+                return image_name
+            # downloads into a shared store are guarded by file locks, which need a blocking thread
+            if self.downloader.is_async(url_path) and (self.store is None or not self.store.shared):
+                download_path = image_path if self.store is None else self.store.image_download_path(url_path)
+                future = self.downloader.submit(url_path, download_path, resume=True)
+                future.add_done_callback(functools.partial(_check_image_future, url_path, image_path, self.store))
+            else:
+                future = self._executor.submit(_fetch_image, self.downloader, url_path, image_path, self.store)
+            self._in_flight[image_path] = future
+        return image_name
+
+    def drain(self) -> None:
+        """
+        Wait until every submitted image is downloaded
+        """
+        while True:
+            with self._lock:
+                futures = list(self._in_flight.values())
+                self._in_flight.clear()
+            if len(futures) == 0:
+                return
+            wait(futures)
 
+    def close(self) -> None:
+        self.drain()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'ImageDownloader':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+class ImageRequests:
+    """Record images referenced by articles transformed in a worker process.
+
+    Used in place of `ImageDownloader`: `submit` returns the image name right away and
+    the build process downloads the recorded images with its own `ImageDownloader`.
+    """
+    def __init__(self) -> None:
+        self.urls: list[str] = []
+
+    def submit(self, url_path: str, output_dir: str) -> str:
+        self.urls.append(url_path)
+        return get_image_name(url_path)
+
+    def take(self) -> list[str]:
+        """
+        Images recorded since the last call
+        """
+        urls, self.urls = self.urls, []
+        return urls
+
+
+# downloader and image downloaders by output folder, used by `download_image` when no downloader is given
+_DEFAULT_DOWNLOADER: Optional[Downloader] = None
+_DEFAULT_IMAGE_DOWNLOADERS: dict[str, ImageDownloader] = {}
+_DEFAULT_IMAGE_DOWNLOADERS_LOCK = threading.Lock()
+
+
+def _default_image_downloader(output_dir: str) -> ImageDownloader:
+    """
+    Image downloader of `output_dir`, created on first use. Every output folder shares one
+    `Downloader`, so its connections are reused from one image to the next.
+    """
+    global _DEFAULT_DOWNLOADER
+    key = os.path.realpath(output_dir)
+    with _DEFAULT_IMAGE_DOWNLOADERS_LOCK:
+        image_downloader = _DEFAULT_IMAGE_DOWNLOADERS.get(key)
+        if image_downloader is None:
+            if _DEFAULT_DOWNLOADER is None:
+                _DEFAULT_DOWNLOADER = Downloader()
+            image_downloader = ImageDownloader(_DEFAULT_DOWNLOADER,
+                                               store=create_cache_store(output_dir, CacheConfig()))
+            _DEFAULT_IMAGE_DOWNLOADERS[key] = image_downloader
+        return image_downloader
+
+
+def download_image(url_path: str, output_dir: str, image_downloader: Optional[ImageDownloader] = None) -> str:
+    """
+    Download image at `url_path` to `images` folder of `output_dir`. When `image_downloader`
+    is given, the download is queued to it. Otherwise the image is downloaded before returning,
+    by a downloader kept for `output_dir`, through the shared cache when `COLUSA_CACHE_DIR` is set.
+
+    :return: name of the image in `images` folder
+    """
+    if image_downloader is not None:
+        return image_downloader.submit(url_path, output_dir)
+
+    image_downloader = _default_image_downloader(output_dir)
+    image_name = image_downloader.submit(url_path, output_dir)
+    image_downloader.drain()
     return image_name
 
 
@@ -258,3 +960,60 @@ def register_fetch(name: str, pattern: str) -> Any:
         return cls
 
     return decorator
+
+
+@register_fetch('aiohttp', r'.*')
+class AsyncFetch(Fetch):
+    """Fetch content of URL with aiohttp on asyncio event loop.
+
+    Used by `Downloader.download_url_async` and `Downloader.submit` to keep many requests
+    in flight without one thread per request, blocking calls fall back to `Fetch`.
+
+    Supported configuration keys, in addition to the ones of `Fetch`:
+
+    - ``match_url``: regex of URLs handled by this fetcher (default: every URL)
+    - ``limit``: maximum number of simultaneous connections (default: 100)
+    - ``limit_per_host``: maximum number of simultaneous connections to one host (default: 10)
+    """
+    is_async = True
+
+    def __init__(self, config: dict[str, Any] = {}) -> None:
+        super().__init__(config)
+        self.match_url: str = self.config.get('match_url', r'.*')
+        self._async_session: Any = None
+
+    def can_process(self, url: str) -> bool:
+        return re.match(self.match_url, url) is not None
+
+    async def open_session(self) -> Any:
+        """
+        Create the aiohttp session on first use, it is bound to the running event loop
+        """
+        if self._async_session is None:
+            try:
+                import aiohttp
+            except ImportError as ex:
+                raise ConfigurationError('aiohttp fetcher requires aiohttp package. '
+                                         'Install it with: pip install colusa[async]') from ex
+            connector = aiohttp.TCPConnector(limit=self.config.get('limit', 100),
+                                             limit_per_host=self.config.get('limit_per_host', 10))
+            self._async_session = aiohttp.ClientSession(connector=connector)
+            self.async_retryable_errors = (aiohttp.ClientError, asyncio.TimeoutError)
+        return self._async_session
+
+    async def get_async(self, url: str, **kwargs: Any) -> Any:
+        """
+        :param timeout: (optional) (connect timeout, read timeout) tuple, as in blocking requests
+        """
+        import aiohttp
+
+        session = await self.open_session()
+        timeout = kwargs.pop('timeout', None)
+        if isinstance(timeout, tuple):
+            kwargs['timeout'] = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return await session.get(url, **kwargs)
+
+    async def aclose(self) -> None:
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Manifest of the chapters of a build, used by incremental rebuilds.
+
+For each article of the book, `BuildManifest` records the digest of everything the
+chapter is made from: html content of the article, source code of its extractor,
+transformer and postprocessors (with the modules they inherit from), version of colusa
+and the fields of book configuration used to render chapters. A later build skips
+parsing, transforming and rendering of articles whose digest did not change and whose
+chapter is still in the output folder.
+
+Incremental builds are enabled by the `incremental` key of book configuration. The
+manifest is kept in ``.colusa-build.json`` of the output folder of the book.
+"""
+
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sys
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+from colusa import etr, logs, utils
+from colusa._version import __version__
+from colusa.config import BookConfig
+
+MANIFEST_FILE_NAME = '.colusa-build.json'
+MANIFEST_VERSION = 1
+
+# modules used to render every chapter, whatever its plugins
+_CORE_MODULES = ['colusa.etr', 'colusa.visitor', 'colusa.asciidoc_visitor', 'colusa.document',
+                 'colusa.metadata', 'colusa.pipeline', 'colusa.utils', 'colusa.fetch']
+
+# digest of source code by tuple of classes
+__CODE_DIGESTS: dict[tuple[type, ...], str] = {}
+__CODE_DIGESTS_LOCK = threading.Lock()
+
+
+def _class_source_file(cls: type) -> Optional[str]:
+    module = sys.modules.get(cls.__module__)
+    if module is not None:
+        return inspect.getsourcefile(module)
+    # plugins imported by `utils.scan` are not registered in sys.modules
+    for value in vars(cls).values():
+        code = getattr(getattr(value, '__func__', value), '__code__', None)
+        if code is not None:
+            return code.co_filename
+    return None
+
+
+def code_digest(*classes: type) -> str:
+    """
+    Digest of the source code of the modules defining `classes` and their base classes,
+    and of the core modules of colusa
+    """
+    key = tuple(classes)
+    with __CODE_DIGESTS_LOCK:
+        digest = __CODE_DIGESTS.get(key)
+        if digest is not None:
+            return digest
+
+        source_files = {name: inspect.getsourcefile(importlib.import_module(name)) for name in _CORE_MODULES}
+        for cls in classes:
+            for base in cls.__mro__:
+                if base is not object and base.__module__ not in source_files:
+                    source_files[base.__module__] = _class_source_file(base)
+        m = hashlib.sha256(__version__.encode('utf-8'))
+        for name, source_file in sorted(source_files.items()):
+            m.update(name.encode('utf-8'))
+            if source_file is not None and os.path.exists(source_file):
+                with open(source_file, 'rb') as file_in:
+                    m.update(file_in.read())
+        digest = m.hexdigest()
+        __CODE_DIGESTS[key] = digest
+        return digest
+
+
+def chapter_inputs(url_path: str, content: str, config: BookConfig, default_parser: str) -> str:
+    """
+    Digest of the inputs of the chapter of `url_path` with html `content`
+    """
+    settings = {
+        'parser': etr.get_parser(url_path, default_parser),
+        'metadata': config.metadata,
+        'title_prefix_trim': config.title_prefix_trim,
+        'postprocessing': [{'processor': pp.processor, 'params': pp.params} for pp in config.postprocessing],
+        'extractors': config.extractors,
+        'transformers': config.transformers,
+    }
+    m = hashlib.sha256()
+    m.update(content.encode('utf-8', errors='replace'))
+    classes = [etr.get_extractor_class(url_path), etr.get_transformer_class(url_path)]
+    classes.extend(etr.get_postprocessor_class(pp.processor) for pp in config.postprocessing)
+    m.update(code_digest(*classes).encode('utf-8'))
+    m.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+    return m.hexdigest()
+
+
+@dataclass
+class ChapterRecord:
+    """
+    Chapter rendered by a previous build
+    """
+    inputs: str
+    basename: str
+    title: str = ''
+    author: Optional[str] = None
+    published: Optional[str] = None
+    images: list[str] = field(default_factory=list)
+
+
+class BuildManifest:
+    def __init__(self, output_dir: str) -> None:
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILE_NAME)
+        self.chapters: dict[str, ChapterRecord] = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, ChapterRecord]:
+        try:
+            with open(self.path, 'rt', encoding='utf-8') as file_in:
+                data: dict[str, Any] = json.load(file_in)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logs.warn(f'invalid build manifest {self.path}, every chapter is rebuilt: {e}')
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        chapters = {}
+        for url_path, record in data.get('chapters', {}).items():
+            known = {k: v for k, v in record.items() if k in ChapterRecord.__dataclass_fields__}
+            chapters[url_path] = ChapterRecord(**known)
+        return chapters
+
+    def unchanged(self, url_path: str, inputs: str) -> Optional[ChapterRecord]:
+        """
+        Record of the chapter of `url_path` when it was rendered from the same `inputs`
+        and its file is still in the output folder, None otherwise
+        """
+        with self._lock:
+            record = self.chapters.get(url_path)
+        if record is None or record.inputs != inputs:
+            return None
+        if not os.path.exists(os.path.join(self.output_dir, f'{record.basename}.asciidoc')):
+            return None
+        return record
+
+    def record(self, url_path: str, record: ChapterRecord) -> None:
+        with self._lock:
+            self.chapters[url_path] = record
+
+    def forget(self, url_path: str) -> None:
+        with self._lock:
+            self.chapters.pop(url_path, None)
+
+    def save(self, urls: Optional[list[str]] = None) -> None:
+        """
+        Write the manifest, only keeping the chapters of `urls` when given
+        """
+        with self._lock:
+            chapters = self.chapters
+            if urls is not None:
+                chapters = {url_path: chapters[url_path] for url_path in dict.fromkeys(urls) if url_path in chapters}
+                self.chapters = chapters
+            data = {
+                'version': MANIFEST_VERSION,
+                'chapters': {url_path: asdict(record) for url_path, record in chapters.items()},
+            }
+        os.makedirs(self.output_dir, exist_ok=True)
+        utils.write_file_atomic(self.path, json.dumps(data, indent=1).encode('utf-8'))
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Metadata of a parsed page.
+
+`harvest_metadata` collects, from the `DocumentIndex` of the page, every source of metadata
+used by extractors: ``<title>``, ``<meta>`` tags (OpenGraph, article and author tags), the
+``entry-date published`` time of hAtom themes and JSON-LD scripts, including the Yoast SEO
+graph. Extractors query the returned `DocumentMetadata` instead of searching the whole
+document for each field.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from dateutil import parser
+
+from colusa import logs
+from colusa.document import DocumentIndex
+
+
+@dataclass
+class DocumentMetadata:
+    """
+    Metadata found in a page, in document order
+    """
+    title: Optional[str] = None
+    # content of <meta> tags by (attribute, value), such as ('property', 'og:title')
+    meta: dict[tuple[str, str], list[Optional[str]]] = field(default_factory=dict)
+    # text of the first <time class="entry-date published">
+    time_published: Optional[str] = None
+    json_ld: list[Any] = field(default_factory=list)
+    # Yoast SEO graph, it is also part of `json_ld`
+    yoast: Optional[dict[str, Any]] = None
+
+    def meta_content(self, attr: str, value: str) -> Optional[str]:
+        """
+        Content of the first <meta> tag whose `attr` attribute is `value`
+        """
+        contents = self.meta.get((attr, value))
+        return contents[0] if contents else None
+
+    def meta_contents(self, attr: str, value: str) -> list[Optional[str]]:
+        return self.meta.get((attr, value), [])
+
+    def yoast_data(self) -> dict[str, str]:
+        """
+        Title, author and published date of the article described by Yoast SEO graph
+        :return: dict of metadata found in yoast data
+        """
+        return_data: dict[str, str] = {}
+        if self.yoast is None:
+            return return_data
+
+        graph = self.yoast.get('@graph', [])
+        persons: dict[str, str] = {}
+        author: Optional[str] = None
+        for g in graph:
+            if type(g) is not dict:
+                continue
+            g_type = g.get('@type', '')
+            if g_type == 'Article':
+                author = g.get('author', {}).get('@id')
+                published_value = g.get('datePublished')
+                if published_value:
+                    published = parser.parse(published_value)
+                    return_data['published'] = str(published.date())
+                headline = g.get('headline')
+                if headline:
+                    return_data['title'] = headline
+
+            if (type(g_type) is list and 'Person' in g_type) or (type(g_type) is str and g_type == 'Person'):
+                person_id = g.get('@id', '')
+                person_name = g.get('name', '')
+                persons[person_id] = person_name
+        if author in persons:
+            return_data['author'] = persons[author]
+
+        return return_data
+
+
+def harvest_metadata(index: DocumentIndex) -> DocumentMetadata:
+    """
+    Collect metadata of the document indexed by `index`
+    """
+    metadata = DocumentMetadata()
+    for tag in index.by_name.get('meta', []):
+        for attr in ('property', 'name', 'itemprop'):
+            value = tag.get(attr)
+            if value is not None:
+                metadata.meta.setdefault((attr, value), []).append(tag.get('content'))
+    title = index.find('title')
+    if title is not None:
+        metadata.title = title.text
+    time_published = index.find('time', class_='entry-date published')
+    if time_published is not None:
+        metadata.time_published = time_published.text
+    for tag in index.find_all('script', attrs={'type': 'application/ld+json'}):
+        try:
+            data = json.loads(tag.string or '')
+        except ValueError as e:
+            logs.warn(f'invalid JSON-LD metadata: {e}')
+            continue
+        metadata.json_ld.append(data)
+        if metadata.yoast is None and isinstance(data, dict) and 'yoast-schema-graph' in tag.get('class', []):
+            metadata.yoast = data
+    return metadata
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""Staged build of the chapters of a book.
+
+`ChapterPipeline` runs three stages at the same time, connected by bounded queues:
+
+- ``fetch`` reads the content of articles, from the cache store or from the network,
+- ``transform`` parses, extracts and transforms the content into the text of a chapter,
+  in a thread of the build process or in worker processes when ``processes`` is greater
+  than 1,
+- ``write`` writes the chapters and runs their postprocessors, in book order.
+
+Articles whose chapter is recorded in the `BuildManifest` with the same inputs are not
+transformed again, the existing chapter is included in the book.
+
+Network I/O, transformation and disk writes then overlap. At most ``max_in_flight``
+articles are between the start of their fetch and the end of their write: the fetch stage
+waits for a chapter to be written before reading one more article, so contents, documents
+and chapter texts kept in memory do not grow with the number of articles of the book.
+"""
+
+import multiprocessing
+import os
+import pathlib
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from colusa import etr, fetch, logs, utils
+from colusa.config import BookConfig, PartConfig
+from colusa.manifest import BuildManifest, ChapterRecord, chapter_inputs
+
+
+@dataclass
+class RenderedChapter:
+    """
+    Article transformed into the text of chapter `basename`.asciidoc
+    """
+    url_path: str
+    basename: str
+    title: str
+    author: Optional[str] = None
+    published: Optional[str] = None
+    text: str = ''
+    # urls of images referenced by the chapter, downloaded when the chapter is written
+    images: list[str] = field(default_factory=list)
+    # digest of the inputs of the chapter, see `chapter_inputs`
+    inputs: str = ''
+    # chapter is already in the output folder, rendered by a previous build from the same inputs
+    unchanged: bool = False
+
+    @classmethod
+    def from_record(cls, url_path: str, record: ChapterRecord) -> 'RenderedChapter':
+        return cls(url_path, record.basename, record.title, record.author, record.published,
+                   images=list(record.images), inputs=record.inputs, unchanged=True)
+
+    def to_record(self) -> ChapterRecord:
+        return ChapterRecord(self.inputs, self.basename, self.title, self.author, self.published, list(self.images))
+
+
+def chapter_basename(url_path: str) -> str:
+    """
+    Name of the chapter of `url_path` on local file system, ending name of url and its short digest
+    """
+    p = pathlib.PurePath(url_path)
+    return f'{p.name}_{utils.get_short_hexdigest(url_path)}'
+
+
+def transform_content(url_path: str, content: str, config: BookConfig, parser: str, book_maker: etr.Render,
+                      image_downloader: Any) -> Optional[RenderedChapter]:
+    """
+    Parse, extract and transform html `content` of `url_path` into the text of a chapter
+
+    :return: the chapter, None when the article is not found in `content`
+    """
+    bs = etr.parse_document(url_path, content, parser)
+    try:
+        extractor = etr.create_extractor(url_path, bs)
+        extractor.cleanup()
+        transformer = etr.create_transformer(url_path, extractor.get_content(), config.output_dir,
+                                             image_downloader)
+        transformer.transform()
+    except etr.ContentNotFoundError as e:
+        logs.error(e, url_path)
+        return None
+    text = book_maker.chapter_text(extractor, transformer, url_path, metadata=config.metadata,
+                                   title_strip=config.title_prefix_trim)
+    return RenderedChapter(url_path, chapter_basename(url_path), extractor.title or '',
+                           extractor.author, extractor.published, text)
+
+
+def write_chapter(chapter: RenderedChapter, config: BookConfig, book_maker: etr.Render,
+                  image_downloader: Optional[fetch.ImageDownloader],
+                  postprocessing: Optional[etr.PostProcessing] = None) -> str:
+    """
+    Run the postprocessors of the book on `chapter`, write it and queue its images.
+    An unchanged chapter is only included in the book.
+    :param postprocessing: postprocessors of the book, created from `config` when not given
+    :return: path of the chapter file
+    """
+    if chapter.unchanged:
+        file_name = f'{chapter.basename}.asciidoc'
+        book_maker.include_chapter(file_name)
+        file_path = os.path.join(book_maker.output_dir, file_name)
+    else:
+        text = chapter.text
+        if config.postprocessing:
+            if postprocessing is None:
+                postprocessing = etr.PostProcessing(config.postprocessing)
+            text = postprocessing.apply(text, os.path.join(book_maker.output_dir, f'{chapter.basename}.asciidoc'))
+        file_path = book_maker.write_chapter(chapter.basename, text)
+    if image_downloader is not None:
+        for image_url in chapter.images:
+            image_downloader.submit(image_url, config.output_dir)
+    return file_path
+
+
+# configuration, parser, renderer and image recorder of a worker process
+_worker: Optional[tuple[BookConfig, str, etr.Render, fetch.ImageRequests]] = None
+
+
+def _init_worker(config: BookConfig, parser: str) -> None:
+    global _worker
+    utils.scan('colusa.plugins')
+    etr.populate_extractor_config(config.extractors)
+    etr.populate_transformer_config(config.transformers)
+    _worker = (config, parser, etr.Render(config), fetch.ImageRequests())
+
+
+def _transform_chunk(chunk: list[tuple[str, str]]) -> list[Optional[RenderedChapter]]:
+    assert _worker is not None, 'worker process is not initialized'
+    config, parser, book_maker, images = _worker
+    chapters: list[Optional[RenderedChapter]] = []
+    for url_path, content in chunk:
+        chapter = transform_content(url_path, content, config, parser, book_maker, images)
+        image_urls = images.take()
+        if chapter is not None:
+            chapter.images = image_urls
+        chapters.append(chapter)
+    return chapters
+
+
+# position in book order, url and content of an article
+_Fetched = tuple[int, str, str]
+# position in book order, url, content and digest of inputs of an article to transform
+_Changed = tuple[int, str, str, str]
+# position in book order and chapter of an article, or position -1 and error of a stage
+_Done = tuple[int, Any]
+
+# seconds between checks that the build is stopped while a stage waits
+_POLL_INTERVAL = 0.1
+
+
+class ChapterPipeline:
+    """
+    Build the chapters of a book with ``fetch``, ``transform`` and ``write`` stages
+
+    :param fetch_content: returns the html content of an url, called by the fetch stage
+    :param manifest: chapters of the previous build, articles are all transformed when it is None
+    """
+    def __init__(self, config: BookConfig, parser: str, book_maker: etr.Render,
+                 image_downloader: fetch.ImageDownloader, fetch_content: Callable[[str], str],
+                 manifest: Optional[BuildManifest] = None) -> None:
+        self.config = config
+        self.manifest = manifest
+        self.postprocessing = etr.PostProcessing(config.postprocessing)
+        self.unchanged_count = 0
+        self.parser = parser
+        self.book_maker = book_maker
+        self.image_downloader = image_downloader
+        self.fetch_content = fetch_content
+        self.processes = max(1, config.processes)
+        self.max_in_flight = config.max_in_flight
+        if self.max_in_flight <= 0:
+            self.max_in_flight = 2 * max(self.processes, config.concurrency)
+        self._stop = threading.Event()
+
+    def run(self, sections: list[tuple[Optional[PartConfig], list[str]]]) -> None:
+        """
+        Build chapters of `sections`, parts of the book with their urls, in book order.
+        An error of any stage stops the build and is raised here.
+        """
+        urls = [url_path for _, part_urls in sections for url_path in part_urls]
+        window = threading.Semaphore(self.max_in_flight)
+        # the window keeps both queues within `max_in_flight` articles
+        fetched: queue.Queue[Optional[_Fetched]] = queue.Queue(maxsize=self.max_in_flight)
+        done: queue.Queue[_Done] = queue.Queue()
+        self._stop.clear()
+        executor: Optional[ProcessPoolExecutor] = None
+        if self.processes > 1:
+            # workers are spawned, not forked, as this process runs prefetch and image threads
+            executor = ProcessPoolExecutor(max_workers=self.processes,
+                                           mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=_init_worker, initargs=(self.config, self.parser))
+        stages = [
+            threading.Thread(target=self._fetch_stage, args=(urls, window, fetched, done),
+                             name='colusa-fetch', daemon=True),
+            threading.Thread(target=self._transform_stage, args=(fetched, done, executor),
+                             name='colusa-transform', daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+        completed = False
+        try:
+            self._write_stage(sections, window, done)
+            completed = True
+        finally:
+            self._stop.set()
+            # wake up stages waiting for the window or for a fetched article
+            window.release()
+            try:
+                fetched.put_nowait(None)
+            except queue.Full:
+                pass
+            for stage in stages:
+                stage.join()
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            if self.manifest is not None:
+                # chapters of urls removed from the book are forgotten after a complete build
+                self.manifest.save(urls if completed else None)
+        if self.unchanged_count > 0:
+            logs.info(f'{self.unchanged_count} unchanged chapters are not rebuilt')
+
+    def _fetch_stage(self, urls: list[str], window: threading.Semaphore,
+                     fetched: 'queue.Queue[Optional[_Fetched]]', done: 'queue.Queue[_Done]') -> None:
+        try:
+            for position, url_path in enumerate(urls):
+                while not window.acquire(timeout=_POLL_INTERVAL):
+                    if self._stop.is_set():
+                        return
+                if self._stop.is_set():
+                    return
+                fetched.put((position, url_path, self.fetch_content(url_path)))
+        except BaseException as e:
+            done.put((-1, e))
+
+    def _next_fetched(self, fetched: 'queue.Queue[Optional[_Fetched]]') -> Optional[_Fetched]:
+        """
+        Wait for the next fetched article, None when the build is stopped
+        """
+        while not self._stop.is_set():
+            try:
+                item = fetched.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is not None:
+                return item
+        return None
+
+    def _next_changed(self, fetched: 'queue.Queue[Optional[_Fetched]]', done: 'queue.Queue[_Done]',
+                      block: bool = True) -> Optional[_Changed]:
+        """
+        Next fetched article that has to be transformed, unchanged articles on the way are
+        passed to the write stage. None when the build is stopped, or when no article is
+        fetched yet and `block` is False
+        """
+        while True:
+            if block:
+                item = self._next_fetched(fetched)
+            else:
+                try:
+                    item = fetched.get_nowait()
+                except queue.Empty:
+                    return None
+            if item is None:
+                return None
+            position, url_path, content = item
+            if self.manifest is None:
+                return position, url_path, content, ''
+            inputs = chapter_inputs(url_path, content, self.config, self.parser)
+            record = self.manifest.unchanged(url_path, inputs)
+            if record is None:
+                return position, url_path, content, inputs
+            done.put((position, RenderedChapter.from_record(url_path, record)))
+
+    def _transform_stage(self, fetched: 'queue.Queue[Optional[_Fetched]]', done: 'queue.Queue[_Done]',
+                         executor: Optional[ProcessPoolExecutor]) -> None:
+        try:
+            if executor is None:
+                images = fetch.ImageRequests()
+                while True:
+                    item = self._next_changed(fetched, done)
+                    if item is None:
+                        return
+                    position, url_path, content, inputs = item
+                    chapter = transform_content(url_path, content, self.config, self.parser, self.book_maker,
+                                                images)
+                    del content
+                    image_urls = images.take()
+                    if chapter is not None:
+                        chapter.images = image_urls
+                        chapter.inputs = inputs
+                    done.put((position, chapter))
+
+            chunk_size = max(1, min(16, self.max_in_flight // (2 * self.processes)))
+            while True:
+                item = self._next_changed(fetched, done)
+                if item is None:
+                    return
+                chunk = [item]
+                # articles already fetched are sent together, up to `chunk_size`
+                while len(chunk) < chunk_size:
+                    item = self._next_changed(fetched, done, block=False)
+                    if item is None:
+                        break
+                    chunk.append(item)
+                future = executor.submit(_transform_chunk, [(url_path, content) for _, url_path, content, _ in chunk])
+                future.add_done_callback(self._chunk_done([(position, inputs) for position, _, _, inputs in chunk],
+                                                          done))
+        except BaseException as e:
+            done.put((-1, e))
+
+    @staticmethod
+    def _chunk_done(articles: list[tuple[int, str]], done: 'queue.Queue[_Done]') -> Callable[[Future[Any]], None]:
+        def callback(future: Future[Any]) -> None:
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                done.put((-1, error))
+                return
+            for (position, inputs), chapter in zip(articles, future.result()):
+                if chapter is not None:
+                    chapter.inputs = inputs
+                done.put((position, chapter))
+
+        return callback
+
+    def _write_stage(self, sections: list[tuple[Optional[PartConfig], list[str]]], window: threading.Semaphore,
+                     done: 'queue.Queue[_Done]') -> None:
+        # chapters transformed before the chapters preceding them in book order
+        pending: dict[int, Optional[RenderedChapter]] = {}
+        position = 0
+        for part, part_urls in sections:
+            if part is not None:
+                self.book_maker.render_book_part(part.title, part.description)
+            for _ in part_urls:
+                while position not in pending:
+                    key, value = done.get()
+                    if key < 0:
+                        raise value
+                    pending[key] = value
+                chapter = pending.pop(position)
+                position += 1
+                if chapter is not None:
+                    write_chapter(chapter, self.config, self.book_maker, self.image_downloader, self.postprocessing)
+                    if chapter.unchanged:
+                        self.unchanged_count += 1
+                    if self.manifest is not None:
+                        self.manifest.record(chapter.url_path, chapter.to_record())
+                del chapter
+                window.release()
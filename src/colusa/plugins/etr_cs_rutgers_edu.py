@@ -1,12 +1,12 @@
-from colusa.etr import Extractor, register_extractor
+from colusa.etr import CleanupRule, Extractor, register_extractor
 
 
 @register_extractor('www.cs.rutgers.edu/~pxk/')
 class CSRutgersEduExtractor(Extractor):
+    cleanup_rules = [
+        CleanupRule('div', {'id': 'downloadmsg'}),
+        CleanupRule('div', {'id': 'headline'}),
+    ] + Extractor.cleanup_rules
+
     def _find_main_content(self):
         return self.bs.find('div', attrs={'id': 'main'})
-
-    def cleanup(self):
-        self.remove_tag(self.main_content, 'div', attrs={'id': 'downloadmsg'})
-        self.remove_tag(self.main_content, 'div', attrs={'id': 'headline'})
-        super(CSRutgersEduExtractor, self).cleanup()
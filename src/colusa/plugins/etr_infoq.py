@@ -1,13 +1,13 @@
-from colusa.etr import Extractor, register_extractor
+from colusa.etr import CleanupRule, Extractor, register_extractor
 
 
 @register_extractor('//www.infoq.com')
 class InfoQExtractor(Extractor):
+    cleanup_rules = [
+        CleanupRule('div', {'class': 'contentRatingWidget'}),
+        CleanupRule('div', {'class': 'widget article__fromTopic topics'}),
+        CleanupRule('div', {'class': 'nocontent'}),
+    ] + Extractor.cleanup_rules
+
     def _find_main_content(self):
         return self.bs.find('div', class_='article__content')
-
-    def cleanup(self):
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'contentRatingWidget'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'widget article__fromTopic topics'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'nocontent'})
-        super(InfoQExtractor, self).cleanup()
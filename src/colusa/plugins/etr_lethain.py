@@ -1,10 +1,11 @@
-from colusa.etr import Extractor, register_extractor
+from colusa.etr import CleanupRule, Extractor, register_extractor
 
 
 @register_extractor('//lethain.com')
 class LethainExtractor(Extractor):
+    cleanup_rules = [
+        CleanupRule('header'),
+    ]
+
     def __init__(self, bs):
         super(LethainExtractor, self).__init__(bs)
-
-    def cleanup(self):
-        self.remove_tag(self.main_content, 'header', None)
@@ -1,8 +1,8 @@
-from colusa.etr import Extractor, register_extractor
+from colusa.etr import CleanupRule, Extractor, register_extractor
 
 
 @register_extractor('//www.linkedin.com')
 class LinkedInExtractor(Extractor):
-    def cleanup(self):
-        self.remove_tag(self.main_content, 'header', attrs={})
-        super(LinkedInExtractor, self).cleanup()
+    cleanup_rules = [
+        CleanupRule('header'),
+    ] + Extractor.cleanup_rules
@@ -5,14 +5,13 @@ from colusa.etr import Extractor, Transformer, register_extractor, register_tran
 
 @register_extractor('//medium.com')
 class MediumExtractor(Extractor):
+    content_regions = [('article', {})]
+
     def _parse_title(self):
         title = self.main_content.find('h1')
         if title is not None:
             return title.text
-        meta = self.bs.find('meta', attrs={'property': 'og:title'})
-        if meta is not None:
-            return meta.get('content')
-        return self.bs.title.text
+        return super(MediumExtractor, self)._parse_title()
 
     def _find_main_content(self):
         return self.bs.find('article')
@@ -2,28 +2,31 @@ import re
 
 from bs4 import Tag
 
-from colusa.etr import Extractor, Transformer, register_extractor, register_transformer
+from colusa.etr import CleanupRule, Extractor, Transformer, register_extractor, register_transformer
 
 
 @register_extractor('//metruyenchu.com')
 class MeTruyenChuExtractor(Extractor):
+    content_regions = [('div', {'id': 'js-read__content'})]
+    cleanup_rules = [
+        CleanupRule('div', {'id': 'js-left-menu'}),
+        CleanupRule('div', {'id': 'js-right-menu'}),
+        CleanupRule('a', {'class': 'truyen-title'}),
+        CleanupRule('h2'),
+        CleanupRule('div', {'class': 'group_story'}),
+    ]
+
     def _find_main_content(self):
         return self.bs.find('div', id='js-read__content')
 
     def cleanup(self):
-        self.remove_tag(self.main_content, 'div', attrs={'id': 'js-left-menu'})
-        self.remove_tag(self.main_content, 'div', attrs={'id': 'js-right-menu'})
         to_remove = []
         to_remove += self.main_content.select('#js-read__body div:first-child')
         to_remove += self.main_content.select('#js-read__body div:nth-child(2)')
         to_remove += self.main_content.select('#js-read__body div:nth-child(3)')
         for i in to_remove:
             i.extract()
-        
-        self.remove_tag(self.main_content, 'a', attrs={'class': 'truyen-title'})
-        self.remove_tag(self.main_content, 'h2', attrs={})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'group_story'})
-        
+        super(MeTruyenChuExtractor, self).cleanup()
 
 
 @register_transformer('//metruyenchu.com')
@@ -42,4 +45,3 @@ class MeTruyenChuTransformer(Transformer):
             value = value[1:]
         self.value = value
         return value
-
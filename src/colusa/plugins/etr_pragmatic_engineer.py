@@ -1,5 +1,5 @@
-from colusa.etr import Extractor, Transformer, register_extractor_v2, register_transformer_v2
-from colusa.asciidoc_visitor import AsciidocVisitor
+from colusa.etr import CleanupRule, Extractor, Transformer, register_extractor_v2, register_transformer_v2
+from colusa.asciidoc_visitor import AsciidocVisitor, VisitContext
 from bs4 import Tag
 import re
 from colusa import logs
@@ -9,33 +9,30 @@ import json
 
 @register_extractor_v2('substack', '//newsletter.pragmaticengineer.com|learnings.aleixmorgadas.dev')
 class PragmaticEngineerExtractor(Extractor):
-    def cleanup(self):
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'subscribe-widget'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'share-dialog'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'post-footer'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'subscribe-footer'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'publication-footer'})
-        self.remove_tag(self.main_content, 'a', attrs={'class': 'post-ufi-button'})
-        self.remove_tag(self.main_content, 'a', attrs={'class': 'tweet-link-bottom'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'tweet-header'})
-        self.remove_tag(self.main_content, 'ul', attrs={'class': 'subscribe-prompt-dropdown'})
-        self.remove_tag(self.main_content, 'h1', attrs={'class': 'post-title'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'post-label'})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'profile-hover-card-target'})
-        self.remove_tag(self.main_content, 'p', attrs={'class': 'button-wrapper'})
-
-        super(PragmaticEngineerExtractor, self).cleanup()
+    cleanup_rules = [
+        CleanupRule('div', {'class': 'subscribe-widget'}),
+        CleanupRule('div', {'class': 'share-dialog'}),
+        CleanupRule('div', {'class': 'post-footer'}),
+        CleanupRule('div', {'class': 'subscribe-footer'}),
+        CleanupRule('div', {'class': 'publication-footer'}),
+        CleanupRule('a', {'class': 'post-ufi-button'}),
+        CleanupRule('a', {'class': 'tweet-link-bottom'}),
+        CleanupRule('div', {'class': 'tweet-header'}),
+        CleanupRule('ul', {'class': 'subscribe-prompt-dropdown'}),
+        CleanupRule('h1', {'class': 'post-title'}),
+        CleanupRule('div', {'class': 'post-label'}),
+        CleanupRule('div', {'class': 'profile-hover-card-target'}),
+        CleanupRule('p', {'class': 'button-wrapper'}),
+    ] + Extractor.cleanup_rules
 
 
 class PEAsciidocVisitor(AsciidocVisitor):
     visit_tag_source = AsciidocVisitor.visit_tag_fall_through
     # visit_tag_div = AsciidocVisitor.visit_tag_fall_through
 
-    def visit_tag_a(self, node, *args, **kwargs):
+    def visit_tag_a(self, node, ctx: VisitContext):
         href = node.get('href', '')
-        # kwargs['href'] = href
-        text = self.generic_visit(node, *args, **kwargs)
-        # del kwargs['href']
+        text = yield self.children(node, ctx)
         if not text:
             return ''
         m = re.match(r'https?://', href)
@@ -53,33 +50,21 @@ class PEAsciidocVisitor(AsciidocVisitor):
 '''
         img = node.find('figure')
         if img:
-            return self.visit_tag_figure(img, *args, **kwargs)
+            return (yield from self.visit_tag_figure(img, ctx))
 
         img = node.find('img')
         if img:
-            return self.visit_tag_img(img, *args, **kwargs)
+            return self.visit_tag_img(img, ctx)
 
-        if kwargs.get('figure', False):
+        if ctx.figure:
             # parent is figure, no need to create a link
             return text
 
         return f'link:{href}[{text}]'
-    
-    def visit_tag_figure(self, node, *args, **kwargs):
-        kwargs['figure'] = True
-        text = super().visit_tag_figure(node, *args, **kwargs)
-        del kwargs['figure']
-        return text
-    
-    def visit_tag_blockquote(self, node, *args, **kwargs):
-        kwargs['blockquote'] = True
-        text = super().visit_tag_blockquote(node, *args, **kwargs)
-        del kwargs['blockquote']
-        return text
 
     def visit_heading_node(level):
-        def visitor(self, node, *args, **kwargs):
-            text = self.generic_visit(node, *args, **kwargs)
+        def visitor(self, node, ctx: VisitContext):
+            text = yield self.children(node, ctx)
             text = self.text_cleanup(text)
             if not text:
                 # empty heading
@@ -89,7 +74,7 @@ class PEAsciidocVisitor(AsciidocVisitor):
             if 'subtitle' in class_:
                 return f'\n{text}\n\n'
 
-            if kwargs.get('blockquote', False):
+            if ctx.blockquote:
                 # skip heading
                 return f'\n{text}\n\n'
             else:
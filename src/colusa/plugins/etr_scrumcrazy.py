@@ -1,8 +1,13 @@
-from colusa.etr import Extractor, register_extractor
+from colusa.etr import CleanupRule, Extractor, register_extractor
 
 
 @register_extractor('//scrumcrazy.wordpress.com')
 class ScrumCrazyExtractor(Extractor):
+    cleanup_rules = [
+        CleanupRule('div', {'id': 'jp-post-flair'}),
+        CleanupRule('p', {'class': 'postinfo'}),
+    ]
+
     def __init__(self, bs):
         self._cached_author = None
         super(ScrumCrazyExtractor, self).__init__(bs)
@@ -26,7 +31,3 @@ class ScrumCrazyExtractor(Extractor):
             return entry
         else:
             return possible_main
-
-    def cleanup(self):
-        self.remove_tag(self.main_content, 'div', attrs={'id': 'jp-post-flair'})
-        self.remove_tag(self.main_content, 'p', attrs={'class': 'postinfo'})
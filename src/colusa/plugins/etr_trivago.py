@@ -1,8 +1,12 @@
-from colusa.etr import Extractor, register_extractor
+from colusa.etr import CleanupRule, Extractor, register_extractor
 
 
 @register_extractor('//tech.trivago.com')
 class TrivagoExtractor(Extractor):
+    cleanup_rules = [
+        CleanupRule('header', {'class': 'post__header'}),
+    ]
+
     def __init__(self, bs):
         super(TrivagoExtractor, self).__init__(bs)
         self.title = ''
@@ -11,9 +15,7 @@ class TrivagoExtractor(Extractor):
         return self.title
 
     def _parse_author(self):
-        meta = self.bs.find_all('meta', attrs={'name': 'author'})
-        for a in meta:
-            value = a.get('content')
+        for value in self.metadata.meta_contents('name', 'author'):
             if value is not None and 'trivago' not in value:
                 return value
 
@@ -21,4 +23,4 @@ class TrivagoExtractor(Extractor):
 
     def cleanup(self):
         self.title = self.main_content.find('header', class_='post__header').find('h1').text
-        self.remove_tag(self.main_content, 'header', attrs={'class': 'post__header'})
+        super(TrivagoExtractor, self).cleanup()
@@ -2,22 +2,23 @@ import re
 
 from bs4 import Tag
 
-from colusa.etr import Extractor, Transformer, register_extractor, register_transformer
+from colusa.etr import CleanupRule, Extractor, Transformer, register_extractor, register_transformer
 
 
 @register_extractor('//truyenfull.vn')
 class TruyenFullExtractor(Extractor):
+    content_regions = [('div', {'id': 'chapter-big-container'})]
+    cleanup_rules = [
+        CleanupRule('div', {'id': 'chapter-nav-top'}),
+        CleanupRule('div', {'id': 'chapter-nav-bot'}),
+        CleanupRule('a', {'class': 'truyen-title'}),
+        CleanupRule('h2'),
+        CleanupRule('div', {'class': 'group_story'}),
+    ]
+
     def _find_main_content(self):
         return self.bs.find('div', id='chapter-big-container')
 
-    def cleanup(self):
-        self.remove_tag(self.main_content, 'div', attrs={'id': 'chapter-nav-top'})
-        self.remove_tag(self.main_content, 'div', attrs={'id': 'chapter-nav-bot'})
-        self.remove_tag(self.main_content, 'a', attrs={'class': 'truyen-title'})
-        self.remove_tag(self.main_content, 'h2', attrs={})
-        self.remove_tag(self.main_content, 'div', attrs={'class': 'group_story'})
-        
-
 
 @register_transformer('//truyenfull.vn')
 class TruyenFullTransformer(Transformer):
@@ -39,4 +40,3 @@ class TruyenFullTransformer(Transformer):
         value = re.sub(r"^'''\n{2,}'''", "", value, flags=re.MULTILINE)
         self.value = value
         return value
-
@@ -1,12 +1,13 @@
-from colusa.etr import Extractor, register_extractor
+from colusa.etr import CleanupRule, Extractor, register_extractor
 
 
 @register_extractor('//xp123.com')
 class XP123Extractor(Extractor):
+    cleanup_rules = [
+        CleanupRule('header', {'class': 'entry-header'}),
+        CleanupRule('section', {'class': 'yikes-mailchimp-container'}),
+        CleanupRule('footer', {'class': 'entry-meta'}),
+    ]
+
     def _find_main_content(self):
         return self.bs.find('article', attrs={'class': 'post'})
-
-    def cleanup(self):
-        self.remove_tag(self.main_content, 'header', attrs={'class': 'entry-header'})
-        self.remove_tag(self.main_content, 'section', attrs={'class': 'yikes-mailchimp-container'})
-        self.remove_tag(self.main_content, 'footer', attrs={'class': 'entry-meta'})
@@ -3,13 +3,21 @@ import re
 
 @register_postprocessor('post-processor.RegexReplace')
 class RegexReplaceProcessor(PostProcessor):
+    def __init__(self, file_path, params):
+        super().__init__(file_path, params)
+        self.replacements = [(re.compile(kv.get('s'), flags=re.MULTILINE | re.DOTALL), kv.get('r'))
+                             for kv in params]
+
+    def process(self, text):
+        for pattern, replacement in self.replacements:
+            text = pattern.sub(replacement, text)
+        return text
+
     def run(self):
         with open(self.file_path) as fd:
             data = fd.read()
 
-        for kv in self.params:
-            data = re.sub(kv.get('s'), kv.get('r'), data, flags=re.MULTILINE | re.DOTALL)
+        data = self.process(data)
 
         with open(self.file_path, 'wt') as fd:
             fd.write(data)
-
@@ -1,8 +1,10 @@
+import codecs
 import hashlib
 import os
 import pathlib
 import shutil
 import re
+import threading
 from typing import Any, Optional
 
 import requests
@@ -38,6 +40,192 @@ def get_short_hexdigest(str_value: str) -> str:
     return m.hexdigest()[:8]
 
 
+def get_image_name(url_path: str) -> str:
+    """Calculate name of downloaded image on local file system.
+
+    The name only depends on `url_path`, so it is known before the image is downloaded.
+
+    Args:
+        url_path: URL of the image
+
+    Returns:
+        SHA-256 hex digest of the URL followed by the extension of the URL path
+    """
+    import urllib.parse
+
+    result = urllib.parse.urlsplit(url_path)
+    p = pathlib.PurePath(result.path)
+    return f'{get_hexdigest(url_path)}{p.suffix}'
+
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+_CONTENT_TYPE_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+# size of the prefix of the document scanned for <meta charset>, as browsers do
+_META_PRESCAN_SIZE = 4096
+# size of the sample given to the statistical detector
+_DETECT_SAMPLE_SIZE = 64 * 1024
+
+
+def _known_encoding(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def detect_encoding(data: bytes, content_type: Optional[str] = None) -> str:
+    """Find out the encoding of html document `data`, cheapest evidence first.
+
+    The encoding is taken from, in order: byte order mark, charset of `content_type`,
+    ``<meta charset>`` in the first 4 KB, then if `data` is not valid UTF-8, statistical
+    detection on the first 64 KB.
+
+    Args:
+        data: content of the document
+        content_type: value of `Content-Type` header the document was served with
+
+    Returns:
+        name of the encoding, usable with `bytes.decode`
+    """
+    encoding = _declared_encoding(data, content_type)
+    if encoding:
+        return encoding
+    try:
+        data.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return _guess_encoding(data)
+
+
+def decode_document(data: bytes, content_type: Optional[str] = None) -> str:
+    """Decode html document `data` with the encoding found by `detect_encoding`.
+
+    `data` is decoded only once: when the encoding is not declared, the text of the
+    successful UTF-8 trial is kept. Newlines are translated as when reading a file in text mode.
+
+    Args:
+        data: content of the document
+        content_type: value of `Content-Type` header the document was served with
+
+    Returns:
+        text of the document, undecodable bytes replaced
+    """
+    encoding = _declared_encoding(data, content_type)
+    if encoding:
+        text = data.decode(encoding, 'replace')
+    else:
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            text = data.decode(_guess_encoding(data), 'replace')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def _declared_encoding(data: bytes, content_type: Optional[str]) -> Optional[str]:
+    """
+    Encoding given by byte order mark, `content_type` or ``<meta charset>`` of `data`
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+    if content_type:
+        m = _CONTENT_TYPE_CHARSET.search(content_type)
+        encoding = _known_encoding(m.group(1)) if m else None
+        if encoding:
+            return encoding
+    m = _META_CHARSET.search(data, 0, _META_PRESCAN_SIZE)
+    return _known_encoding(m.group(1).decode('ascii')) if m else None
+
+
+def _guess_encoding(data: bytes) -> str:
+    import chardet
+
+    result = chardet.detect(data[:_DETECT_SAMPLE_SIZE])
+    return _known_encoding(result['encoding']) or 'utf-8'
+
+
+def write_file_atomic(file_path: str, data: bytes) -> None:
+    """Write `data` to `file_path` so that readers never see a partially written file.
+
+    Args:
+        file_path: path of the file to write, its folder must exist
+        data: content of the file
+    """
+    part_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.part'
+    with open(part_path, 'wb') as file_out:
+        file_out.write(data)
+    os.replace(part_path, file_path)
+
+
+def write_file_if_changed(file_path: str, data: bytes) -> bool:
+    """Atomically replace `file_path` with `data` unless the file already has this content,
+    so that unchanged files keep their modification time.
+
+    Args:
+        file_path: path of the file to write, its folder must exist
+        data: content of the file
+
+    Returns:
+        True when the file is written
+    """
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        size = -1
+    if size == len(data):
+        m = hashlib.sha256()
+        with open(file_path, 'rb') as file_in:
+            for block in iter(lambda: file_in.read(65536), b''):
+                m.update(block)
+        if m.digest() == hashlib.sha256(data).digest():
+            return False
+    write_file_atomic(file_path, data)
+    return True
+
+
+def link_file(src_path: str, dst_path: str) -> None:
+    """Make content of `src_path` available at `dst_path` without copying it when possible.
+
+    Tries a hard link first, then a copy-on-write clone (reflink, on file systems supporting it),
+    then falls back to a plain copy. `dst_path` is replaced atomically if it exists.
+
+    Args:
+        src_path: path of the existing file
+        dst_path: path of the new file
+    """
+    part_path = f'{dst_path}.{os.getpid()}.{threading.get_ident()}.part'
+    try:
+        os.link(src_path, part_path)
+    except OSError:
+        _clone_file(src_path, part_path)
+    os.replace(part_path, dst_path)
+
+
+# ioctl request of Linux to share the extents of a file with another one
+_FICLONE = 0x40049409
+
+
+def _clone_file(src_path: str, dst_path: str) -> None:
+    try:
+        import fcntl
+
+        with open(src_path, 'rb') as file_in, open(dst_path, 'wb') as file_out:
+            fcntl.ioctl(file_out.fileno(), _FICLONE, file_in.fileno())
+    except (ImportError, OSError):
+        shutil.copyfile(src_path, dst_path)
+
+
 def slugify(value: str, allow_unicode: bool = False) -> str:
     """
     Convert to ASCII if 'allow_unicode' is False. Convert spaces to hyphens.
@@ -1,14 +1,206 @@
 # -*- coding: utf-8 -*-
 """API for traversing the document nodes. Implemented by the compiler and
 meta introspection.
+
+Visitor functions are either plain functions returning the text of their node,
+or generator functions. A generator function asks for the text of the children of
+a node by yielding `self.children(node, ...)`, or for the text of a single node by
+yielding `self.child(node, ...)`, and gets the text back from the yield expression.
+Code before the yield runs when entering the node and code after it when leaving.
+Arguments of the request, such as the context of a nested scope, are passed to the
+visitor functions of the children. Generators are driven by an explicit stack,
+deeply nested pages neither recurse nor hit `RecursionError`.
+
+Text is collected in the `OutputBuffer` of the visitor. Returned text is appended to
+it. A generator function may instead yield `self.write_children(node, ...)`: the text
+of the children stays in the buffer, where the function adds its own prefix and suffix
+or edits the span of its children in place, so text is not copied again at each level
+of the document.
 """
 
-from typing import Any, Callable, Optional
+from collections import Counter
+from types import GeneratorType
+from typing import Any, Callable, Generator, Optional, Type, Union
 
 from bs4 import PageElement, NavigableString, Tag, BeautifulSoup
 
 from colusa import logs
 
+TAG_VISITOR_PREFIX = 'visit_tag_'
+
+
+class OutputBuffer:
+    """Append-only list of text fragments shared by the visitor functions of a visit.
+
+    A span is the text written since a position returned by `mark`, up to the end of
+    the buffer. Edits of a span only touch the fragments at its edges, fragments are
+    never empty.
+    """
+
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+
+    def mark(self) -> int:
+        return len(self.parts)
+
+    def write(self, text: Optional[str]) -> None:
+        if text:
+            self.parts.append(text)
+
+    def take(self, start: int) -> str:
+        """
+        Remove the span starting at `start` and return its text
+        """
+        text = ''.join(self.parts[start:])
+        del self.parts[start:]
+        return text
+
+    def truncate(self, start: int) -> None:
+        del self.parts[start:]
+
+    def is_empty(self, start: int) -> bool:
+        return len(self.parts) <= start
+
+    def is_blank(self, start: int) -> bool:
+        parts = self.parts
+        for i in range(start, len(parts)):
+            if not parts[i].isspace():
+                return False
+        return True
+
+    def contains(self, start: int, text: str) -> bool:
+        parts = self.parts
+        for i in range(start, len(parts)):
+            if text in parts[i]:
+                return True
+        return False
+
+    def strip(self, start: int) -> None:
+        """
+        Strip whitespace around the span starting at `start`
+        """
+        parts = self.parts
+        end = len(parts)
+        while end > start:
+            text = parts[end - 1].rstrip()
+            if text:
+                parts[end - 1] = text
+                break
+            end -= 1
+        del parts[end:]
+        first = start
+        while first < end:
+            text = parts[first].lstrip()
+            if text:
+                parts[first] = text
+                break
+            first += 1
+        del parts[start:first]
+
+    def wrap(self, start: int, prefix: str, suffix: str) -> None:
+        """
+        Add `prefix` and `suffix` around the span starting at `start`
+        """
+        if start < len(self.parts):
+            self.parts[start] = prefix + self.parts[start]
+        else:
+            self.write(prefix)
+        self.write(suffix)
+
+    def wrap_stripped(self, start: int, w: str) -> None:
+        """
+        Put `w` around the span starting at `start`, inside its surrounding whitespace.
+        A blank span is removed
+        """
+        parts = self.parts
+        first = start
+        while first < len(parts) and parts[first].isspace():
+            first += 1
+        if first == len(parts):
+            self.truncate(start)
+            return
+        text = parts[first]
+        stripped = text.lstrip()
+        parts[first] = f'{text[:len(text) - len(stripped)]}{w}{stripped}'
+        last = len(parts) - 1
+        while parts[last].isspace():
+            last -= 1
+        text = parts[last]
+        stripped = text.rstrip()
+        parts[last] = f'{stripped}{w}{text[len(stripped):]}'
+
+
+class VisitChildren:
+    """Request yielded by visitor functions: visit children of `node` and send back
+    their concatenated text
+    """
+    __slots__ = ('node', 'args', 'kwargs')
+
+    def __init__(self, node: Optional[PageElement], args: tuple[Any, ...], kwargs: dict[str, Any]) -> None:
+        self.node = node
+        self.args = args
+        self.kwargs = kwargs
+
+
+class VisitNode(VisitChildren):
+    """Request yielded by visitor functions: visit `node` and send back its text
+    """
+    __slots__ = ()
+
+
+class WriteChildren(VisitChildren):
+    """Request yielded by visitor functions: visit children of `node` and leave their
+    text in the output buffer
+    """
+    __slots__ = ()
+
+
+"""
+Steps of a generator visitor function: it yields requests, receives text of the
+requested nodes and returns text to append to the output buffer
+"""
+Steps = Generator[VisitChildren, Optional[str], Optional[str]]
+
+"""
+Dictionary of dispatch tables, by visitor class
+"""
+__DISPATCH_TABLES: dict[Type['NodeVisitor'], 'DispatchTable'] = {}
+
+
+class DispatchTable:
+    """Visitor functions of a visitor class, by tag name and by node type.
+
+    Functions are looked up once on the class, so aliases such as
+    ``visit_tag_b = visit_tag_strong`` and overrides in subclasses are resolved the
+    same way attribute lookup would resolve them.
+    """
+
+    def __init__(self, cls: Type['NodeVisitor']) -> None:
+        self.tags: dict[str, Callable[..., str]] = {}
+        for name in dir(cls):
+            if name.startswith(TAG_VISITOR_PREFIX):
+                value = getattr(cls, name)
+                if callable(value):
+                    self.tags[name[len(TAG_VISITOR_PREFIX):]] = value
+        self.types: dict[type, Callable[..., str]] = {
+            NavigableString: cls.visit_text,
+            BeautifulSoup: cls.visit_BeautifulSoup,
+        }
+        self.unknown: Callable[..., str] = cls.visit_unknown
+        # tag names without visitor function already reported
+        self.warned: set[str] = set()
+
+
+def get_dispatch_table(cls: Type['NodeVisitor']) -> DispatchTable:
+    """
+    Dispatch table of visitor class `cls`, built on first use
+    """
+    table = __DISPATCH_TABLES.get(cls)
+    if table is None:
+        table = DispatchTable(cls)
+        __DISPATCH_TABLES[cls] = table
+    return table
+
 
 class NodeVisitor:
     """Walks the abstract syntax tree and call visitor functions for every
@@ -20,8 +212,16 @@ class NodeVisitor:
     be `visit_TryFinally`.  This behavior can be changed by overriding
     the `get_visitor` function.  If no visitor function exists for a node
     (return value `None`) the `generic_visit` visitor is used instead.
+
+    Visitor functions are looked up on the class, once per visitor class, see
+    `DispatchTable`. Tags without visitor function are reported once per tag
+    name and counted in `unknown_tags`.
     """
 
+    def __init__(self) -> None:
+        self.unknown_tags: Counter[str] = Counter()
+        self.output: OutputBuffer = OutputBuffer()
+
     def get_visitor(self, node: PageElement) -> Optional[Callable[..., str]]:
         """Return the visitor function for this node or `None` if no visitor
         exists for this node.  In that case the generic visit function is
@@ -33,18 +233,22 @@ class NodeVisitor:
         Returns:
             The visitor method or None if not found
         """
-        if type(node) is NavigableString:
-            method = "visit_text"
-        elif type(node) is Tag:
-            method = f"visit_tag_{node.name}"
-        elif type(node) is BeautifulSoup:
-            method = 'visit_BeautifulSoup'
-        else:
-            method = "visit_unknown"
-        value = getattr(self, method, None)
-        if value is None:
-            logs.warn('Cannot get visit method:', method)
-        return value
+        function = self._find_function(node)
+        if function is None:
+            return None
+        return function.__get__(self, type(self))
+
+    def _find_function(self, node: PageElement) -> Optional[Callable[..., str]]:
+        table = get_dispatch_table(type(self))
+        if type(node) is not Tag:
+            return table.types.get(type(node), table.unknown)
+        function = table.tags.get(node.name)
+        if function is None:
+            self.unknown_tags[node.name] += 1
+            if node.name not in table.warned:
+                table.warned.add(node.name)
+                logs.warn('Cannot get visit method:', f'{TAG_VISITOR_PREFIX}{node.name}')
+        return function
 
     def visit(self, node: PageElement, *args: Any, **kwargs: Any) -> str:
         """Visit a node.
@@ -57,10 +261,113 @@ class NodeVisitor:
         Returns:
             String result from visiting the node
         """
-        f = self.get_visitor(node)
-        if f is not None:
-            return f(node, *args, **kwargs)
-        return self.generic_visit(node, *args, **kwargs)
+        return self._run(self._visit_node(node, args, kwargs))
+
+    def children(self, node: Optional[PageElement], *args: Any, **kwargs: Any) -> VisitChildren:
+        """Request to yield from a generator visitor function to get the text of the
+        children of `node`, the equivalent of calling `generic_visit`
+        """
+        return VisitChildren(node, args, kwargs)
+
+    def write_children(self, node: Optional[PageElement], *args: Any, **kwargs: Any) -> WriteChildren:
+        """Request to yield from a generator visitor function to visit the children of
+        `node`, their text is left in `self.output`
+        """
+        return WriteChildren(node, args, kwargs)
+
+    def child(self, node: PageElement, *args: Any, **kwargs: Any) -> VisitNode:
+        """Request to yield from a generator visitor function to get the text of
+        `node`, the equivalent of calling `visit`
+        """
+        return VisitNode(node, args, kwargs)
+
+    def _enter(self, node: PageElement, args: tuple[Any, ...], kwargs: dict[str, Any]) -> Union[None, str, Steps]:
+        if type(self).get_visitor is not NodeVisitor.get_visitor:
+            # subclass chooses its own visitor functions
+            f = self.get_visitor(node)
+            if f is not None:
+                return f(node, *args, **kwargs)
+            return self._visit_children(node, args, kwargs, False)
+
+        function = self._find_function(node)
+        if function is None:
+            return self._visit_children(node, args, kwargs, False)
+        return function(self, node, *args, **kwargs)
+
+    def _visit_node(self, node: PageElement, args: tuple[Any, ...], kwargs: dict[str, Any]) -> Steps:
+        start = self.output.mark()
+        value = self._enter(node, args, kwargs)
+        if type(value) is GeneratorType:
+            value = yield value
+        self.output.write(value)
+        return self.output.take(start)
+
+    def _visit_children(self, node: Optional[PageElement], args: tuple[Any, ...], kwargs: dict[str, Any],
+                        take: bool) -> Steps:
+        if node is None:
+            return '' if take else None
+        output = self.output
+        start = output.mark()
+        try:
+            for child in node.contents:
+                value = self._enter(child, args, kwargs)
+                if type(value) is GeneratorType:
+                    # steps of the visitor function of child are run by `_run`
+                    value = yield value
+                output.write(value)
+        except TypeError as e:
+            logs.error(e)
+        return output.take(start) if take else None
+
+    def _run(self, value: Union[None, str, Steps]) -> Optional[str]:
+        """Drive generator visitor functions with an explicit stack. Exceptions are
+        thrown into the visitor function that requested the failing node.
+        """
+        if type(value) is not GeneratorType:
+            return value
+        stack: list[Steps] = [value]
+        push = stack.append
+        pop = stack.pop
+        sent: Any = None
+        error: Optional[BaseException] = None
+        while stack:
+            try:
+                if error is None:
+                    request = stack[-1].send(sent)
+                else:
+                    request = stack[-1].throw(error)
+                    error = None
+            except StopIteration as stop:
+                pop()
+                sent = stop.value
+                continue
+            except Exception as e:
+                pop()
+                if not stack:
+                    raise
+                error = e
+                continue
+
+            request_type = type(request)
+            if request_type is GeneratorType:
+                push(request)
+                sent = None
+                continue
+            try:
+                if request_type is WriteChildren:
+                    value = self._visit_children(request.node, request.args, request.kwargs, False)
+                elif request_type is VisitChildren:
+                    value = self._visit_children(request.node, request.args, request.kwargs, True)
+                elif request_type is VisitNode:
+                    value = self._visit_node(request.node, request.args, request.kwargs)
+                else:
+                    raise TypeError(f'unexpected request from visitor function: {request!r}')
+            except Exception as e:
+                error = e
+                continue
+            push(value)
+            sent = None
+        return sent
 
     def visit_text(self, node: NavigableString, *args: Any, **kwargs: Any) -> str:
         """Visit a text node.
@@ -89,7 +396,7 @@ class NodeVisitor:
         logs.warn('UNKNOWN Node Type:', node.__class__.__name__)
         return ''
 
-    def visit_BeautifulSoup(self, node: BeautifulSoup, *args: Any, **kwargs: Any) -> str:
+    def visit_BeautifulSoup(self, node: BeautifulSoup, *args: Any, **kwargs: Any) -> Steps:
         """Visit a BeautifulSoup root node.
         
         Args:
@@ -100,10 +407,12 @@ class NodeVisitor:
         Returns:
             Result of generic_visit on the node
         """
-        return self.generic_visit(node, *args, **kwargs)
+        yield self.write_children(node, *args, **kwargs)
+        return None
 
     def generic_visit(self, node: Optional[PageElement], *args: Any, **kwargs: Any) -> str:
-        """Called if no explicit visitor function exists for a node.
+        """Called if no explicit visitor function exists for a node. Generator
+        visitor functions yield `self.children(node, ...)` instead.
         
         Args:
             node: The node to visit generically
@@ -113,14 +422,4 @@ class NodeVisitor:
         Returns:
             Concatenated results from visiting all child nodes
         """
-        if node is None:
-            return ''
-
-        content: list[str] = []
-        try:
-            for child in node.contents:
-                value = self.visit(child, *args, **kwargs)
-                content.append(value)
-        except TypeError as e:
-            logs.error(e)
-        return ''.join(content)
+        return self._run(self._visit_children(node, args, kwargs, True))
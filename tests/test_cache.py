@@ -0,0 +1,282 @@
+import importlib.util
+import os
+import tempfile
+import time
+import unittest
+
+from unittest.mock import patch
+
+from colusa import Colusa, ConfigurationError
+from colusa.cache import CACHE_DIR_ENV, CacheMetadata, create_cache_store, get_cache_root
+from colusa.config import CacheConfig
+from colusa.fetch import Downloader, ImageDownloader
+
+
+class CacheStoreTestCase(unittest.TestCase):
+    store_name = 'file'
+    compression = 'gzip'
+    layout = 'flat'
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = self.create_store(self.layout)
+
+    def create_store(self, layout):
+        return create_cache_store(self.tmp_dir.name, CacheConfig(store=self.store_name, compression=self.compression,
+                                                                 layout=layout))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def put_page(self, url, data, accessed=None):
+        with open(self.store.page_download_path(url), 'wb') as file_out:
+            file_out.write(data)
+        self.store.commit_page(url, CacheMetadata(url, etag='"v1"'))
+        if accessed is not None:
+            self.set_last_access(url, accessed)
+
+    def set_last_access(self, url, accessed):
+        for entry in self.store.entries():
+            if entry.url == url:
+                os.utime(entry.path, (accessed, accessed))
+
+    def test_page_round_trip(self):
+        url = 'https://example.com/a'
+        self.assertFalse(self.store.has_page(url))
+        self.put_page(url, b'<html>a</html>')
+        self.assertTrue(self.store.has_page(url))
+        self.assertEqual(b'<html>a</html>', self.store.read_page(url))
+        self.assertEqual('"v1"', self.store.page_metadata(url).etag)
+        self.assertEqual({'page': (1, os.path.getsize(next(self.store.entries()).path))}, self.store.stats())
+
+    def test_gc_evicts_least_recently_used(self):
+        now = time.time()
+        self.put_page('https://example.com/old', b'x' * 4000, accessed=now - 300)
+        self.put_page('https://example.com/new', b'y' * 4000, accessed=now - 100)
+        self.store.read_page('https://example.com/new')
+        size = sum(entry.size for entry in self.store.entries())
+
+        evicted = self.store.gc(size - 1)
+        self.assertEqual(['https://example.com/old'], [entry.url for entry in evicted])
+        self.assertTrue(self.store.has_page('https://example.com/new'))
+
+        # entries used since `keep_since` are never evicted
+        self.assertEqual([], self.store.gc(0, keep_since=now - 10))
+        self.assertTrue(self.store.has_page('https://example.com/new'))
+
+    def test_gc_keeps_images_of_the_book(self):
+        url = 'https://example.com/a.png'
+        with open(self.store.image_download_path(url), 'wb') as file_out:
+            file_out.write(b'x' * 100)
+        self.store.commit_image(url)
+        self.put_page('https://example.com/a', b'<html>a</html>')
+
+        self.assertEqual(['page'], [entry.kind for entry in self.store.gc(0)])
+        self.assertTrue(self.store.has_image(url))
+
+    def test_verify_reports_incomplete_download(self):
+        self.put_page('https://example.com/a', b'<html>a</html>')
+        self.assertEqual([], self.store.verify())
+        with open(os.path.join(self.store.images_dir, 'x.png.part'), 'wb') as file_out:
+            file_out.write(b'x')
+        self.assertEqual(1, len(self.store.verify()))
+
+
+    def put_image(self, url, data):
+        with open(self.store.image_download_path(url), 'wb') as file_out:
+            file_out.write(data)
+        self.store.commit_image(url)
+
+    def test_migrate_flat_layout(self):
+        if self.layout != 'flat':
+            self.skipTest('migration starts from flat layout')
+        self.put_page('https://example.com/a', b'<html>a</html>')
+        self.put_image('https://example.com/a.png', b'png')
+        self.store.close()
+
+        self.store = self.create_store('sharded')
+        self.assertEqual(2, self.store.migrate())
+        self.assertEqual(b'<html>a</html>', self.store.read_page('https://example.com/a'))
+        self.assertEqual('"v1"', self.store.page_metadata('https://example.com/a').etag)
+        self.assertEqual({'page', 'image'}, {entry.kind for entry in self.store.entries()})
+        self.assertEqual([], self.store.verify())
+        # image is still referenced by the book
+        image_name = os.path.basename(self.store.image_path('https://example.com/a.png'))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, 'images', image_name)))
+        self.assertEqual(0, self.store.migrate())
+
+
+class ShardedCacheStoreTestCase(CacheStoreTestCase):
+    layout = 'sharded'
+
+    def test_entries_are_sharded(self):
+        url = 'https://example.com/a'
+        self.put_page(url, b'<html>a</html>')
+        path = os.path.relpath(next(self.store.entries()).path, self.tmp_dir.name)
+        digest = os.path.basename(path)
+        self.assertEqual(os.path.join('.cached', digest[:2], digest[2:4], digest), path)
+
+    def test_manifest_is_compacted(self):
+        now = time.time()
+        for index in range(3):
+            self.put_page(f'https://example.com/{index}', b'x' * 100, accessed=now - 100 + index)
+        self.store.gc(100)
+        with open(self.store.manifest.file_path, 'rt') as file_in:
+            self.assertEqual(1, len(file_in.readlines()))
+        self.assertEqual(['https://example.com/2'], [entry.url for entry in self.store.entries()])
+
+
+class CompressedCacheStoreTestCase(CacheStoreTestCase):
+    store_name = 'compressed'
+
+    def set_last_access(self, url, accessed):
+        with self.store._db:
+            self.store._db.execute('UPDATE entries SET last_access = ? WHERE url = ?', (accessed, url))
+
+    def test_identical_pages_are_stored_once(self):
+        self.put_page('https://example.com/a', b'same' * 1000)
+        self.put_page('https://example.com/b', b'same' * 1000)
+        paths = {entry.path for entry in self.store.entries()}
+        self.assertEqual(1, len(paths))
+        self.assertLess(os.path.getsize(paths.pop()), 1000)
+
+        # blob is removed with its last reference
+        entries = sorted(self.store.entries(), key=lambda e: e.url)
+        self.assertEqual(0, self.store.remove(entries[0]))
+        self.assertEqual(b'same' * 1000, self.store.read_page('https://example.com/b'))
+        self.assertLess(0, self.store.remove(entries[1]))
+
+    def test_verify_reports_corrupted_blob(self):
+        self.put_page('https://example.com/a', b'<html>a</html>')
+        entry = next(self.store.entries())
+        with open(entry.path, 'wb') as file_out:
+            file_out.write(b'garbage')
+        self.assertEqual(1, len(self.store.verify()))
+
+    def test_images_are_indexed(self):
+        url = 'https://example.com/a.png'
+        with open(self.store.image_download_path(url), 'wb') as file_out:
+            file_out.write(b'png')
+        self.store.touch_image(url)
+        self.assertEqual({'image': (1, 3)}, self.store.stats())
+        self.assertEqual([], self.store.verify())
+
+
+    def test_pages_of_unavailable_codec_are_missing(self):
+        url = 'https://example.com/a'
+        self.put_page(url, b'<html>a</html>')
+        blob_path = next(self.store.entries()).path
+        unknown_path = f'{os.path.splitext(blob_path)[0]}.unknown'
+        os.rename(blob_path, unknown_path)
+        with self.store._db:
+            self.store._db.execute('UPDATE entries SET path = ?', (self.store._relpath(unknown_path),))
+        self.assertFalse(self.store.has_page(url))
+
+
+class ShardedCompressedCacheStoreTestCase(CompressedCacheStoreTestCase):
+    layout = 'sharded'
+
+
+@unittest.skipUnless(importlib.util.find_spec('zstandard'), 'zstandard is not installed')
+class ZstdCacheStoreTestCase(CompressedCacheStoreTestCase):
+    compression = 'zstd'
+
+    def test_pages_survive_change_of_compression(self):
+        self.put_page('https://example.com/a', b'<html>a</html>')
+        for compression in ['gzip', 'zstd']:
+            self.store.close()
+            self.store = create_cache_store(self.tmp_dir.name, CacheConfig(store=self.store_name,
+                                                                           compression=compression))
+            self.assertTrue(self.store.has_page('https://example.com/a'))
+            self.assertEqual(b'<html>a</html>', self.store.read_page('https://example.com/a'))
+            self.put_page(f'https://example.com/{compression}', compression.encode('utf-8'))
+        self.assertEqual(b'gzip', self.store.read_page('https://example.com/gzip'))
+        self.assertEqual([], self.store.verify())
+
+
+class CreateCacheStoreTestCase(unittest.TestCase):
+    def test_unknown_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(ConfigurationError):
+                create_cache_store(tmp_dir, CacheConfig(store='memcached'))
+            with self.assertRaises(ConfigurationError):
+                create_cache_store(tmp_dir, CacheConfig(store='compressed', compression='lz4'))
+
+
+class SharedCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.shared_dir = self.tmp_path('shared')
+        self.source = self.tmp_path('article.html')
+        with open(self.source, 'wt') as file_out:
+            file_out.write('<html><body>article</body></html>')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def tmp_path(self, *paths):
+        return os.path.join(self.tmp_dir.name, *paths)
+
+    def test_cache_root(self):
+        with patch.dict(os.environ, {CACHE_DIR_ENV: '/env/cache'}):
+            self.assertEqual('/env/cache', get_cache_root('book', CacheConfig()))
+            self.assertEqual('/config/cache', get_cache_root('book', CacheConfig(shared_dir='/config/cache')))
+        with patch.dict(os.environ, clear=True):
+            self.assertEqual('book', get_cache_root('book', CacheConfig()))
+
+    def test_books_share_pages(self):
+        url = f'file://{self.source}'
+        for index, book in enumerate(['book-1', 'book-2']):
+            with Colusa({
+                'title': 'test', 'author': 'tester', 'version': 'v1.0', 'homepage': 'dummy',
+                'output_dir': self.tmp_path(book),
+                'cache': {'shared_dir': self.shared_dir},
+                'urls': [url],
+            }) as runner:
+                self.assertTrue(runner.cache_store.shared)
+                self.assertEqual('<html><body>article</body></html>', runner.download_content(url))
+            if index == 0:
+                # second book must use the copy cached by the first one
+                os.remove(self.source)
+        self.assertFalse(os.path.exists(self.tmp_path('book-1', '.cached')))
+        self.assertEqual({'page': (1, 33)}, create_cache_store(self.tmp_path('book-2'),
+                                                               CacheConfig(shared_dir=self.shared_dir)).stats())
+
+    def test_images_are_linked_into_books(self):
+        url = f'file://{self.source}'
+        config = CacheConfig(shared_dir=self.shared_dir)
+        with Downloader() as downloader:
+            for book in ['book-1', 'book-2']:
+                with create_cache_store(self.tmp_path(book), config) as store, \
+                        ImageDownloader(downloader, store=store) as images:
+                    name = images.submit(url, self.tmp_path(book))
+        cached = os.stat(os.path.join(self.shared_dir, 'images', name))
+        for book in ['book-1', 'book-2']:
+            linked = os.stat(self.tmp_path(book, 'images', name))
+            self.assertEqual((cached.st_dev, cached.st_ino), (linked.st_dev, linked.st_ino))
+
+    def test_entries_of_private_store_are_not_locked(self):
+        with create_cache_store(self.tmp_path('book'), CacheConfig()) as store:
+            with store.lock('https://example.com/a'):
+                pass
+            self.assertEqual([], os.listdir(store.locks_dir))
+
+    def test_entries_share_striped_locks(self):
+        with create_cache_store(self.tmp_path('book'), CacheConfig(shared_dir=self.shared_dir)) as store:
+            for i in range(1000):
+                with store.lock(f'https://example.com/{i}'):
+                    pass
+            self.assertLessEqual(len(os.listdir(store.locks_dir)), 256)
+
+    def test_eviction_waits_for_builds(self):
+        with create_cache_store(self.tmp_path('book'), CacheConfig(shared_dir=self.shared_dir)) as store:
+            with store.in_use():
+                with store.try_exclusive() as acquired:
+                    self.assertFalse(acquired)
+            with store.try_exclusive() as acquired:
+                self.assertTrue(acquired)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from bs4 import BeautifulSoup
+
+from colusa.document import DocumentIndex
+from colusa.etr import Extractor
+
+PAGE = '''<html><head><title>Post</title></head><body>
+<div class="blog-content"><p>second candidate</p></div>
+<div class="sidebar entry-content"><p>first candidate</p></div>
+<div class="hs-blog-post"><div class="post-body">hs body</div></div>
+<div class="post-body">outside</div>
+<article id="post"><div class="entry-date published">today</div></article>
+</body></html>'''
+
+
+class DocumentIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = DocumentIndex(BeautifulSoup(PAGE, 'html.parser'))
+
+    def test_find(self):
+        self.assertEqual('post', self.index.find('article')['id'])
+        self.assertEqual('article', self.index.find(id='post').name)
+        self.assertEqual('today', self.index.find(class_='entry-date published').text)
+        self.assertEqual('today', self.index.find('div', class_='published').text)
+        self.assertIsNone(self.index.find('span', class_='published'))
+        self.assertEqual(2, len(self.index.find_all(class_='post-body')))
+
+    def test_find_within(self):
+        hs_blog_post = self.index.find(class_='hs-blog-post')
+        self.assertEqual(['hs body'], [tag.text for tag in self.index.find_all(class_='post-body', within=hs_blog_post)])
+        self.assertEqual([], self.index.find_all('article', within=hs_blog_post))
+
+    def test_find_any_class_keeps_document_order(self):
+        tag = self.index.find_any_class(['entry-content', 'blog-content'], name='div')
+        self.assertEqual('second candidate', tag.text)
+
+
+class FindMainContentTestCase(unittest.TestCase):
+    def main_content(self, body):
+        return Extractor(BeautifulSoup(f'<html><head><title>t</title></head><body>{body}</body></html>',
+                                       'html.parser')).main_content
+
+    def test_candidates(self):
+        self.assertEqual('blog', self.main_content(
+            '<div class="blog-content">blog</div><div class="entry-content">entry</div>').text)
+        self.assertEqual('main', self.main_content(
+            '<div class="hentry"><p>x</p><div role="main">main</div></div>').text)
+        self.assertEqual('hs body', self.main_content(
+            '<div class="post-body">outside</div><div class="hs-blog-post"><div class="post-body">hs body</div></div>').text)
+        self.assertEqual('main', self.main_content('<nav>nav</nav><main>main</main>').name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import re
+import unittest
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+
+from colusa import utils
+from colusa.etr import CleanupRule, Extractor, create_extractor, get_cleanup_matcher, parse_document
+
+PAGE = '''<html><head><title>Chapter 1</title><meta name="author" content="someone"></head>
+<body><div id="menu"><a href="/">Home</a></div>
+<div class="comments"><div id="chapter-big-container"><p>not the article</p></div></div>
+<div id="chapter-big-container"><h2>Story</h2><p>Chapter <b>text</b></p></div>
+<div id="comments"><p>comment</p></div></body></html>'''
+
+
+class ParseDocumentTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        utils.scan('colusa.plugins')
+
+    def test_only_content_regions_are_parsed(self):
+        parsers = [parser for parser in ['html.parser', 'lxml'] if builder_registry.lookup(parser)]
+        for parser in parsers:
+            bs = parse_document('https://truyenfull.vn/story/chapter-1', PAGE, parser)
+            self.assertIsNone(bs.find('div', id='menu'), parser)
+            self.assertIsNone(bs.find('div', id='comments'), parser)
+            self.assertEqual(2, len(bs.find_all('div', id='chapter-big-container')), parser)
+
+            extractor = create_extractor('https://truyenfull.vn/story/chapter-1', bs)
+            self.assertEqual('Chapter 1', extractor.title)
+            self.assertEqual('someone', extractor.author)
+
+    def test_whole_page_is_parsed_without_content_regions(self):
+        bs = parse_document('https://example.com/post', PAGE, 'html.parser')
+        self.assertIsNotNone(bs.find('div', id='menu'))
+
+
+
+ARTICLE = '''<html><head><title>Post</title></head><body><article>
+<header id="masthead">site</header><h1 class="title">Post</h1>
+<div class="share widget">share</div><div class="widget article">kept</div>
+<p style="color: red">ad</p><p>Article <span data-ad="1">ad</span> text</p>
+<section><aside class="related">related</aside></section><footer>footer</footer>
+</article></body></html>'''
+
+
+class RuleExtractor(Extractor):
+    cleanup_rules = [
+        CleanupRule('h1'),
+        CleanupRule('div', {'class': 'share'}),
+        CleanupRule('p', {'style': re.compile('color')}),
+        CleanupRule(attrs={'data-ad': True}),
+        CleanupRule(selector='section > aside.related'),
+    ] + Extractor.cleanup_rules
+
+
+class CleanupRulesTestCase(unittest.TestCase):
+    def cleanup(self, extractor_class):
+        extractor = extractor_class(BeautifulSoup(ARTICLE, 'html.parser'))
+        extractor.cleanup()
+        return extractor.main_content
+
+    def test_rules_remove_matching_elements(self):
+        content = self.cleanup(RuleExtractor)
+        self.assertEqual('kept Article text', ' '.join(content.get_text().split()))
+        for tag in ['h1', 'header', 'footer', 'aside']:
+            self.assertIsNone(content.find(tag), tag)
+        self.assertEqual(1, len(content.find_all('p')))
+        self.assertEqual('widget article', ' '.join(content.find('div')['class']))
+
+    def test_default_rules(self):
+        content = self.cleanup(Extractor)
+        self.assertIsNone(content.find('header'))
+        self.assertIsNone(content.find('footer'))
+        self.assertIsNotNone(content.find('h1'))
+
+    def test_rules_are_compiled_once_per_class(self):
+        self.assertIs(get_cleanup_matcher(RuleExtractor), get_cleanup_matcher(RuleExtractor))
+        self.assertIsNot(get_cleanup_matcher(RuleExtractor), get_cleanup_matcher(Extractor))
+
+    def test_remove_tag_is_kept(self):
+        extractor = Extractor(BeautifulSoup(ARTICLE, 'html.parser'))
+        extractor.remove_tag(extractor.main_content, 'div', {'class': 'widget article'})
+        self.assertEqual(1, len(extractor.main_content.find_all('div')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,390 @@
+import asyncio
+import http.server
+import importlib.util
+import os
+import tempfile
+import threading
+import unittest
+
+from colusa import Colusa
+from colusa.exceptions import DeadlineExceededError
+from colusa.fetch import (Downloader, Fetch, HostThrottle, ImageDownloader, download_image, get_image_name,
+                          parse_retry_after, register_fetch)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    peers = set()
+    paths = []
+
+    statuses = []
+    etag = '"v1"'
+    push_back = 0
+
+    def do_GET(self):
+        self.peers.add(self.client_address)
+        self.paths.append(self.path)
+        if self.path == '/truncated.png':
+            self.send_truncated()
+            return
+        if self.push_back > 0:
+            _Handler.push_back -= 1
+            self.statuses.append(429)
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.etag and self.headers.get('If-None-Match') == self.etag:
+            self.statuses.append(304)
+            self.send_response(304)
+            self.send_header('ETag', self.etag)
+            self.end_headers()
+            return
+        self.statuses.append(200)
+        body = f'<html><body>{self.path}</body></html>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if self.etag:
+            self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_truncated(self):
+        """Send half of the image on first request, then serve the rest with range requests"""
+        body = bytes(range(100))
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range') == self.etag:
+            offset = int(range_header.removeprefix('bytes=').rstrip('-'))
+            self.statuses.append(206)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {offset}-{len(body) - 1}/{len(body)}')
+            self.send_header('Content-Length', str(len(body) - offset))
+            self.send_header('ETag', self.etag)
+            self.end_headers()
+            self.wfile.write(body[offset:])
+            return
+        self.statuses.append(200)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', self.etag)
+        self.end_headers()
+        self.wfile.write(body[:50])
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServerTestCase(unittest.TestCase):
+    handler = _Handler
+
+    def setUp(self):
+        self.handler.peers = set()
+        self.handler.paths = []
+        self.handler.statuses = []
+        self.handler.etag = '"v1"'
+        self.handler.push_back = 0
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), self.handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def tmp_path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+
+class DownloaderTestCase(LocalServerTestCase):
+    def test_connection_is_reused(self):
+        with Downloader() as downloader:
+            for i in range(5):
+                downloader.download_url(f'{self.base_url}/page-{i}', self.tmp_path(f'{i}.html'))
+
+        self.assertEqual(1, len(self.handler.peers))
+        with open(self.tmp_path('3.html'), 'rb') as file_in:
+            self.assertEqual(b'<html><body>/page-3</body></html>', file_in.read())
+
+    def test_keep_alive_disabled(self):
+        with Downloader({'keep_alive': False}) as downloader:
+            for i in range(3):
+                downloader.download_url(f'{self.base_url}/page-{i}', self.tmp_path(f'{i}.html'))
+
+        self.assertEqual(3, len(self.handler.peers))
+
+    def test_retry_after_push_back(self):
+        self.handler.push_back = 2
+        with Downloader({'max_connections_per_host': 8}) as downloader:
+            result = downloader.download_url(f'{self.base_url}/page', self.tmp_path('page.html'))
+            throttle = downloader.scheduler.throttle(self.base_url)
+
+        self.assertEqual(200, result.status_code)
+        self.assertEqual([429, 429, 200], self.handler.statuses)
+        # halved down to 1 by push backs, then grown by the final success
+        self.assertEqual(2, throttle.limit)
+        self.assertTrue(os.path.exists(self.tmp_path('page.html')))
+
+    def test_give_up_after_max_retries(self):
+        self.handler.push_back = 5
+        with Downloader({'max_retries': 1}) as downloader:
+            result = downloader.download_url(f'{self.base_url}/page', self.tmp_path('page.html'))
+
+        self.assertEqual(429, result.status_code)
+        self.assertEqual([429, 429], self.handler.statuses)
+        self.assertFalse(os.path.exists(self.tmp_path('page.html')))
+
+    def test_resume_truncated_download(self):
+        with Downloader({'backoff_factor': 0.01}) as downloader:
+            downloader.download_url(f'{self.base_url}/truncated.png', self.tmp_path('image.png'), resume=True)
+
+        self.assertEqual([200, 206], self.handler.statuses)
+        with open(self.tmp_path('image.png'), 'rb') as file_in:
+            self.assertEqual(bytes(range(100)), file_in.read())
+        self.assertEqual(['image.png'], os.listdir(self.tmp_dir.name))
+
+    def test_truncated_download_is_never_visible(self):
+        with Downloader({'max_retries': 0}) as downloader:
+            with self.assertRaises(Exception):
+                downloader.download_url(f'{self.base_url}/truncated.png', self.tmp_path('image.png'), resume=True)
+
+        self.assertFalse(os.path.exists(self.tmp_path('image.png')))
+        self.assertTrue(os.path.exists(self.tmp_path('image.png.part')))
+
+    def test_deadline(self):
+        import time
+        with Downloader({'deadline': 0.01}) as downloader:
+            time.sleep(0.02)
+            with self.assertRaises(DeadlineExceededError):
+                downloader.download_url(f'{self.base_url}/page', self.tmp_path('page.html'))
+        self.assertEqual([], self.handler.paths)
+
+
+class HostThrottleTestCase(unittest.TestCase):
+    def test_rate_limit(self):
+        import time
+        throttle = HostThrottle(requests_per_second=50)
+        start = time.monotonic()
+        for _ in range(6):
+            with throttle.slot():
+                pass
+        # first request uses the initial token, next ones wait 1/50s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_concurrency_recovers(self):
+        throttle = HostThrottle(max_connections=4)
+        with throttle.slot():
+            throttle.backoff(0)
+        self.assertEqual(1, throttle.limit)
+        for _ in range(1 + 2 + 3):
+            with throttle.slot():
+                throttle.success()
+        self.assertEqual(4, throttle.limit)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(120.0, parse_retry_after('120'))
+        self.assertEqual(0.0, parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class RevalidationTestCase(LocalServerTestCase):
+    def create_colusa(self, cache_config, **config):
+        return Colusa({
+            'title': 'test',
+            'author': 'tester',
+            'version': 'v1.0',
+            'homepage': 'dummy',
+            'output_dir': self.tmp_dir.name,
+            'cache': cache_config,
+            'urls': [],
+            **config,
+        })
+
+    def test_conditional_requests(self):
+        url = f'{self.base_url}/chapter-1'
+        with self.create_colusa({}) as runner:
+            runner.download_content(url)
+            metadata = runner.cache_store.page_metadata(url)
+        self.assertEqual('"v1"', metadata.etag)
+        self.assertEqual('text/html; charset=utf-8', metadata.content_type)
+
+        # cache is used as is without revalidation
+        with self.create_colusa({}) as runner:
+            runner.download_content(url)
+        self.assertEqual([200], self.handler.statuses)
+
+        # fresh entries are not revalidated
+        with self.create_colusa({'revalidate': True, 'ttl': 3600}) as runner:
+            runner.download_content(url)
+        self.assertEqual([200], self.handler.statuses)
+
+        with self.create_colusa({'revalidate': True}) as runner:
+            self.assertEqual('<html><body>/chapter-1</body></html>', runner.download_content(url))
+            # revalidated once per build
+            runner.download_content(url)
+        self.assertEqual([200, 304], self.handler.statuses)
+
+        self.handler.etag = '"v2"'
+        with self.create_colusa({'revalidate': True}) as runner:
+            runner.download_content(url)
+            metadata = runner.cache_store.page_metadata(url)
+        self.assertEqual([200, 304, 200], self.handler.statuses)
+        self.assertEqual('"v2"', metadata.etag)
+
+    def test_stale_pages_without_validators_are_downloaded_again(self):
+        self.handler.etag = None
+        url = f'{self.base_url}/chapter-1'
+        with self.create_colusa({}) as runner:
+            runner.download_content(url)
+            metadata = runner.cache_store.page_metadata(url)
+        self.assertEqual({}, metadata.conditional_headers())
+
+        with self.create_colusa({'revalidate': True}) as runner:
+            runner.download_content(url)
+        self.assertEqual([200, 200], self.handler.statuses)
+
+        with self.create_colusa({'revalidate': True}, concurrency=2) as runner:
+            with runner.prefetch([url]):
+                runner.download_content(url)
+        self.assertEqual([200, 200, 200], self.handler.statuses)
+
+
+@register_fetch('test.threaded', r'.*')
+class ThreadedFetch(Fetch):
+    is_async = True
+
+
+class ThreadedAsyncFetchTestCase(LocalServerTestCase):
+    def test_default_get_async_runs_in_thread(self):
+        with Downloader({'test.threaded': {}, 'backoff_factor': 0.01}) as downloader:
+            self.assertTrue(downloader.is_async(self.base_url))
+
+            async def scenario():
+                await downloader.download_url_async(f'{self.base_url}/page', self.tmp_path('page.html'))
+                await downloader.download_url_async(f'{self.base_url}/truncated.png', self.tmp_path('image.png'),
+                                                    resume=True)
+
+            asyncio.run(scenario())
+
+        self.assertEqual([200, 200, 206], self.handler.statuses)
+        with open(self.tmp_path('page.html'), 'rb') as file_in:
+            self.assertEqual(b'<html><body>/page</body></html>', file_in.read())
+        with open(self.tmp_path('image.png'), 'rb') as file_in:
+            self.assertEqual(bytes(range(100)), file_in.read())
+
+
+@unittest.skipUnless(importlib.util.find_spec('aiohttp'), 'aiohttp is not installed')
+class MixedFetchTestCase(LocalServerTestCase):
+    def test_blocking_requests_are_retried_after_async_requests(self):
+        with Downloader({'aiohttp': {}, 'backoff_factor': 0.01}) as downloader:
+            async def scenario():
+                await downloader.download_url_async(f'{self.base_url}/page', self.tmp_path('page.html'))
+                await downloader.aclose()
+
+            asyncio.run(scenario())
+            downloader.download_url(f'{self.base_url}/truncated.png', self.tmp_path('image.png'), resume=True)
+
+        self.assertEqual([200, 200, 206], self.handler.statuses)
+        with open(self.tmp_path('image.png'), 'rb') as file_in:
+            self.assertEqual(bytes(range(100)), file_in.read())
+
+
+class ImageDownloaderTestCase(LocalServerTestCase):
+    def test_duplicated_images_are_coalesced(self):
+        os.makedirs(self.tmp_path('images'))
+        url = f'{self.base_url}/image.png'
+        with Downloader() as downloader, ImageDownloader(downloader, max_workers=2) as images:
+            names = [images.submit(url, self.tmp_dir.name) for _ in range(3)]
+            images.drain()
+
+            self.assertEqual([get_image_name(url)] * 3, names)
+            self.assertTrue(os.path.exists(self.tmp_path(os.path.join('images', names[0]))))
+            self.assertEqual(['/image.png'], self.handler.paths)
+
+            # image is on disk, no new request
+            images.submit(url, self.tmp_dir.name)
+            images.drain()
+            self.assertEqual(['/image.png'], self.handler.paths)
+
+    def test_images_without_downloader_share_connections(self):
+        os.makedirs(self.tmp_path('images'))
+        for i in range(3):
+            name = download_image(f'{self.base_url}/image-{i}.png', self.tmp_dir.name)
+            self.assertTrue(os.path.exists(self.tmp_path(os.path.join('images', name))))
+        self.assertEqual(1, len(self.handler.peers))
+
+
+async def _serve_asyncio(reader, writer):
+    """Minimal HTTP/1.1 server on asyncio streams, answers every GET with its path"""
+    while True:
+        request_line = await reader.readline()
+        if not request_line:
+            break
+        while (await reader.readline()) not in (b'\r\n', b''):
+            pass
+        path = request_line.split()[1]
+        body = b'<html><body>' + path + b'</body></html>'
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n'
+                     b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+        await writer.drain()
+    writer.close()
+
+
+@unittest.skipUnless(importlib.util.find_spec('aiohttp'), 'aiohttp is not installed')
+class AsyncFetchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_download_url_async(self):
+        async def scenario():
+            server = await asyncio.start_server(_serve_asyncio, '127.0.0.1', 0)
+            base_url = f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}'
+            downloader = Downloader({'aiohttp': {}})
+            self.assertTrue(downloader.is_async(base_url))
+            await asyncio.gather(*[
+                downloader.download_url_async(f'{base_url}/page-{i}', os.path.join(self.tmp_dir.name, f'{i}.html'))
+                for i in range(200)
+            ])
+            await downloader.aclose()
+            downloader.close()
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(scenario())
+        with open(os.path.join(self.tmp_dir.name, '123.html'), 'rb') as file_in:
+            self.assertEqual(b'<html><body>/page-123</body></html>', file_in.read())
+
+    def test_submit_from_threads(self):
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(_serve_asyncio, '127.0.0.1', 0))
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        base_url = f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}'
+        try:
+            with Downloader({'aiohttp': {}, 'max_in_flight': 10}) as downloader:
+                futures = [downloader.submit(f'{base_url}/page-{i}', os.path.join(self.tmp_dir.name, f'{i}.html'))
+                           for i in range(50)]
+                for future in futures:
+                    future.result()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+        self.assertEqual(50, len(os.listdir(self.tmp_dir.name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
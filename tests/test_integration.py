@@ -105,6 +105,119 @@ class ColusaIntegrationTestCase(unittest.TestCase):
                                               os.path.join('tests-expected', output_name)),
                             f'failed for url: {url}')
 
+    def test_prefetch_keeps_chapter_order(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            urls = []
+            for i in range(8):
+                source_path = os.path.join(tmp_dir, f'article-{i}.html')
+                with open(source_path, 'wt', encoding='utf-8') as file_out:
+                    file_out.write(f'<html><head><title>Article {i}</title></head>'
+                                   f'<body><article><p>Content {i}</p></article></body></html>')
+                urls.append(f'file://{source_path}')
+
+            file_lists = []
+            for concurrency in [1, 4]:
+                configs = {
+                    "title": "test: test case",
+                    "author": "tester",
+                    "version": "v1.0",
+                    "homepage": "dummy",
+                    "output_dir": os.path.join(tmp_dir, f'dist-{concurrency}'),
+                    "concurrency": concurrency,
+                    "urls": urls,
+                }
+                with Colusa(configs) as runner:
+                    runner.generate()
+                    file_lists.append(runner.book_maker.file_list)
+
+            self.assertEqual(8, len(file_lists[0]))
+            self.assertEqual(file_lists[0], file_lists[1])
+
+    def test_processes_match_serial_build(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            urls = []
+            for i in range(6):
+                source_path = os.path.join(tmp_dir, f'article-{i}.html')
+                with open(source_path, 'wt', encoding='utf-8') as file_out:
+                    file_out.write(f'<html><head><title>Article {i}</title></head>'
+                                   f'<body><article><p>Content <b>{i}</b></p><ul><li>item</li></ul>'
+                                   f'</article></body></html>')
+                urls.append(f'file://{source_path}')
+
+            outputs = []
+            for processes in [1, 2]:
+                output_dir = os.path.join(tmp_dir, f'dist-{processes}')
+                configs = {
+                    "title": "test: test case",
+                    "author": "tester",
+                    "version": "v1.0",
+                    "homepage": "dummy",
+                    "output_dir": output_dir,
+                    "processes": processes,
+                    "multi_part": True,
+                    "parts": [
+                        {"title": "First", "description": "", "urls": urls[:4]},
+                        {"title": "Second", "description": "", "urls": urls[4:]},
+                    ],
+                }
+                with Colusa(configs) as runner:
+                    runner.generate()
+                files = {}
+                for name in sorted(os.listdir(output_dir)):
+                    if name.endswith('.asciidoc'):
+                        with open(os.path.join(output_dir, name), 'rb') as file_in:
+                            files[name] = file_in.read()
+                outputs.append(files)
+
+            self.assertEqual(9, len(outputs[0]))
+            self.assertEqual(outputs[0], outputs[1])
+
+    @patch('colusa.Colusa.download_content')
+    @patch('colusa.fetch.download_image')
+    def test_parsers_match_expected_output(self, mock_download_image, mock_download_content):
+        import tempfile
+        from bs4.builder import builder_registry
+
+        mock_download_image.side_effect = download_image_mocked
+        mock_download_content.side_effect = download_content_mocked
+        url = "https://doordash.engineering/2021/03/04/building-a-declarative-real-time-feature-engineering-framework/"
+        p = pathlib.PurePath(url)
+        output_name = f'{p.name}_{get_short_hexdigest(url)}.asciidoc'
+
+        parsers = [parser for parser in ['html.parser', 'lxml', 'html5lib'] if builder_registry.lookup(parser)]
+        for parser in parsers:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                configs = {
+                    "title": "test: test case",
+                    "author": "tester",
+                    "version": "v1.0",
+                    "homepage": "dummy",
+                    "output_dir": tmp_dir,
+                    "parser": parser,
+                    "urls": [url],
+                }
+                with Colusa(configs) as runner:
+                    runner.generate()
+                self.assertTrue(self.compare_file(os.path.join(tmp_dir, output_name),
+                                                  os.path.join('tests-expected', output_name)),
+                                f'failed for parser: {parser}')
+
+    def test_parser_of_extractor(self):
+        from colusa import ConfigurationError, etr
+
+        self.assertEqual('html.parser', etr.get_parser('https://example.com/unknown', 'html.parser'))
+        etr.populate_extractor_config({'MediumExtractor': {'parser': 'html.parser'}})
+        try:
+            self.assertEqual('html.parser', etr.get_parser('https://medium.com/@someone/post', 'lxml'))
+        finally:
+            etr.populate_extractor_config({'MediumExtractor': {'parser': None}})
+        with self.assertRaises(ConfigurationError):
+            etr.resolve_parser('no-such-parser')
+
     def compare_file(self, actual_file, expected_file):
         import filecmp
         return filecmp.cmp(actual_file, expected_file)
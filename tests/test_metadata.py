@@ -0,0 +1,53 @@
+import json
+import unittest
+
+from bs4 import BeautifulSoup
+
+from colusa.document import DocumentIndex
+from colusa.etr import Extractor
+from colusa.metadata import harvest_metadata
+
+YOAST = {
+    '@graph': [
+        {'@type': 'Article', 'headline': 'Yoast title', 'datePublished': '2021-03-04T10:00:00+00:00',
+         'author': {'@id': '#alice'}},
+        {'@type': ['Person'], '@id': '#alice', 'name': 'Alice'},
+    ]
+}
+
+PAGE = f'''<html><head><title>Page title</title>
+<meta property="og:title" content="OG title"><meta name="author" content="Bob">
+<meta name="author" content="Carol">
+<script type="application/ld+json">{{"@type": "WebSite"}}</script>
+<script type="application/ld+json">not json</script>
+<script type="application/ld+json" class="yoast-schema-graph">{json.dumps(YOAST)}</script>
+</head><body><article><time class="entry-date published">March 4, 2021</time><p>text</p></article>
+</body></html>'''
+
+
+class HarvestMetadataTestCase(unittest.TestCase):
+    def test_sources_are_indexed(self):
+        metadata = harvest_metadata(DocumentIndex(BeautifulSoup(PAGE, 'html.parser')))
+        self.assertEqual('Page title', metadata.title)
+        self.assertEqual('OG title', metadata.meta_content('property', 'og:title'))
+        self.assertEqual(['Bob', 'Carol'], metadata.meta_contents('name', 'author'))
+        self.assertIsNone(metadata.meta_content('name', 'description'))
+        self.assertEqual('March 4, 2021', metadata.time_published)
+        self.assertEqual(2, len(metadata.json_ld))
+        self.assertEqual({'title': 'Yoast title', 'author': 'Alice', 'published': '2021-03-04'},
+                         metadata.yoast_data())
+
+    def test_extractor_uses_harvested_metadata(self):
+        extractor = Extractor(BeautifulSoup(PAGE, 'html.parser'))
+        self.assertEqual('Yoast title', extractor.title)
+        self.assertEqual('Alice', extractor.author)
+        self.assertEqual('2021-03-04', extractor.published)
+
+        extractor = Extractor(BeautifulSoup(PAGE.replace('yoast-schema-graph', 'other'), 'html.parser'))
+        self.assertEqual('OG title', extractor.title)
+        self.assertEqual('Bob', extractor.author)
+        self.assertEqual('March 4, 2021', extractor.published)
+
+
+if __name__ == '__main__':
+    unittest.main()
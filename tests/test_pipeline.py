@@ -0,0 +1,162 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from colusa import utils
+from colusa.config import BookConfig, PartConfig, PostProcessingConfig
+from colusa.etr import (PostProcessing, PostProcessor, Render, get_extractor_class, get_postprocessor_class,
+                        get_transformer_class, register_postprocessor)
+from colusa.manifest import BuildManifest, code_digest
+from colusa.pipeline import ChapterPipeline, chapter_basename
+
+
+def page(i):
+    return f'<html><head><title>Article {i}</title></head><body><article><p>Content {i}</p></article></body></html>'
+
+
+class PipelineTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        utils.scan('colusa.plugins')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def pipeline(self, fetch_content, manifest=None, **config):
+        config.setdefault('metadata', False)
+        book_config = BookConfig(title='t', author='a', version='v', homepage='h', output_dir=self.tmp_dir.name,
+                                 **config)
+        book_maker = Render(book_config)
+        return ChapterPipeline(book_config, 'html.parser', book_maker, None, fetch_content, manifest), book_maker
+
+
+class ChapterPipelineTestCase(PipelineTestCase):
+    def test_chapters_are_written_in_book_order(self):
+        pipeline, book_maker = self.pipeline(page)
+        parts = [PartConfig('One', '', ['https://a.com/0', 'https://a.com/1']),
+                 PartConfig('Two', '', ['https://a.com/2'])]
+        pipeline.run([(part, part.urls) for part in parts])
+        self.assertEqual(['part_one.asciidoc', '0_', '1_', 'part_two.asciidoc', '2_'],
+                         [name if name.startswith('part') else name[:2] for name, _ in book_maker.file_list])
+        with open(os.path.join(self.tmp_dir.name, book_maker.file_list[4][0]), encoding='utf-8') as file_in:
+            self.assertEqual('= Article https://a.com/2\n\nContent https://a.com/2', file_in.read().strip())
+
+    def test_unchanged_files_keep_their_modification_time(self):
+        postprocessing = [PostProcessingConfig('post-processor.RegexReplace', [{'s': 'Content', 'r': 'Text'}]),
+                          PostProcessingConfig('post-processor.RegexReplace', [{'s': 'Text', 'r': 'Body'}])]
+        parts = [PartConfig('One', 'first part', ['https://a.com/0', 'https://a.com/1'])]
+        for build in range(2):
+            pipeline, book_maker = self.pipeline(page, postprocessing=postprocessing)
+            pipeline.run([(part, part.urls) for part in parts])
+            book_maker.ebook_generate_master_file()
+            if build == 0:
+                for name in os.listdir(self.tmp_dir.name):
+                    os.utime(os.path.join(self.tmp_dir.name, name), (0, 0))
+
+        names = sorted(os.listdir(self.tmp_dir.name))
+        self.assertEqual(4, len(names))
+        for name in names:
+            self.assertEqual(0, os.stat(os.path.join(self.tmp_dir.name, name)).st_mtime, name)
+        with open(os.path.join(self.tmp_dir.name, f'{chapter_basename("https://a.com/1")}.asciidoc'),
+                  encoding='utf-8') as file_in:
+            self.assertEqual('= Article https://a.com/1\n\nBody https://a.com/1', file_in.read().strip())
+
+    def test_in_flight_articles_are_bounded(self):
+        in_flight = []
+        lock = threading.Lock()
+
+        def fetch_content(url_path):
+            with lock:
+                in_flight.append(int(url_path.rsplit('/', 1)[1]) - len(book_maker.file_list))
+            return page(url_path)
+
+        pipeline, book_maker = self.pipeline(fetch_content, max_in_flight=3)
+        pipeline.run([(None, [f'https://a.com/{i}' for i in range(20)])])
+        self.assertEqual(20, len(book_maker.file_list))
+        self.assertLessEqual(max(in_flight), 2)
+
+    def test_errors_stop_the_build(self):
+        def fetch_content(url_path):
+            if url_path.endswith('/5'):
+                raise IOError('cannot read')
+            return page(url_path)
+
+        pipeline, book_maker = self.pipeline(fetch_content, max_in_flight=2)
+        with self.assertRaises(IOError):
+            pipeline.run([(None, [f'https://a.com/{i}' for i in range(20)])])
+        self.assertLessEqual(len(book_maker.file_list), 5)
+
+
+
+class IncrementalBuildTestCase(PipelineTestCase):
+    urls = [f'https://a.com/{i}' for i in range(4)]
+
+    def build(self, fetch_content=page, **config):
+        manifest = BuildManifest(self.tmp_dir.name)
+        pipeline, book_maker = self.pipeline(fetch_content, manifest, **config)
+        pipeline.run([(None, self.urls)])
+        self.assertEqual(len(self.urls), len(book_maker.file_list))
+        return pipeline.unchanged_count
+
+    def test_unchanged_chapters_are_not_rebuilt(self):
+        self.assertEqual(0, self.build())
+        chapter_path = os.path.join(self.tmp_dir.name, f'{chapter_basename(self.urls[0])}.asciidoc')
+        os.utime(chapter_path, (0, 0))
+        self.assertEqual(4, self.build())
+        self.assertEqual(0, os.stat(chapter_path).st_mtime)
+
+    def test_changed_inputs_are_rebuilt(self):
+        self.build()
+        self.assertEqual(3, self.build(lambda url_path: page(url_path).replace('a.com/1', 'a.com/one')))
+        self.assertEqual(0, self.build(metadata=True))
+        os.remove(os.path.join(self.tmp_dir.name, f'{chapter_basename(self.urls[0])}.asciidoc'))
+        self.assertEqual(3, self.build(metadata=True))
+
+    def test_postprocessor_code_is_an_input(self):
+        classes = (get_extractor_class(self.urls[0]), get_transformer_class(self.urls[0]))
+        self.assertNotEqual(code_digest(*classes),
+                            code_digest(*classes, get_postprocessor_class('post-processor.RegexReplace')))
+
+    def test_urls_removed_from_book_are_forgotten(self):
+        self.build()
+        self.urls = self.urls[:2]
+        self.build()
+        self.assertEqual(self.urls, list(BuildManifest(self.tmp_dir.name).chapters))
+
+
+
+@register_postprocessor('test.UpperFile')
+class UpperFileProcessor(PostProcessor):
+    def run(self):
+        with open(self.file_path, encoding='utf-8') as fd:
+            data = fd.read()
+        with open(self.file_path, 'w', encoding='utf-8') as fd:
+            fd.write(data.upper())
+
+
+class PostProcessingTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        utils.scan('colusa.plugins')
+
+    def test_text_and_file_processors_run_in_order(self):
+        postprocessing = PostProcessing([
+            PostProcessingConfig('post-processor.RegexReplace', [{'s': 'a+', 'r': 'b'}]),
+            PostProcessingConfig('test.UpperFile'),
+            PostProcessingConfig('post-processor.RegexReplace', [{'s': 'B', 'r': 'c'}]),
+        ])
+        self.assertEqual(3, len(postprocessing.steps))
+        regex = postprocessing.steps[0]
+        self.assertEqual('', regex.__self__.file_path)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'chapter.asciidoc')
+            self.assertEqual('c\nXc', postprocessing.apply('aa\nxa', file_path))
+            self.assertEqual('c', postprocessing.apply('a', file_path))
+            self.assertEqual([], os.listdir(tmp_dir))
+        self.assertIs(regex.__self__, postprocessing.steps[0].__self__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import codecs
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from colusa.utils import decode_document, detect_encoding, write_file_if_changed
+
+
+class DetectEncodingTestCase(unittest.TestCase):
+    def test_byte_order_mark_wins(self):
+        data = codecs.BOM_UTF8 + '<meta charset="latin-1">é'.encode('utf-8')
+        self.assertEqual('utf-8-sig', detect_encoding(data, 'text/html; charset=iso-8859-1'))
+
+    def test_content_type_charset(self):
+        data = '<meta charset="utf-8">é'.encode('cp1252')
+        self.assertEqual('cp1252', detect_encoding(data, 'text/html; charset="windows-1252"'))
+
+    def test_meta_charset(self):
+        data = '<html><head><meta charset="ISO-8859-1"></head><body>é</body></html>'.encode('latin-1')
+        self.assertEqual('iso8859-1', detect_encoding(data, 'text/html'))
+        data = b'<meta http-equiv="Content-Type" content="text/html; charset=shift_jis">'
+        self.assertEqual('shift_jis', detect_encoding(data))
+
+    def test_unknown_charset_is_ignored(self):
+        data = '<meta charset="x-unknown">é'.encode('utf-8')
+        self.assertEqual('utf-8', detect_encoding(data, 'text/html; charset=bogus'))
+
+    def test_valid_utf8_skips_statistical_detection(self):
+        with patch('chardet.detect') as detect:
+            self.assertEqual('utf-8', detect_encoding('<p>xin chào</p>'.encode('utf-8') * 10000))
+        detect.assert_not_called()
+
+    def test_statistical_detection_uses_bounded_sample(self):
+        data = 'Привет, мир! '.encode('cp1251') * 100000
+        with patch('chardet.detect', return_value={'encoding': 'windows-1251'}) as detect:
+            self.assertEqual('cp1251', detect_encoding(data))
+        self.assertLessEqual(len(detect.call_args.args[0]), 64 * 1024)
+
+
+class DecodeDocumentTestCase(unittest.TestCase):
+    def test_declared_encoding(self):
+        data = codecs.BOM_UTF8 + '<p>é\r\n</p>'.encode('utf-8')
+        self.assertEqual('<p>é\n</p>', decode_document(data, 'text/html; charset=iso-8859-1'))
+        self.assertEqual('<p>é\n\n</p>', decode_document('<p>é\r\r</p>'.encode('cp1252'), 'text/html; charset=cp1252'))
+
+    def test_undeclared_encoding(self):
+        with patch('chardet.detect') as detect:
+            self.assertEqual('<p>xin chào</p>', decode_document('<p>xin chào</p>'.encode('utf-8')))
+        detect.assert_not_called()
+        data = 'Привет, мир! '.encode('cp1251') * 100
+        with patch('chardet.detect', return_value={'encoding': 'windows-1251'}):
+            self.assertEqual('Привет, мир! ' * 100, decode_document(data))
+
+
+
+class WriteFileIfChangedTestCase(unittest.TestCase):
+    def test_unchanged_file_is_kept(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'chapter.asciidoc')
+            self.assertTrue(write_file_if_changed(file_path, b'= Title\n'))
+            os.utime(file_path, (0, 0))
+            self.assertFalse(write_file_if_changed(file_path, b'= Title\n'))
+            self.assertEqual(0, os.stat(file_path).st_mtime)
+
+            self.assertTrue(write_file_if_changed(file_path, b'= Other\n'))
+            with open(file_path, 'rb') as file_in:
+                self.assertEqual(b'= Other\n', file_in.read())
+            self.assertEqual(['chapter.asciidoc'], os.listdir(tmp_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
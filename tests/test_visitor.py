@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import patch
+
+from bs4 import BeautifulSoup
+
+from colusa.asciidoc_visitor import AsciidocVisitor, VisitContext
+from colusa.visitor import OutputBuffer, get_dispatch_table
+
+
+class SourceVisitor(AsciidocVisitor):
+    visit_tag_source = AsciidocVisitor.visit_tag_fall_through
+
+    def visit_tag_strong(self, node, *args, **kwargs):
+        return f'<{self.generic_visit(node, *args, **kwargs)}>'
+
+
+class DispatchTableTestCase(unittest.TestCase):
+    def test_aliases_and_overrides(self):
+        table = get_dispatch_table(AsciidocVisitor)
+        self.assertIs(table.tags['b'], table.tags['strong'])
+        self.assertIs(table, get_dispatch_table(AsciidocVisitor))
+
+        table = get_dispatch_table(SourceVisitor)
+        self.assertIs(SourceVisitor.visit_tag_strong, table.tags['strong'])
+        self.assertIs(AsciidocVisitor.visit_tag_strong, table.tags['b'])
+        self.assertIn('source', table.tags)
+        self.assertNotIn('source', get_dispatch_table(AsciidocVisitor).tags)
+
+    def test_unknown_tags_are_reported_once(self):
+        bs = BeautifulSoup('<p><blink>a</blink><blink>b</blink><marquee>c</marquee><b>d</b><strong>e</strong></p>', 'html.parser')
+        visitor = SourceVisitor()
+        with patch('colusa.logs.warn') as warn:
+            self.assertEqual('abc**d**<e>\n\n', visitor.visit(bs))
+            visitor.visit(bs)
+        self.assertEqual(2, warn.call_count)
+        self.assertEqual({'blink': 4, 'marquee': 2}, dict(visitor.unknown_tags))
+
+
+class DeepVisitor(AsciidocVisitor):
+    def visit_tag_blink(self, node, ctx):
+        raise TypeError('blink is not supported')
+
+    def visit_tag_p(self, node, ctx):
+        ctx = ctx.replace(lists=ctx.lists + ('p',))
+        text = yield self.children(node, ctx)
+        return f'{ctx.indent}:{text.strip()}\n'
+
+
+class TraversalTestCase(unittest.TestCase):
+    def test_deep_document(self):
+        depth = 5000
+        bs = BeautifulSoup('<div>' * depth + '<b>x</b>' + '</div>' * depth, 'html.parser')
+        self.assertEqual('**x**', AsciidocVisitor().visit(bs).strip())
+
+    def test_context_is_restored_on_exit(self):
+        bs = BeautifulSoup('<p>a<p>b<p>c</p></p><span>d</span></p>', 'html.parser')
+        self.assertEqual('1:a2:b3:c\nd', DeepVisitor().visit(bs).strip())
+
+        bs = BeautifulSoup('<ul><li>a<ol><li>b<pre>c<br>d</pre></li></ol></li><li>e<br>f</li></ul>', 'html.parser')
+        self.assertEqual('* a.. b[listing]\n....\nc\nd\n....\n\n\n\n\n\n* e\n\nf\n\n\n',
+                         AsciidocVisitor().visit(bs))
+
+    def test_context_is_immutable(self):
+        ctx = VisitContext(src_url='https://example.com/')
+        nested = ctx.replace(pre=True, lists=('ul',))
+        self.assertEqual((False, 0), (ctx.pre, ctx.indent))
+        self.assertEqual((True, 1, 'https://example.com/'), (nested.pre, nested.indent, nested.src_url))
+        with self.assertRaises(AttributeError):
+            ctx.pre = True
+        with self.assertRaises(AttributeError):
+            ctx.depth = 1
+
+    def test_errors_reach_requesting_node(self):
+        bs = BeautifulSoup('<p>a<blink>b</blink>c</p>', 'html.parser')
+        with patch('colusa.logs.error') as error:
+            self.assertEqual('1:a', DeepVisitor().visit(bs).strip())
+        error.assert_called_once()
+
+
+class OutputBufferTestCase(unittest.TestCase):
+    def buffer(self, *parts):
+        output = OutputBuffer()
+        output.write('keep')
+        for part in parts:
+            output.write(part)
+        return output
+
+    def test_strip(self):
+        output = self.buffer(' \n', '  a', 'b ', '\n\n', ' ')
+        output.strip(1)
+        self.assertEqual(['keep', 'a', 'b'], output.parts)
+        output = self.buffer(' ', '\n')
+        output.strip(1)
+        self.assertTrue(output.is_empty(1))
+
+    def test_wrap_stripped(self):
+        for parts, expected in [((' a', 'b', 'c\n'), ' **abc**\n'), ((' ', 'a', ' '), ' **a** '),
+                                ((' ', '\n'), ''), ((), '')]:
+            output = self.buffer(*parts)
+            output.wrap_stripped(1, '**')
+            self.assertEqual(expected, output.take(1), parts)
+            self.assertEqual('keep', output.take(0))
+
+    def test_wrap(self):
+        output = self.buffer('a', 'b')
+        output.wrap(1, '`', '`')
+        self.assertTrue(output.contains(1, 'b'))
+        self.assertFalse(output.contains(1, 'keep'))
+        self.assertEqual('keep`ab`', output.take(0))
+
+
+if __name__ == '__main__':
+    unittest.main()